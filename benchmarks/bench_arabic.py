@@ -0,0 +1,59 @@
+import json
+import re
+
+from benchmarks.stubs import fixture
+
+# Size of the text corpus, in characters
+CORPUS_SIZE = 1_000_000
+
+
+def _corpus():
+    """
+    Generated posts and the visible text of the article page, repeated up to CORPUS_SIZE
+    """
+    import lib.summarizer
+    text = " ".join(json.loads(fixture("posts.json"))) + " " + lib.summarizer.clean_html(fixture("article.html"))
+    return (text * (CORPUS_SIZE // len(text) + 1))[:CORPUS_SIZE]
+
+
+def bench_arabic_normalize():
+    import lib.arabic
+    corpus = _corpus()
+    return lambda: lib.arabic.normalize(corpus)
+
+
+def bench_arabic_analyze():
+    import lib.arabic
+    corpus = _corpus()
+    return lambda: lib.arabic.analyze(corpus)
+
+
+def bench_arabic_hashtags():
+    import lib.arabic
+    corpus = _corpus()
+    return lambda: lib.arabic.hashtags(corpus)
+
+
+def bench_arabic_adhoc_regex():
+    """
+    The per-call regular expressions lib.arabic replaced, for comparison with arabic.analyze
+    """
+    corpus = _corpus()
+
+    def run():
+        return {
+            "hashtags": re.findall(r'#[\w\u0600-\u06FF]+', corpus),
+            "emoji_count": len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', corpus)),
+            "arabic_chars": len(re.findall(r'[\u0600-\u06FF]', corpus)),
+            "has_question": '\u061F' in corpus or '?' in corpus,
+            "words": re.sub(r'[\u064B-\u065F\u0670\u0640]', '', corpus).split(),
+        }
+    return run
+
+
+BENCHMARKS = {
+    "arabic.normalize": bench_arabic_normalize,
+    "arabic.analyze": bench_arabic_analyze,
+    "arabic.hashtags": bench_arabic_hashtags,
+    "arabic.adhoc_regex": bench_arabic_adhoc_regex,
+}
@@ -0,0 +1,49 @@
+import os
+
+from benchmarks.stubs import fixture
+
+# Pages extracted per iteration, enough to keep every worker busy
+BATCH_SIZE = 32
+ARTICLE_URL = "https://aiinarabic.com/attention-mechanism/"
+
+# Only one pool is kept alive at a time
+_pool = None
+
+
+def _use_pool(workers):
+    global _pool
+    import lib.extraction_pool
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = lib.extraction_pool.ExtractionPool(workers) if workers else None
+    return _pool
+
+
+def bench_extract_batch(workers):
+    def setup():
+        import lib.article_extractor
+        pool = _use_pool(workers)
+        html = fixture("article.html")
+        pages = [html] * BATCH_SIZE
+        urls = [ARTICLE_URL] * BATCH_SIZE
+        if pool is None:
+            return lambda: [lib.article_extractor._extract_content_from_html(page, url) for page, url in zip(pages, urls)]
+        return lambda: list(pool.map(lib.article_extractor._extract_content_from_html, pages, urls))
+    return setup
+
+
+def worker_counts():
+    """
+    1, 2, 4, ... up to the number of CPUs, which is always included
+    """
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+BENCHMARKS = {"extract.batch.in_process": bench_extract_batch(0)}
+BENCHMARKS.update({f"extract.batch.workers_{workers}": bench_extract_batch(workers) for workers in worker_counts()})
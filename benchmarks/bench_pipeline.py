@@ -0,0 +1,132 @@
+import itertools
+import json
+
+from benchmarks.stubs import FEED_URL, fixture
+
+
+def _feed_articles():
+    import lib.rss
+    return list(lib.rss.iter_entries(fixture("feed.xml")))
+
+
+def bench_rss_parse_feed():
+    import lib.rss
+    content = fixture("feed.xml")
+    return lambda: lib.rss.parse_feed(content)
+
+
+def bench_rss_entry_to_article():
+    import lib.rss
+    entries = lib.rss.parse_feed(fixture("feed.xml")).entries
+    return lambda: [lib.rss.entry_to_article(entry) for entry in entries]
+
+
+def bench_rss_iter_entries():
+    import lib.rss
+    content = fixture("feed.xml")
+    return lambda: list(lib.rss.iter_entries(content))
+
+
+def bench_rss_iter_entries_early_stop():
+    import lib.rss
+    content = fixture("feed.xml")
+    # Only the newest entry is new, as on a typical poll
+    known_ids = {_feed_articles()[1]["id"]}
+    return lambda: list(lib.rss.iter_entries(content, known_ids=known_ids))
+
+
+def bench_rss_fetch_new_articles():
+    import lib.rss
+    return lambda: lib.rss.fetch_new_articles(FEED_URL, limit=1)
+
+
+def bench_extract_article_page():
+    import lib.article_extractor
+    html = fixture("article.html")
+    return lambda: lib.article_extractor.extract_content_from_html(html, "https://aiinarabic.com/attention-mechanism/")
+
+
+def bench_extract_feed_article():
+    import lib.article_extractor
+    article = _feed_articles()[0]
+    return lambda: lib.article_extractor.extract_article(article)
+
+
+def bench_extract_metadata():
+    import lib.article_extractor
+    return lambda: lib.article_extractor.extract_article_metadata("https://aiinarabic.com/attention-mechanism/")
+
+
+def bench_summarizer_clean_html():
+    import lib.summarizer
+    content = _feed_articles()[0]["content"]
+    return lambda: lib.summarizer.clean_html(content)
+
+
+def _openai_client():
+    from clients.openai.client import Client as OpenAIClient
+    from config import openai as openai_config
+    return OpenAIClient(openai_config)
+
+
+def bench_openai_engagement_score():
+    client = _openai_client()
+    posts = json.loads(fixture("posts.json"))
+    return lambda: [client._calculate_engagement_score(post) for post in posts]
+
+
+def bench_openai_validate_post_quality():
+    client = _openai_client()
+    posts = json.loads(fixture("posts.json"))
+    return lambda: [client._validate_post_quality(post, "did_you_know") for post in posts]
+
+
+def bench_openai_summarize_article():
+    client = _openai_client()
+    article = _feed_articles()[0]
+    return lambda: client.summarize_article(article=article, max_length=500)
+
+
+def bench_openai_generate_daily_posts():
+    client = _openai_client()
+    article = _feed_articles()[0]
+    return lambda: client.generate_daily_posts(article=article)
+
+
+def _fresh_articles(article):
+    # A new id per iteration, the article store and outbox would otherwise skip finished work
+    counter = itertools.count()
+    return lambda: dict(article, id=f"{article['id']}-{next(counter)}")
+
+
+def bench_main_prepare_payloads():
+    import main
+    fresh = _fresh_articles(_feed_articles()[0])
+    return lambda: main.prepare_payloads(fresh())
+
+
+def bench_main_publish_payloads():
+    import main
+    article = _feed_articles()[0]
+    payloads = main.render_payloads(article, main.render_posts(article, article["title"]))
+    fresh = _fresh_articles(article)
+    return lambda: main.publish_payloads(fresh(), payloads, platforms=list(payloads))
+
+
+BENCHMARKS = {
+    "rss.parse_feed": bench_rss_parse_feed,
+    "rss.entry_to_article": bench_rss_entry_to_article,
+    "rss.iter_entries": bench_rss_iter_entries,
+    "rss.iter_entries.early_stop": bench_rss_iter_entries_early_stop,
+    "rss.fetch_new_articles": bench_rss_fetch_new_articles,
+    "extract.article_page": bench_extract_article_page,
+    "extract.feed_article": bench_extract_feed_article,
+    "extract.metadata": bench_extract_metadata,
+    "summarizer.clean_html": bench_summarizer_clean_html,
+    "openai.engagement_score": bench_openai_engagement_score,
+    "openai.validate_post_quality": bench_openai_validate_post_quality,
+    "openai.summarize_article": bench_openai_summarize_article,
+    "openai.generate_daily_posts": bench_openai_generate_daily_posts,
+    "main.prepare_payloads": bench_main_prepare_payloads,
+    "main.publish_payloads": bench_main_publish_payloads,
+}
@@ -0,0 +1,50 @@
+import gc
+import statistics
+import time
+import tracemalloc
+
+
+def percentile(samples, percent):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, repeat=20, warmup=2):
+    """
+    Time a benchmark and measure its peak memory
+
+    Timings and memory are taken in separate runs, since tracemalloc slows
+    down the code it traces.
+
+    :param func: Callable running one iteration of the benchmark
+    :param repeat: Number of timed iterations
+    :param warmup: Number of untimed iterations run first
+    :return: Dictionary with p50/p95/mean/min in seconds and peak memory in bytes
+    """
+    for _ in range(warmup):
+        func()
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_seconds": percentile(timings, 50),
+        "p95_seconds": percentile(timings, 95),
+        "mean_seconds": statistics.mean(timings),
+        "min_seconds": min(timings),
+        "peak_memory_bytes": peak,
+        "repeat": repeat,
+    }
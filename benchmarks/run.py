@@ -0,0 +1,109 @@
+import argparse
+import importlib
+import json
+import platform
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import the benchmarks package
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks import stubs
+from benchmarks.harness import measure
+
+BASELINE_FILE = Path(__file__).parent / "baseline.json"
+
+# Modules defining a BENCHMARKS dictionary of name -> setup function
+MODULES = [
+    "benchmarks.bench_pipeline",
+    "benchmarks.bench_extraction",
+    "benchmarks.bench_arabic",
+]
+
+
+def collect(only=None):
+    benchmarks = {}
+    for module_name in MODULES:
+        benchmarks.update(importlib.import_module(module_name).BENCHMARKS)
+    if only:
+        benchmarks = {name: setup for name, setup in benchmarks.items() if any(name.startswith(prefix) for prefix in only)}
+    return benchmarks
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare p50 timings against a baseline
+
+    :return: Dictionary of benchmark name to (ratio, verdict)
+    """
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline.get("results", {}):
+            continue
+        ratio = result["p50_seconds"] / baseline["results"][name]["p50_seconds"]
+        if ratio > 1 + threshold:
+            verdict = "SLOWER"
+        elif ratio < 1 - threshold:
+            verdict = "faster"
+        else:
+            verdict = "same"
+        comparison[name] = (ratio, verdict)
+    return comparison
+
+
+def regressions(comparison):
+    """
+    :return: Names of the benchmarks that got slower, sorted
+    """
+    return sorted(name for name, (_, verdict) in comparison.items() if verdict == "SLOWER")
+
+
+def report(results, comparison):
+    print(f"{'benchmark':<40} {'p50 ms':>10} {'p95 ms':>10} {'peak KiB':>10}  vs baseline")
+    for name, result in results.items():
+        line = (f"{name:<40} {result['p50_seconds'] * 1000:>10.3f} {result['p95_seconds'] * 1000:>10.3f}"
+                f" {result['peak_memory_bytes'] / 1024:>10.1f}")
+        if name in comparison:
+            ratio, verdict = comparison[name]
+            line += f"  {ratio:.2f}x {verdict}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the manshar pipeline offline")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed iterations per benchmark")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed iterations per benchmark")
+    parser.add_argument("--only", nargs="*", help="Only run benchmarks whose name starts with one of these")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="Baseline file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative p50 change reported as slower/faster")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with 1 if any benchmark got slower")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    # The benchmarks run from a temporary working directory
+    args.baseline = str(Path(args.baseline).resolve())
+    args.json = str(Path(args.json).resolve()) if args.json else None
+    if not args.save_baseline and not Path(args.baseline).exists():
+        sys.exit(f"No baseline at {args.baseline}, create one with --save-baseline on the machine you compare on")
+    stubs.install()
+
+    results = {}
+    for name, setup in collect(args.only).items():
+        results[name] = measure(setup(), repeat=args.repeat, warmup=args.warmup)
+
+    baseline = json.loads(Path(args.baseline).read_text()) if Path(args.baseline).exists() else {}
+    comparison = compare(results, baseline, args.threshold)
+    report(results, comparison)
+
+    output = {"python": platform.python_version(), "machine": platform.machine(), "results": results}
+    if args.json:
+        Path(args.json).write_text(json.dumps(output, indent=2))
+    if args.save_baseline:
+        Path(args.baseline).write_text(json.dumps(output, indent=2) + "\n")
+        print(f"\nBaseline saved to {args.baseline}")
+
+    slower = regressions(comparison)
+    if args.fail_on_regression and slower:
+        print(f"\n{len(slower)} benchmark(s) slower than the baseline: {', '.join(slower)}", file=sys.stderr)
+        sys.exit(1)
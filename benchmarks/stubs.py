@@ -0,0 +1,176 @@
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_DIR = Path(__file__).parent.parent
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+FEED_URL = "https://aiinarabic.com/feed/"
+
+# Smallest valid PNG, served for every image URL
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+
+
+# Buckets of lib.ratelimit.DEFAULT_LIMITS, lifted so publishing benchmarks never wait
+RATE_LIMITED_ENDPOINTS = ["x.tweet_create", "x.media_upload", "facebook.photos", "facebook.feed", "facebook.batch",
+                          "telegram.send_photo", "telegram.send_message", "linkedin.ugc_posts"]
+
+
+def fixture(name):
+    return (FIXTURES_DIR / name).read_bytes()
+
+
+def install():
+    """
+    Prepare an isolated, offline environment for the benchmarks
+
+    Writes a config.yaml pointing at a temporary data directory, makes it the
+    working directory, and replaces the network (lib.http, requests and the
+    Telegram Bot's transport) and the LLM (openai.OpenAI) with local stand-ins
+    serving the fixtures and platform API responses. Must run before any
+    repository module is imported.
+
+    :return: Path of the temporary working directory
+    """
+    work_dir = tempfile.mkdtemp(prefix="manshar-bench-")
+    config = (REPO_DIR / "sample.config.yaml").read_text()
+    config = config.replace("data_dir: .manshar", f"data_dir: {work_dir}/data")
+    config = config.replace("  log_level: INFO\n", f"  log_level: WARNING\n  log_file: {work_dir}/manshar.log\n")
+    config += "\nrate_limits:\n" + "".join(
+        f"  {key}: {{capacity: 1000000000, per_seconds: 1}}\n" for key in RATE_LIMITED_ENDPOINTS
+    )
+    Path(work_dir, "config.yaml").write_text(config)
+    os.chdir(work_dir)
+    sys.path.insert(0, str(REPO_DIR))
+
+    _stub_requests()
+    _stub_http()
+    _stub_telegram()
+    _stub_openai()
+    return work_dir
+
+
+def _response(url, content, status_code=200, content_type="text/html; charset=UTF-8"):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = "OK" if status_code < 400 else "Not Found"
+    response.url = url
+    response._content = content
+    response.headers = CaseInsensitiveDict({"Content-Type": content_type, "Content-Length": str(len(content))})
+    response.raw = io.BytesIO(content)
+    response.encoding = "utf-8"
+    return response
+
+
+def route(method, url):
+    """
+    Serve a fixture for a request URL, 404 for anything unknown
+    """
+    if url.rstrip("/") == FEED_URL.rstrip("/") or url.startswith(FEED_URL + "?"):
+        return _response(url, fixture("feed.xml"), content_type="application/rss+xml; charset=UTF-8")
+    if re.search(r"\.(png|jpe?g|webp|gif)(\?|$)", url):
+        return _response(url, PNG, content_type="image/png")
+    if "graph.facebook.com" in url:
+        if method.upper() == "POST":
+            return _json(url, {"id": "1_2", "post_id": "1_2"})
+        return _json(url, {"access_token": "benchmark-token", "expires_in": 5184000})
+    if re.search(r"//upload\.(twitter|x)\.com/1\.1/media/upload", url):
+        return _json(url, {"media_id": 1, "media_id_string": "1", "expires_after_secs": 86400})
+    if re.search(r"//api\.(twitter|x)\.com/2/tweets", url):
+        return _json(url, {"data": {"id": "1", "text": "benchmark"}}, status_code=201)
+    if url.startswith("https://api.linkedin.com/"):
+        return _json(url, {"id": "urn:li:share:1"}, status_code=201)
+    if url.startswith("https://aiinarabic.com/"):
+        return _response(url, fixture("article.html"))
+    return _response(url, b"", status_code=404)
+
+
+def _json(url, data, status_code=200):
+    return _response(url, json.dumps(data).encode(), status_code=status_code, content_type="application/json")
+
+
+# Bot API results by method, see _stub_telegram
+TELEGRAM_RESULTS = {
+    "getMe": {"id": 1, "is_bot": True, "first_name": "manshar", "username": "manshar_bot"},
+    "sendMessage": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "channel"}},
+    "sendPhoto": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "channel"}},
+}
+
+
+def _stub_telegram():
+    # The Bot brings its own HTTP client, its transport is replaced instead
+    from telegram.request import HTTPXRequest
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        result = TELEGRAM_RESULTS.get(url.rsplit("/", 1)[-1])
+        if result is None:
+            return 404, json.dumps({"ok": False, "error_code": 404, "description": "Not Found"}).encode()
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    HTTPXRequest.do_request = do_request
+
+
+def _stub_requests():
+    import requests
+
+    def request(self, method, url, *args, **kwargs):
+        return route(method, url)
+
+    requests.sessions.Session.request = request
+
+
+def _stub_http():
+    import httpx
+    import lib.http
+
+    def handler(request):
+        response = route(request.method, str(request.url))
+        return httpx.Response(response.status_code, headers=dict(response.headers), content=response.content)
+
+    transport = httpx.MockTransport(handler)
+    lib.http._client = httpx.Client(transport=transport, follow_redirects=True)
+    lib.http._async_client = httpx.AsyncClient(transport=transport, follow_redirects=True)
+
+
+class _Completions:
+    def __init__(self):
+        self.posts = json.loads(fixture("posts.json"))
+
+    def create(self, model=None, messages=None, max_tokens=None, temperature=None, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        if "POST 1" in prompt:
+            types = ["did_you_know", "definition", "quick_tip", "inspiring_quote", "amazing_fact"]
+            content = "\n\n".join(f"POST {i + 1}:\n{post}\nTYPE: {post_type}"
+                                  for i, (post, post_type) in enumerate(zip(self.posts, types)))
+        else:
+            content = self.posts[-1]
+
+        usage = SimpleNamespace(
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(content) // 4,
+            total_tokens=(len(prompt) + len(content)) // 4,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0),
+        )
+        message = SimpleNamespace(content=content, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+
+class FakeOpenAI:
+    def __init__(self, *args, **kwargs):
+        self.chat = SimpleNamespace(completions=_Completions())
+
+
+def _stub_openai():
+    import openai
+    openai.OpenAI = FakeOpenAI
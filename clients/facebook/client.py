@@ -1,47 +1,67 @@
 import facebook
+import json
 import requests
+import urllib3
 from io import BytesIO
+from urllib.parse import urlencode
+import lib.deadline
+import lib.facebook_tokens
+import lib.http
+import lib.metrics
+import lib.ratelimit
+
+IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Graph API error codes of throttling, which retrying another way would not help
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613, 80001}
+
+# The Graph API accepts at most this many operations per batch request
+MAX_BATCH_SIZE = 50
+
+# Ways to publish a post, tried in order until one succeeds
+PHOTO_BY_URL = "photo_by_url"
+PHOTO_UPLOAD = "photo_upload"
+FEED = "feed"
+
+class ErrBatchOperation(Exception):
+    def __init__(self, message, code=None, fallback=True, retryable=True):
+        """
+        :param code: Graph API error code
+        :param fallback: Whether the post may be published another way
+        :param retryable: Whether the post may be sent again later, see lib.outbox
+        """
+        super().__init__(message)
+        self.code = code
+        self.fallback = fallback and retryable and code not in RATE_LIMIT_ERROR_CODES
+        self.retryable = retryable
 
 class Client:
     def __init__(self, config):
         self.page_id = config.page_id
         self.app_id = getattr(config, 'app_id', None)
         self.app_secret = getattr(config, 'app_secret', None)
-        self.access_token = config.access_token
+        self.photo_by_url = getattr(config, 'photo_by_url', True)
 
-        # Try to refresh token if credentials are available
-        if self.app_id and self.app_secret:
-            refreshed_token = self._refresh_token()
-            if refreshed_token:
-                self.access_token = refreshed_token
+        # Tokens are renewed in the background (lib.facebook_tokens), publishing
+        # only reads the current one
+        self.tokens = lib.facebook_tokens.get_token_store(config)
+        self.access_token = self.tokens.token()
 
-        self.graph = facebook.GraphAPI(access_token=self.access_token)
+        # Keep the shared rate limiter in sync with the Graph API usage headers
+        self.limiter = lib.ratelimit.get_limiter()
+        # facebook-sdk only talks through a requests.Session, bounded by the current deadline
+        session = lib.http.instrument_session(self.limiter.instrument(requests.Session()))
+        self.graph = facebook.GraphAPI(access_token=self.access_token, session=session)
 
-    def _refresh_token(self):
+    def _current_token(self):
         """
-        Exchange current token for a new long-lived token.
-        Returns the new token or None if refresh fails.
+        Point the Graph API at the latest renewed token
         """
-        try:
-            url = "https://graph.facebook.com/v19.0/oauth/access_token"
-            params = {
-                'grant_type': 'fb_exchange_token',
-                'client_id': self.app_id,
-                'client_secret': self.app_secret,
-                'fb_exchange_token': self.access_token
-            }
-            response = requests.get(url, params=params)
-
-            if response.status_code == 200:
-                data = response.json()
-                new_token = data.get('access_token')
-                if new_token:
-                    print(f"Facebook token refreshed successfully")
-                    return new_token
-            return None
-        except Exception as e:
-            print(f"Failed to refresh Facebook token: {str(e)}")
-            return None
+        self.access_token = self.tokens.token()
+        self.graph.access_token = self.access_token
+        return self.access_token
 
     def send(self, message, link=None, image_url=None, dry_run=False):
         """
@@ -54,27 +74,12 @@ class Client:
         """
         if dry_run:
             return {"id": "dry_run"}
+        self._current_token()
         
         try:
             if image_url:
                 try:
-                    # Download the image with proper headers
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                    }
-                    response = requests.get(image_url, headers=headers)
-                    response.raise_for_status()
-
-                    # Create a temporary file-like object
-                    image_data = BytesIO(response.content)
-
-                    # Post the photo directly (published) - simpler and more reliable
-                    return self.graph.put_photo(
-                        image=image_data,
-                        album_path=f"{self.page_id}/photos",
-                        published=True,
-                        message=message
-                    )
+                    return self._put_photo(message, image_url)
                 except Exception as e:
                     print(f"Error uploading image to Facebook: {str(e)}")
                     # Continue without the image if upload fails
@@ -84,11 +89,172 @@ class Client:
             if link:
                 post_args["link"] = link
 
-            return self.graph.put_object(
-                parent_object=self.page_id,
-                connection_name="feed",
-                **post_args
-            )
+            self.limiter.acquire("facebook.feed")
+            with lib.metrics.timer("facebook.put_object"):
+                return self.graph.put_object(
+                    parent_object=self.page_id,
+                    connection_name="feed",
+                    **post_args
+                )
         except Exception as e:
             print(f"Error posting to Facebook: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def _put_photo(self, message, image_url):
+        """
+        Publish a photo post, letting Graph fetch the image from its URL and
+        only downloading and uploading it ourselves if that fails
+        """
+        if self.photo_by_url:
+            try:
+                self.limiter.acquire("facebook.photos")
+                with lib.metrics.timer("facebook.put_photo_url"):
+                    return self.graph.put_object(
+                        parent_object=self.page_id,
+                        connection_name="photos",
+                        url=image_url,
+                        message=message,
+                        published=True
+                    )
+            except facebook.GraphAPIError as e:
+                if getattr(e, "code", None) in RATE_LIMIT_ERROR_CODES:
+                    raise
+                print(f"Facebook could not fetch the image by URL, uploading it instead: {str(e)}")
+
+        # Download the image with proper headers
+        with lib.metrics.timer("facebook.image_download"):
+            response = lib.http.get_client().get(image_url, headers=IMAGE_HEADERS)
+            response.raise_for_status()
+
+        # Post the photo directly (published) - simpler and more reliable
+        self.limiter.acquire("facebook.photos")
+        with lib.metrics.timer("facebook.put_photo"):
+            return self.graph.put_photo(
+                image=BytesIO(response.content),
+                album_path=f"{self.page_id}/photos",
+                published=True,
+                message=message
+            )
+
+    def send_batch(self, posts, dry_run=False):
+        """
+        Publish several posts with Graph batch requests of up to MAX_BATCH_SIZE operations.
+        Each post falls back like send(): photo by URL, then uploaded as an
+        attached file, then text and link only.
+        :param posts: List of send() keyword arguments (message, link, image_url).
+        :param dry_run: (Optional) If True, nothing is published.
+        :return: One entry per post, in order: its Graph API response, or the exception it failed with.
+            Posts whose outcome is unknown fail with a non-retryable ErrBatchOperation.
+        """
+        if dry_run:
+            return [{"id": "dry_run"} for _ in posts]
+        self._current_token()
+
+        results = [None] * len(posts)
+        attempts = {}
+        for i, post in enumerate(posts):
+            methods = [FEED]
+            if post.get("image_url"):
+                methods = [PHOTO_UPLOAD, FEED]
+                if self.photo_by_url:
+                    methods.insert(0, PHOTO_BY_URL)
+            attempts[i] = methods
+
+        while attempts:
+            pending = sorted(attempts)
+            for start in range(0, len(pending), MAX_BATCH_SIZE):
+                chunk = pending[start:start + MAX_BATCH_SIZE]
+                for i, result in zip(chunk, self._run_batch([(posts[i], attempts[i][0]) for i in chunk])):
+                    if not isinstance(result, Exception):
+                        results[i] = result
+                        del attempts[i]
+                        continue
+                    attempts[i].pop(0)
+                    # Throttling, timeouts and request-level failures are left to the caller's retry
+                    if not attempts[i] or not getattr(result, "fallback", False):
+                        results[i] = result
+                        del attempts[i]
+                    else:
+                        print(f"Facebook batch operation failed, trying {attempts[i][0]}: {str(result)}")
+        return results
+
+    def _run_batch(self, operations):
+        """
+        Send (post, method) operations in one batch request
+        :return: One entry per operation: its response body, or an exception
+        """
+        batch, files, results = [], {}, [None] * len(operations)
+        indexes = []
+        for i, (post, method) in enumerate(operations):
+            try:
+                batch.append(self._batch_operation(i, post, method, files))
+                indexes.append(i)
+            except Exception as e:
+                results[i] = ErrBatchOperation(str(e))
+
+        if batch:
+            try:
+                self.limiter.acquire("facebook.batch", tokens=len(batch))
+                with lib.metrics.timer("facebook.batch"):
+                    responses = self.graph.request("", post_args={"batch": json.dumps(batch)}, files=files or None, method="POST")
+            except Exception as e:
+                if _may_have_been_sent(e):
+                    # Graph may have run the batch before the response was lost,
+                    # sending it again could post every operation twice
+                    e = ErrBatchOperation(f"Batch request failed, its posts may have been published: {str(e)}",
+                                          retryable=False)
+                responses = [e] * len(batch)
+            for i, response in zip(indexes, responses):
+                results[i] = response if isinstance(response, Exception) else _batch_result(response)
+        return results
+
+    def _batch_operation(self, index, post, method, files):
+        body = {"message": post["message"]}
+        operation = {"method": "POST", "relative_url": f"{self.page_id}/photos"}
+        if method == PHOTO_BY_URL:
+            body.update(url=post["image_url"], published="true")
+        elif method == PHOTO_UPLOAD:
+            with lib.metrics.timer("facebook.image_download"):
+                response = lib.http.get_client().get(post["image_url"], headers=IMAGE_HEADERS)
+                response.raise_for_status()
+            name = f"file{index}"
+            files[name] = (name, response.content, response.headers.get("content-type", "image/jpeg"))
+            operation["attached_files"] = name
+            body["published"] = "true"
+        else:
+            operation["relative_url"] = f"{self.page_id}/feed"
+            if post.get("link"):
+                body["link"] = post["link"]
+        operation["body"] = urlencode(body)
+        return operation
+
+def _may_have_been_sent(error):
+    """
+    Whether Graph may have received a batch request that failed with error;
+    only the failures known to happen before the request goes out are not
+    """
+    if isinstance(error, (facebook.GraphAPIError, lib.deadline.ErrDeadlineExceeded, lib.ratelimit.ErrRateLimited,
+                          requests.exceptions.ConnectTimeout)):
+        return False
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # Refused connections and failed name resolutions, as opposed to connections lost later
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return not isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return True
+
+def _batch_result(response):
+    """
+    Body of one batch sub-response, or an ErrBatchOperation
+    """
+    if response is None:
+        # Graph did not finish the operation in time, it may still have been
+        # published and sending it again could post it twice
+        return ErrBatchOperation("Batch operation timed out, the post may have been published", retryable=False)
+    try:
+        body = json.loads(response.get("body") or "null")
+    except ValueError:
+        body = None
+    if response.get("code") == 200:
+        return body
+    error = (body or {}).get("error", {}) if isinstance(body, dict) else {}
+    return ErrBatchOperation(error.get("message") or f"HTTP {response.get('code')}", code=error.get("code"))
@@ -1,4 +1,6 @@
-import requests
+import lib.http
+import lib.metrics
+import lib.ratelimit
 
 class Client:
     def __init__(self, config):
@@ -45,6 +47,10 @@ class Client:
                     "originalUrl": link
                 }
             ]
-        response = requests.post(url, headers=headers, json=post_data)
-        response.raise_for_status()
+        limiter = lib.ratelimit.get_limiter()
+        limiter.acquire("linkedin.ugc_posts")
+        with lib.metrics.timer("linkedin.ugc_posts"):
+            # The shared client's response hook keeps the limiter in sync with LinkedIn's headers
+            response = lib.http.get_client().post(url, headers=headers, json=post_data)
+            response.raise_for_status()
         return response.json()
\ No newline at end of file
@@ -1,26 +1,88 @@
 import openai
 import re
+import time
+import lib.arabic
 import lib.article_extractor
+import lib.deadline
+import lib.http
+import lib.metrics
+import lib.store
+import lib.usage
+
+# Matched against lib.arabic.normalize()d posts, so diacritics and letter variants don't matter
+CTA_WORDS = lib.arabic.phrase_pattern(["شارك", "علق", "اكتشف", "تعلم", "احصل", "جرب"])
+# Template phrases that indicate poor generation
+GENERIC_PHRASES = lib.arabic.phrase_pattern(["هذا مثال", "هذه معلومة", "تجربة", "dry run", "مثال على", "نموذج", "اختبار"])
+# Phrases a post of each type must contain
+TYPE_MARKERS = {
+    "did_you_know": lib.arabic.phrase_pattern(["هل تعلم"]),
+    "definition": lib.arabic.phrase_pattern(["تعريف"]),
+    "quick_tip": lib.arabic.phrase_pattern(["نصيحة"]),
+}
 
 
 class Client:
     def __init__(self, config):
         self.api_key = config.api_key
         self.model = config.model or "gpt-3.5-turbo"
-        self.client = openai.OpenAI(api_key=self.api_key)
+        # Completions share the process-wide connection pool (HTTP/2 when available)
+        self.client = openai.OpenAI(api_key=self.api_key, http_client=lib.http.get_client())
+
+
+
+    def _complete(self, method, **kwargs):
+        """
+        Run a chat completion, timed as the openai.<method> stage, and record
+        its token usage and wall time in the usage ledger
 
+        Close to a usage budget, the call is made with the cheaper fallback
+        settings of the usage section.
 
+        :raises lib.usage.ErrBudgetExceeded: If a usage budget is exhausted
+        """
+        if lib.usage.get_budget().check():
+            from config import usage as usage_config
+            kwargs["model"] = usage_config.fallback_model or kwargs.get("model")
+            kwargs["max_tokens"] = min(kwargs.get("max_tokens") or usage_config.fallback_max_tokens,
+                                       usage_config.fallback_max_tokens)
 
-    def summarize_article(self, url, max_length=280, include_hashtags=True, dry_run=False):
+        # The shared HTTP client caps the request's timeout to what is left of the deadline
+        lib.deadline.check(f"openai.{method}")
+        response, started_at = None, time.monotonic()
+        try:
+            with lib.metrics.timer(f"openai.{method}"):
+                response = self.client.chat.completions.create(**kwargs)
+            return response
+        finally:
+            lib.usage.get_ledger().record(
+                method,
+                getattr(response, "model", None) or kwargs.get("model"),
+                getattr(response, "usage", None),
+                time.monotonic() - started_at,
+                error=response is None
+            )
+
+    def summarize_article(self, url=None, max_length=280, include_hashtags=True, dry_run=False, record=None,
+                          article=None, content=None, title=None):
         """
-        Summarize an article from URL and create an engaging social media post
+        Summarize an article and create an engaging social media post.
+        Pre-fetched content (an article from lib.rss, or content and title) is
+        used as is; the URL is only scraped when that content is missing or
+        truncated.
         
         :param url: URL of the article to summarize
         :param max_length: Maximum length of the generated post
         :param include_hashtags: Whether to include relevant hashtags
         :param dry_run: If True, return mock response
+        :param record: (Optional) lib.store.ArticleRecord to load finished stages from and store new ones in
+        :param article: (Optional) Article dictionary as returned by lib.rss
+        :param content: (Optional) Pre-fetched article HTML or text
+        :param title: (Optional) Title of the pre-fetched content
         :return: Dictionary with summary and post content
         """
+        article = self._source_article(url, article, content, title)
+        url = article['link']
+
         if dry_run:
             return {
                 "summary": "This is a dry run summary of the article",
@@ -29,59 +91,78 @@ class Client:
             }
         
         try:
-            # Extract article content
-            article_data = lib.article_extractor.extract_article_content(url)
-            
-            # Create prompt for summarization
-            hashtag_instruction = "Include 2-3 relevant Arabic hashtags." if include_hashtags else "Do not include hashtags."
-            
-            prompt = f"""
-            Please create an engaging Arabic social media post based on this article:
-            
-            Title: {article_data['title']}
-            Content: {article_data['content']}
-            Article URL: {url}
-            
-            Requirements:
-            - Write in Arabic
-            - Keep it under {max_length} characters
-            - Make it engaging and compelling
-            - Include the article link at the end (just the URL, not markdown format)
-            - {hashtag_instruction}
-            - Use emojis strategically (3-6 relevant emojis)
-            - Focus on the key insights or benefits
-            - Start with an engaging hook (اكتشف، تعلم، شاهد، etc.)
-            - End with a clear call to action
-            
-            Format the response as a ready-to-post social media message with hashtags at the end.
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a social media expert who creates engaging Arabic posts that drive clicks and engagement."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            social_post = response.choices[0].message.content.strip()
-            
-            # Extract hashtags from the post
-            hashtags = re.findall(r'#\w+', social_post)
-            
-            return {
-                "summary": article_data['content'][:500] + "..." if len(article_data['content']) > 500 else article_data['content'],
-                "social_post": social_post,
-                "hashtags": hashtags,
-                "title": article_data['title']
-            }
-            
+            return lib.store.cached(record, f"summary_{max_length}_{int(include_hashtags)}", lambda: self._summarize(article, max_length, include_hashtags, record))
+        except lib.usage.ErrBudgetExceeded:
+            # Callers fall back to a local summary
+            raise
         except Exception as e:
             raise Exception(f"Failed to summarize article: {str(e)}")
 
-    def generate_daily_posts(self, url, num_posts=5, dry_run=False):
+    def _source_article(self, url=None, article=None, content=None, title=None):
+        """
+        Normalize the accepted article inputs to an article dictionary
+        """
+        if article:
+            return article
+        return {"link": url, "title": title or "", "content": content or ""}
+
+    def _summarize(self, article, max_length, include_hashtags, record=None):
+        """
+        Extract an article and generate its social media post
+        """
+        url = article['link']
+
+        # Extract article content
+        article_data = lib.store.cached(record, "extracted", lambda: lib.article_extractor.extract_article(article))
+        
+        # Create prompt for summarization
+        hashtag_instruction = "Include 2-3 relevant Arabic hashtags." if include_hashtags else "Do not include hashtags."
+        
+        prompt = f"""
+        Please create an engaging Arabic social media post based on this article:
+        
+        Title: {article_data['title']}
+        Content: {article_data['content']}
+        Article URL: {url}
+        
+        Requirements:
+        - Write in Arabic
+        - Keep it under {max_length} characters
+        - Make it engaging and compelling
+        - Include the article link at the end (just the URL, not markdown format)
+        - {hashtag_instruction}
+        - Use emojis strategically (3-6 relevant emojis)
+        - Focus on the key insights or benefits
+        - Start with an engaging hook (اكتشف، تعلم، شاهد، etc.)
+        - End with a clear call to action
+        
+        Format the response as a ready-to-post social media message with hashtags at the end.
+        """
+        
+        response = self._complete(
+            "summarize_article",
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You are a social media expert who creates engaging Arabic posts that drive clicks and engagement."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500,
+            temperature=0.7
+        )
+        
+        social_post = response.choices[0].message.content.strip()
+        
+        # Extract hashtags from the post
+        hashtags = lib.arabic.hashtags(social_post)
+        
+        return {
+            "summary": article_data['content'][:500] + "..." if len(article_data['content']) > 500 else article_data['content'],
+            "social_post": social_post,
+            "hashtags": hashtags,
+            "title": article_data['title']
+        }
+
+    def generate_daily_posts(self, url=None, num_posts=5, dry_run=False, record=None, article=None):
         """
         Generate various types of daily social media posts from an article
         Focus on informative, bite-sized, and funny content
@@ -89,17 +170,24 @@ class Client:
         :param url: URL of the article
         :param num_posts: Number of posts to generate
         :param dry_run: If True, still generate real posts but mark as dry run
+        :param record: (Optional) lib.store.ArticleRecord to load finished stages from and store new ones in
+        :param article: (Optional) Article dictionary as returned by lib.rss, used instead of scraping the URL
         :return: List of diverse posts (tips, facts, quotes, definitions, etc.)
         """
         # Even in dry run, we want to test the real generation for quality
         # The dry_run flag is handled at the posting level, not generation level
         
         try:
+            cached_posts = record.get("daily_posts") if record else None
+            if cached_posts is not None:
+                return cached_posts[:num_posts]
+
             # Extract article content
-            article_data = lib.article_extractor.extract_article_content(url)
+            article = self._source_article(url, article)
+            article_data = lib.store.cached(record, "extracted", lambda: lib.article_extractor.extract_article(article))
             
             # First, let's extract key information and validate content quality
-            content_summary = self._analyze_article_content(article_data['content'], article_data['title'])
+            content_summary = self._analysis(article_data, record)
             
             prompt = f"""
             أنت خبير في إنشاء محتوى عربي جذاب لوسائل التواصل الاجتماعي. اقرأ هذا المقال بعناية وأنشئ {num_posts} منشورات متنوعة ودقيقة:
@@ -143,7 +231,8 @@ class Client:
             TYPE: did_you_know
             """
             
-            response = self.client.chat.completions.create(
+            response = self._complete(
+                "generate_daily_posts",
                 model=self.model,
                 messages=[
                     {
@@ -187,7 +276,7 @@ class Client:
                 
                 post_content = post_content.strip()
                 if post_content and len(post_content) > 20:  # Ensure we have substantial content
-                    hashtags = re.findall(r'#[\w\u0600-\u06FF]+', post_content)  # Support Arabic hashtags
+                    hashtags = lib.arabic.hashtags(post_content)
                     engagement_score = self._calculate_engagement_score(post_content)
                     
                     # Validate post quality
@@ -199,8 +288,13 @@ class Client:
                             "engagement_score": engagement_score
                         })
             
+            if record and posts:
+                record.put("daily_posts", posts)
+
             return posts[:num_posts]  # Ensure we return exactly the requested number
             
+        except lib.usage.ErrBudgetExceeded:
+            raise
         except Exception as e:
             raise Exception(f"Failed to generate daily posts: {str(e)}")
 
@@ -244,7 +338,8 @@ class Client:
             Return just the final post, optimized for maximum engagement.
             """
             
-            response = self.client.chat.completions.create(
+            response = self._complete(
+                "generate_engaging_post",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": f"You are a social media expert specializing in Arabic content that goes viral and drives engagement on {platform}."},
@@ -255,7 +350,7 @@ class Client:
             )
             
             post = response.choices[0].message.content.strip()
-            hashtags = re.findall(r'#\w+', post)
+            hashtags = lib.arabic.hashtags(post)
             
             # Simple engagement score based on content features
             engagement_score = self._calculate_engagement_score(post)
@@ -275,25 +370,21 @@ class Client:
         Calculate a simple engagement score based on post features
         """
         score = 5.0  # Base score
+        analysis = lib.arabic.analyze(post)
         
         # Emoji bonus
-        emoji_count = len(re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', post))
-        score += min(emoji_count * 0.5, 2.0)
+        score += min(analysis["emoji_count"] * 0.5, 2.0)
         
         # Hashtag bonus
-        hashtag_count = len(re.findall(r'#\w+', post))
-        score += min(hashtag_count * 0.3, 1.5)
+        score += min(len(analysis["hashtags"]) * 0.3, 1.5)
         
         # Question bonus (engagement trigger)
-        if '؟' in post or '?' in post:
+        if analysis["has_question"]:
             score += 1.0
         
         # Call to action words
-        cta_words = ['شارك', 'علق', 'اكتشف', 'تعلم', 'احصل', 'جرب']
-        for word in cta_words:
-            if word in post:
-                score += 0.5
-                break
+        if CTA_WORDS.search(analysis["normalized"]):
+            score += 0.5
         
         # Length penalty for very long posts
         if len(post) > 280:
@@ -301,41 +392,50 @@ class Client:
         
         return min(max(score, 1.0), 10.0)  # Keep score between 1-10
 
+    def _analysis(self, article_data, record=None):
+        """
+        Analysis of an article for the generation prompts, stored in the record.
+        A failed analysis falls back to a basic summary that is not stored, so
+        the next run tries again.
+        """
+        try:
+            return lib.store.cached(record, "analysis", lambda: self._analyze_article_content(article_data['content'], article_data['title']))
+        except lib.usage.ErrBudgetExceeded:
+            raise
+        except Exception:
+            return f"مقال عن {article_data['title']}. يحتوي على معلومات تقنية ونصائح عملية."
+
     def _analyze_article_content(self, content, title):
         """
         Analyze article content to extract key themes and information
         This helps the AI generate more accurate posts
         """
-        try:
-            analysis_prompt = f"""
-            حلل هذا المقال العربي واستخرج:
-            1. الموضوع الرئيسي
-            2. أهم 3 نقاط أو معلومات
-            3. أي أرقام أو إحصائيات مذكورة
-            4. المصطلحات التقنية المهمة
-            5. النصائح أو التوصيات العملية
+        analysis_prompt = f"""
+        حلل هذا المقال العربي واستخرج:
+        1. الموضوع الرئيسي
+        2. أهم 3 نقاط أو معلومات
+        3. أي أرقام أو إحصائيات مذكورة
+        4. المصطلحات التقنية المهمة
+        5. النصائح أو التوصيات العملية
 
-            العنوان: {title}
-            المحتوى: {content[:2000]}
+        العنوان: {title}
+        المحتوى: {content[:2000]}
 
-            اكتب تحليلاً مختصراً (150 كلمة كحد أقصى) يركز على المعلومات الدقيقة فقط.
-            """
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "أنت محلل محتوى دقيق يستخرج المعلومات الأساسية من النصوص العربية."},
-                    {"role": "user", "content": analysis_prompt}
-                ],
-                max_tokens=300,
-                temperature=0.3  # Lower temperature for more accurate analysis
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            # If analysis fails, return a basic summary
-            return f"مقال عن {title}. يحتوي على معلومات تقنية ونصائح عملية."
+        اكتب تحليلاً مختصراً (150 كلمة كحد أقصى) يركز على المعلومات الدقيقة فقط.
+        """
+        
+        response = self._complete(
+            "analyze_article_content",
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "أنت محلل محتوى دقيق يستخرج المعلومات الأساسية من النصوص العربية."},
+                {"role": "user", "content": analysis_prompt}
+            ],
+            max_tokens=300,
+            temperature=0.3  # Lower temperature for more accurate analysis
+        )
+        
+        return response.choices[0].message.content.strip()
 
     def _validate_post_quality(self, post_content, post_type):
         """
@@ -345,32 +445,20 @@ class Client:
         if len(post_content) < 30:
             return False
         
-        # Check for generic/template phrases that indicate poor generation
-        generic_phrases = [
-            "هذا مثال",
-            "هذه معلومة",
-            "تجربة",
-            "dry run",
-            "مثال على",
-            "نموذج",
-            "اختبار"
-        ]
+        analysis = lib.arabic.analyze(post_content)
+        normalized = analysis["normalized"]
         
-        for phrase in generic_phrases:
-            if phrase in post_content.lower():
-                return False
+        # Check for generic/template phrases that indicate poor generation
+        if GENERIC_PHRASES.search(normalized):
+            return False
         
         # Check that it has proper structure for the type
-        if post_type == "did_you_know" and "هل تعلم" not in post_content:
-            return False
-        elif post_type == "definition" and "تعريف" not in post_content:
-            return False
-        elif post_type == "quick_tip" and "نصيحة" not in post_content:
+        marker = TYPE_MARKERS.get(post_type)
+        if marker is not None and not marker.search(normalized):
             return False
         
-        # Check for Arabic content (should have some Arabic characters)
-        arabic_chars = len(re.findall(r'[\u0600-\u06FF]', post_content))
-        if arabic_chars < 10:  # Should have at least 10 Arabic characters
+        # Check for Arabic content (should have some Arabic letters)
+        if analysis["arabic_letters"] < 10:
             return False
         
         return True 
\ No newline at end of file
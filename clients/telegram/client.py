@@ -1,65 +1,146 @@
 from telegram import Bot
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 import asyncio
-import requests
+from functools import partial
 from io import BytesIO
-import mimetypes
+import lib.aio
+import lib.deadline
+import lib.http
+import lib.metrics
+import lib.ratelimit
+
+IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
 
 class Client:
     def __init__(self, config):
         """
         Initialize the Telegram client.
+
+        The Bot and the shared async HTTP client (lib.http) live on the
+        background event loop (lib.aio) and are reused by every send.
         :param config: Configuration object containing bot_token and chat_id
         """
-        self.bot = Bot(token=config.bot_token)
+        self.bot = Bot(
+            token=config.bot_token,
+            request=HTTPXRequest(
+                connection_pool_size=config.connection_pool_size,
+                http_version="2" if lib.http.HTTP2_AVAILABLE else "1.1"
+            )
+        )
         self.chat_id = config.chat_id
+        self.limiter = lib.ratelimit.get_limiter()
+        self.loop = lib.aio.get_loop()
+        self._initialized = False
+        self._init_lock = None
 
-    async def _send_message(self, message, link=None, image_url=None):
+    async def initialize(self):
+        """
+        Open the Bot's connection pool once
+        """
+        if self._initialized:
+            return
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self._initialized:
+                return
+            await self.bot.initialize()
+            self._initialized = True
+
+    async def _close(self):
+        if self._initialized:
+            await self.bot.shutdown()
+            self._initialized = False
+
+    def close(self):
+        """
+        Close the Bot's connection pool
+        """
+        self.loop.run(self._close())
+
+    async def _rate_limited(self, key, method, timeout=None, **kwargs):
+        """
+        Call a Bot method through the shared rate limiter
+
+        :param timeout: (Optional) Seconds the wait for tokens and each network phase may take
+        """
+        # Waiting for tokens blocks, keep it off the event loop; the executor's
+        # threads do not see the caller's deadline, so its timeout is passed on
+        await asyncio.get_running_loop().run_in_executor(
+            None, partial(self.limiter.acquire, key, max_wait_seconds=timeout)
+        )
+        if timeout is not None:
+            kwargs.update(read_timeout=timeout, write_timeout=timeout, connect_timeout=timeout, pool_timeout=timeout)
+        try:
+            with lib.metrics.timer(key):
+                return await method(**kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self.limiter.block(key, retry_after)
+            raise
+
+    async def _send_message(self, message, link=None, image_url=None, timeout=None):
         """
         Internal async method to send a message
+
+        :param timeout: (Optional) Timeout of each call, what is left of the caller's deadline
         """
+        download = {} if timeout is None else {"timeout": timeout}
         full_message = message
         if link:
             full_message = f"{message}\n\n{link}"
         
         if image_url:
             try:
-                # Download the image with proper headers
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                response = requests.get(image_url, headers=headers)
-                response.raise_for_status()
+                # Download the image without blocking the loop, through the shared pool
+                with lib.metrics.timer("telegram.image_download"):
+                    response = await lib.http.get_async_client().get(image_url, headers=IMAGE_HEADERS, **download)
+                    response.raise_for_status()
                 
                 # Create a temporary file-like object
                 image_data = BytesIO(response.content)
                 
                 # Send photo with caption
-                return await self.bot.send_photo(
+                return await self._rate_limited(
+                    "telegram.send_photo",
+                    self.bot.send_photo,
+                    timeout=timeout,
                     chat_id=self.chat_id,
                     photo=image_data,
                     caption=full_message,
                     parse_mode='HTML'
                 )
+            except RetryAfter:
+                # Rate limited, a text-only fallback would be rejected as well
+                raise
             except Exception as e:
                 print(f"Error uploading image to Telegram: {str(e)}")
                 # Fall back to text-only message if image upload fails
-                return await self.bot.send_message(
+                return await self._rate_limited(
+                    "telegram.send_message",
+                    self.bot.send_message,
+                    timeout=timeout,
                     chat_id=self.chat_id,
                     text=full_message,
                     parse_mode='HTML'
                 )
         else:
             # Send text only
-            return await self.bot.send_message(
+            return await self._rate_limited(
+                "telegram.send_message",
+                self.bot.send_message,
+                timeout=timeout,
                 chat_id=self.chat_id,
                 text=full_message,
                 parse_mode='HTML'
             )
 
-    def send(self, message, link=None, image_url=None, dry_run=False):
+    async def send_async(self, message, link=None, image_url=None, dry_run=False):
         """
-        Send a message to the configured Telegram chat.
+        Send a message to the configured Telegram chat from any event loop.
         :param message: The text message to send
         :param link: (Optional) A URL to include in the message
         :param image_url: (Optional) URL of the image to attach
@@ -68,15 +149,39 @@ class Client:
         """
         if dry_run:
             return {"id": "dry_run"}
-        
+
+        # The Bot's pool is bound to the background loop, so the work runs there;
+        # the deadline does not follow it, its timeout does
+        timeout = lib.deadline.timeout(what="telegram.send")
         try:
-            # Run the async function in an event loop
-            loop = asyncio.get_event_loop()
-            if loop.is_closed():
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            response = loop.run_until_complete(self._send_message(message, link, image_url))
-            return response
+            return await asyncio.wait_for(
+                self.loop.run_async(self._initialized_send(message, link, image_url, timeout)), timeout
+            )
         except TelegramError as e:
-            raise Exception(f"Failed to send Telegram message: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Failed to send Telegram message: {str(e)}")
+
+    async def _initialized_send(self, message, link=None, image_url=None, timeout=None):
+        await self.initialize()
+        return await self._send_message(message, link, image_url, timeout)
+
+    async def _send_async_under(self, deadline, message, link=None, image_url=None):
+        # Tasks on the background loop do not inherit the caller's context
+        with lib.deadline.use(deadline):
+            return await self.send_async(message, link, image_url)
+
+    def send(self, message, link=None, image_url=None, dry_run=False):
+        """
+        Send a message to the configured Telegram chat, see send_async().
+        :param message: The text message to send
+        :param link: (Optional) A URL to include in the message
+        :param image_url: (Optional) URL of the image to attach
+        :param dry_run: (Optional) If True, the message will not be sent.
+        :return: The response from the Telegram API
+        """
+        if dry_run:
+            return {"id": "dry_run"}
+
+        timeout = lib.deadline.timeout(what="telegram.send")
+        return self.loop.run(
+            self._send_async_under(lib.deadline.current(), message, link, image_url), timeout=timeout
+        )
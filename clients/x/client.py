@@ -1,8 +1,26 @@
 import tweepy
-import requests
 from io import BytesIO
+import hashlib
 import mimetypes
-import os
+import queue
+import threading
+import time
+import lib.deadline
+import lib.http
+import lib.media_cache
+import lib.metrics
+import lib.ratelimit
+
+IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Images at least this large are uploaded in chunks while they download
+CHUNKED_UPLOAD_MIN_BYTES = 1024 * 1024
+CHUNK_SIZE = 512 * 1024
+
+# Lifetime assumed for a media ID when X does not report expires_after_secs
+DEFAULT_MEDIA_EXPIRY_SECONDS = 3600
 
 class Client:
     def __init__(self, config):        
@@ -19,6 +37,16 @@ class Client:
         )
         self.api = tweepy.API(auth)
 
+        # Keep the shared rate limiter in sync with X's rate-limit headers
+        self.limiter = lib.ratelimit.get_limiter()
+        self.limiter.instrument(self.client.session)
+        self.limiter.instrument(self.api.session)
+        # tweepy sets no timeouts, the current deadline bounds its requests
+        lib.http.instrument_session(self.client.session)
+        lib.http.instrument_session(self.api.session)
+
+        self.media_cache = lib.media_cache.get_media_cache()
+
     def send(self, message, image_url=None, dry_run=False):
         if dry_run:
             return {"id": "dry_run"}
@@ -26,36 +54,135 @@ class Client:
         media_ids = []
         if image_url:
             try:
-                # Download the image with proper headers
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                response = requests.get(image_url, headers=headers)
-                response.raise_for_status()
-                
-                # Get the content type and extension
-                content_type = response.headers.get('content-type', '')
-                ext = mimetypes.guess_extension(content_type) or '.jpg'
-                
-                # Create a temporary file-like object
-                image_data = BytesIO(response.content)
-                
-                # Upload the image with proper filename and content type
-                media = self.api.media_upload(
-                    filename=f"image{ext}",
-                    file=image_data,
-                    media_category='tweet_image'
-                )
-                media_ids.append(media.media_id)
+                media_ids.append(self.upload_image(image_url))
             except Exception as e:
                 print(f"Error uploading image to Twitter: {str(e)}")
                 # Don't include media_ids if upload failed
                 media_ids = []
         
         # Only include media_ids in the tweet if we have them
-        if media_ids:
-            response = self.client.create_tweet(text=message, media_ids=media_ids)
-        else:
-            response = self.client.create_tweet(text=message)
+        self.limiter.acquire("x.tweet_create")
+        with lib.metrics.timer("x.create_tweet"):
+            if media_ids:
+                response = self.client.create_tweet(text=message, media_ids=media_ids)
+            else:
+                response = self.client.create_tweet(text=message)
             
         return response
+
+    def upload_image(self, image_url):
+        """
+        Upload an image for a tweet, reusing the media ID of an earlier upload
+        of the same bytes while X still accepts it
+        :param image_url: URL of the image
+        :return: Media ID
+        """
+        data = None
+        with lib.metrics.timer("x.image_download"):
+            http = lib.http.get_client()
+            response = http.send(http.build_request("GET", image_url, headers=IMAGE_HEADERS), stream=True)
+            try:
+                response.raise_for_status()
+                content_type = response.headers.get('content-type', '').split(';')[0].strip() or 'image/jpeg'
+                total_bytes = int(response.headers.get('content-length') or 0)
+                # The URL may serve other bytes by now, an upload known for it is only
+                # reused once the downloaded bytes hash the same. Large images
+                # otherwise go up while the rest is still downloading.
+                if total_bytes < CHUNKED_UPLOAD_MIN_BYTES or self.media_cache.get_by_url("x", image_url):
+                    data = response.read()
+            except Exception:
+                response.close()
+                raise
+
+        if data is None:
+            try:
+                media, digest = self._chunked_upload(response.iter_bytes(CHUNK_SIZE), total_bytes, content_type)
+            finally:
+                response.close()
+        else:
+            digest = lib.media_cache.content_hash(data)
+            media_id = self.media_cache.get("x", digest)
+            if media_id:
+                self.media_cache.add_url("x", image_url, digest)
+                return media_id
+
+            if len(data) >= CHUNKED_UPLOAD_MIN_BYTES:
+                chunks = (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+                media, _ = self._chunked_upload(chunks, len(data), content_type)
+            else:
+                ext = mimetypes.guess_extension(content_type) or '.jpg'
+                self.limiter.acquire("x.media_upload")
+                with lib.metrics.timer("x.media_upload"):
+                    media = self.api.media_upload(
+                        filename=f"image{ext}",
+                        file=BytesIO(data),
+                        media_category='tweet_image'
+                    )
+
+        expires_in = getattr(media, "expires_after_secs", None) or DEFAULT_MEDIA_EXPIRY_SECONDS
+        self.media_cache.put("x", digest, media.media_id, expires_in, url=image_url)
+        return str(media.media_id)
+
+    def _chunked_upload(self, source, total_bytes, content_type):
+        """
+        INIT/APPEND/FINALIZE upload of an image's chunks; a background thread
+        keeps reading them (e.g. from a streaming download) while the previous
+        chunk is appended
+        :param source: Iterable of the image's chunks of bytes
+        :return: Tuple of (finalized tweepy Media, content hash of the bytes)
+        """
+        chunks = queue.Queue(maxsize=4)
+        stop = threading.Event()
+        sha256 = hashlib.sha256()
+
+        def download():
+            try:
+                for chunk in source:
+                    sha256.update(chunk)
+                    while not stop.is_set():
+                        try:
+                            chunks.put(chunk, timeout=1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+                chunks.put(None)
+            except Exception as e:
+                chunks.put(e)
+
+        downloader = threading.Thread(target=download, name="x-media-download", daemon=True)
+        try:
+            with lib.metrics.timer("x.media_upload"):
+                self.limiter.acquire("x.media_upload")
+                media = self.api.chunked_upload_init(total_bytes, content_type, media_category='tweet_image')
+                downloader.start()
+
+                segment_index = 0
+                while True:
+                    chunk = chunks.get()
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    self.limiter.acquire("x.media_upload")
+                    self.api.chunked_upload_append(media.media_id, chunk, segment_index)
+                    segment_index += 1
+
+                self.limiter.acquire("x.media_upload")
+                media = self._wait_for_processing(self.api.chunked_upload_finalize(media.media_id))
+        finally:
+            stop.set()
+
+        return media, sha256.hexdigest()
+
+    def _wait_for_processing(self, media):
+        info = getattr(media, "processing_info", None)
+        while info and info.get("state") in ("pending", "in_progress"):
+            lib.deadline.check(f"X finished processing media {media.media_id}")
+            time.sleep(min(info.get("check_after_secs", 1), lib.deadline.remaining() or float("inf")))
+            media = self.api.get_media_upload_status(media.media_id)
+            info = getattr(media, "processing_info", None)
+        if info and info.get("state") == "failed":
+            raise Exception(f"X could not process media {media.media_id}: {info.get('error')}")
+        return media
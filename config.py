@@ -1,3 +1,10 @@
+import hashlib
+import logging
+import os
+import re
+import subprocess
+import threading
+
 import yaml
 
 class X:
@@ -9,11 +16,15 @@ class X:
         self.bearer_token = data.get("bearer_token")
 
 class Facebook:
-    def __init__(self, data):
+    def __init__(self, data, data_dir):
         self.access_token = data.get("access_token")
         self.page_id = data.get("page_id")
         self.app_id = data.get("app_id")
         self.app_secret = data.get("app_secret")
+        self.photo_by_url = data.get("photo_by_url", True)
+        # Renewed tokens and their expiry, see lib.facebook_tokens
+        self.token_file = data.get("token_file", f"{data_dir}/facebook_tokens.json")
+        self.renew_before_days = data.get("renew_before_days", 7)
 
 class LinkedIn:
     def __init__(self, data):
@@ -26,6 +37,7 @@ class Telegram:
     def __init__(self, data):
         self.bot_token = data.get("bot_token")
         self.chat_id = data.get("chat_id")
+        self.connection_pool_size = data.get("connection_pool_size", 8)
 
 class OpenAI:
     def __init__(self, data):
@@ -34,24 +46,515 @@ class OpenAI:
         self.max_tokens = data.get("max_tokens", 1000)
         self.temperature = data.get("temperature", 0.7)
 
+# Platforms an article is routed to when a feed does not list its own
+DEFAULT_PLATFORMS = ["facebook", "x", "telegram"]
+
+class Feed:
+    def __init__(self, data, check_interval_minutes=None):
+        self.name = data.get("name")
+        self.feed_url = data.get("feed_url")
+        self.check_interval_minutes = data.get("check_interval_minutes", check_interval_minutes)
+        self.platforms = data.get("platforms") or list(DEFAULT_PLATFORMS)
+        self.history_file = data.get("history_file") or f"history/{self.name}.txt"
+
 class RSS:
-    def __init__(self, data):
+    def __init__(self, data, check_interval_minutes=None):
         self.feed_url = data.get("feed_url")
+        self.feeds = [Feed(feed, check_interval_minutes) for feed in data.get("feeds") or []]
+
+        # A bare feed_url is the single-feed setup, which keeps using history.txt
+        if not self.feeds and self.feed_url:
+            self.feeds = [Feed({
+                "name": "default",
+                "feed_url": self.feed_url,
+                "history_file": "history.txt"
+            }, check_interval_minutes)]
+
+class WebSub:
+    def __init__(self, data):
+        self.enabled = data.get("enabled", False)
+        self.callback_url = data.get("callback_url")
+        self.host = data.get("host", "0.0.0.0")
+        self.port = data.get("port", 8080)
+        self.hub_url = data.get("hub_url")
+        self.secret = data.get("secret")
+        self.lease_seconds = data.get("lease_seconds", 86400)
+
+class RateLimits:
+    def __init__(self, data):
+        # endpoint key -> (capacity, refill period in seconds)
+        self.limits = {
+            key: (limit.get("capacity"), limit.get("per_seconds"))
+            for key, limit in data.items()
+        }
+
+class Metrics:
+    def __init__(self, data, data_dir):
+        self.textfile = data.get("textfile", f"{data_dir}/metrics.prom")
+        self.host = data.get("host", "0.0.0.0")
+        self.port = data.get("port")
+        self.run_summary_dir = data.get("run_summary_dir", f"{data_dir}/runs")
+
+class Coordination:
+    def __init__(self, data, data_dir):
+        self.enabled = data.get("enabled", False)
+        self.backend = data.get("backend", "sqlite")
+        # Must be on a volume shared by every node
+        self.path = data.get("path", f"{data_dir}/coordination.sqlite3")
+        self.node_id = data.get("node_id")
+        self.lease_seconds = data.get("lease_seconds", 300)
+        self.shard_feeds = data.get("shard_feeds", True)
+
+class DailyContent:
+    def __init__(self, data, data_dir):
+        self.enabled = data.get("enabled", False)
+        self.post_types = data.get("post_types") or []
+        self.max_post_length = data.get("max_post_length", 200)
+        self.include_article_link = data.get("include_article_link", True)
+        # Posts generated per article, the ones failing validation are dropped
+        self.posts_per_run = data.get("posts_per_run", 5)
+        self.platforms = data.get("platforms") or list(DEFAULT_PLATFORMS)
+        self.path = data.get("path", f"{data_dir}/content_pool.sqlite3")
+        self.low_water_mark = data.get("low_water_mark", 10)
+        self.refill_articles = data.get("refill_articles", 3)
+        self.refill_interval_minutes = data.get("refill_interval_minutes", 60)
+        # Times of day (HH:MM, local time) --daemon publishes a pool post to every platform
+        self.publish_times = data.get("publish_times") or []
+
+class Usage:
+    def __init__(self, data, data_dir):
+        self.path = data.get("path", f"{data_dir}/usage.sqlite3")
+        # Scope (article, run, day) -> {"tokens": ..., "seconds": ...}
+        self.budgets = data.get("budgets") or {}
+        self.degrade_at = data.get("degrade_at", 0.8)
+        # Settings of the calls made past degrade_at of a budget
+        self.fallback_model = data.get("fallback_model")
+        self.fallback_max_tokens = data.get("fallback_max_tokens", 300)
+
+class HTTP:
+    def __init__(self, data):
+        # Multiplexed when the h2 package is installed and the host supports it
+        self.http2 = data.get("http2", True)
+        self.max_connections = data.get("max_connections", 100)
+        self.max_keepalive_connections = data.get("max_keepalive_connections", 20)
+        self.keepalive_expiry_seconds = data.get("keepalive_expiry_seconds", 30)
+        self.timeout_seconds = data.get("timeout_seconds", 30)
+        self.connect_timeout_seconds = data.get("connect_timeout_seconds", 10)
 
 class App:
     def __init__(self, data):
         self.check_interval_minutes = data.get("check_interval_minutes")
         self.log_level = data.get("log_level")
+        self.log_file = data.get("log_file")
+        self.log_max_bytes = data.get("log_max_bytes", 10 * 1024 * 1024)
+        self.log_backup_count = data.get("log_backup_count", 5)
+        self.log_rotate_when = data.get("log_rotate_when")
+        self.data_dir = data.get("data_dir", ".manshar")
+        self.config_watch_seconds = data.get("config_watch_seconds", 5)
+        self.extraction_workers = data.get("extraction_workers", 0)
+        self.run_deadline_seconds = data.get("run_deadline_seconds", 900)
+        # Stored stages of articles not processed for this long are deleted, 0 keeps them
+        self.article_retention_days = data.get("article_retention_days", 30)
+
+
+# Platforms that have a client
+PLATFORMS = ["facebook", "x", "telegram", "linkedin"]
+
+# Path of the config file, config.yaml.gpg is used when it only exists encrypted
+CONFIG_FILE_ENV = "MANSHAR_CONFIG"
+CONFIG_FILE = "config.yaml"
+ENCRYPTED_SUFFIX = ".gpg"
+# Passphrase for gpg; without it gpg asks its agent
+PASSPHRASE_ENV = "MANSHAR_CONFIG_PASSPHRASE"
+# Where the decrypted config is cached between runs; must be a tmpfs
+CACHE_DIR_ENV = "MANSHAR_CONFIG_CACHE_DIR"
+DEFAULT_CACHE_DIR = "/dev/shm"
+
+# Section name -> (class, sections its defaults are derived from), built in
+# this order so that a section's dependencies come before it
+SECTIONS = {
+    "app": (App, ()),
+    "x": (X, ()),
+    "facebook": (Facebook, ("app",)),
+    "linkedin": (LinkedIn, ()),
+    "telegram": (Telegram, ()),
+    "openai": (OpenAI, ()),
+    "rss": (RSS, ("app",)),
+    "websub": (WebSub, ()),
+    "rate_limits": (RateLimits, ()),
+    "metrics": (Metrics, ("app",)),
+    "coordination": (Coordination, ("app",)),
+    "daily_content": (DailyContent, ("app",)),
+    "usage": (Usage, ("app",)),
+    "http": (HTTP, ()),
+}
+
+# The C loader parses several times faster when libyaml is available
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class ErrInvalidConfig(Exception):
+    pass
+
+
+class ErrConfigDecryption(Exception):
+    pass
+
+
+def _build(name, data, built):
+    cls, _ = SECTIONS[name]
+    section = data.get(name) or {}
+    if name == "rss":
+        return cls(section, built["app"].check_interval_minutes)
+    if name in ("facebook", "metrics", "coordination", "daily_content", "usage"):
+        return cls(section, built["app"].data_dir)
+    return cls(section)
+
+
+class Config:
+    """
+    One validated snapshot of the config file. Snapshots are never modified;
+    a reload builds a new one and swaps it in as a whole.
+
+    Sections that did not change are the same objects as in the previous
+    snapshot, so anything built from them can be kept.
+    """
+
+    def __init__(self, data, source=None, fingerprint=None, previous=None):
+        self.data = data
+        self.source = source
+        self.fingerprint = fingerprint
+        self.changed = set(SECTIONS) if previous is None else self._changed_since(previous)
+
+        built = {}
+        for name in SECTIONS:
+            if name in self.changed:
+                built[name] = _build(name, data, built)
+            else:
+                built[name] = getattr(previous, name)
+            setattr(self, name, built[name])
+
+    def _changed_since(self, previous):
+        changed = {name for name in SECTIONS if self.data.get(name) != previous.data.get(name)}
+        # Defaults of some sections come from others, e.g. metrics paths from app.data_dir
+        for name, (_, depends_on) in SECTIONS.items():
+            if changed.intersection(depends_on):
+                changed.add(name)
+        return changed
+
+
+def validate(data):
+    """
+    Check the raw config for mistakes that would otherwise only show up mid-run
+
+    :raises ErrInvalidConfig: Listing every problem found
+    """
+    if not isinstance(data, dict):
+        raise ErrInvalidConfig("The config must be a mapping of sections")
+
+    problems = []
+    for name in SECTIONS:
+        if data.get(name) is not None and not isinstance(data[name], dict):
+            problems.append(f"{name}: must be a mapping")
+    if problems:
+        raise ErrInvalidConfig("; ".join(problems))
+
+    def positive(value):
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+    app = data.get("app") or {}
+    if app.get("check_interval_minutes") is not None and not positive(app["check_interval_minutes"]):
+        problems.append("app.check_interval_minutes: must be a positive number")
+    if app.get("extraction_workers") is not None and not (isinstance(app["extraction_workers"], int) and app["extraction_workers"] >= 0):
+        problems.append("app.extraction_workers: must be a number of processes, 0 to parse in-process")
+    if app.get("run_deadline_seconds") is not None and not (isinstance(app["run_deadline_seconds"], (int, float)) and app["run_deadline_seconds"] >= 0):
+        problems.append("app.run_deadline_seconds: must be a number of seconds, 0 for no deadline")
+    if app.get("article_retention_days") is not None and not (isinstance(app["article_retention_days"], (int, float)) and app["article_retention_days"] >= 0):
+        problems.append("app.article_retention_days: must be a number of days, 0 to keep every article")
+    if app.get("log_level") and not isinstance(logging.getLevelName(str(app["log_level"]).upper()), int):
+        problems.append(f"app.log_level: unknown level {app['log_level']}")
+
+    feeds = (data.get("rss") or {}).get("feeds") or []
+    names = set()
+    for i, feed in enumerate(feeds):
+        if not isinstance(feed, dict):
+            problems.append(f"rss.feeds[{i}]: must be a mapping")
+            continue
+        if not feed.get("name") or not feed.get("feed_url"):
+            problems.append(f"rss.feeds[{i}]: name and feed_url are required")
+        if feed.get("name") in names:
+            problems.append(f"rss.feeds[{i}]: duplicate name {feed['name']}")
+        names.add(feed.get("name"))
+        unknown = set(feed.get("platforms") or []) - set(PLATFORMS)
+        if unknown:
+            problems.append(f"rss.feeds[{i}]: unknown platforms {sorted(unknown)}")
+        if feed.get("check_interval_minutes") is not None and not positive(feed["check_interval_minutes"]):
+            problems.append(f"rss.feeds[{i}].check_interval_minutes: must be a positive number")
+
+    facebook = data.get("facebook") or {}
+    if facebook.get("renew_before_days") is not None and not positive(facebook["renew_before_days"]):
+        problems.append("facebook.renew_before_days: must be a positive number")
+
+    websub = data.get("websub") or {}
+    if websub.get("enabled") and not websub.get("callback_url"):
+        problems.append("websub.callback_url: required when websub is enabled")
+    if websub.get("enabled") and not websub.get("secret"):
+        problems.append("websub.secret: required when websub is enabled, pushes are only accepted signed with it")
+
+    for key, limit in (data.get("rate_limits") or {}).items():
+        if not isinstance(limit, dict) or not positive(limit.get("capacity")) or not positive(limit.get("per_seconds")):
+            problems.append(f"rate_limits.{key}: capacity and per_seconds must be positive numbers")
+
+    coordination = data.get("coordination") or {}
+    if coordination.get("backend", "sqlite") not in ("sqlite", "local"):
+        problems.append(f"coordination.backend: unknown backend {coordination['backend']}, use sqlite or local")
+    if coordination.get("lease_seconds") is not None and not positive(coordination["lease_seconds"]):
+        problems.append("coordination.lease_seconds: must be a positive number")
+
+    daily_content = data.get("daily_content") or {}
+    unknown = set(daily_content.get("platforms") or []) - set(PLATFORMS)
+    if unknown:
+        problems.append(f"daily_content.platforms: unknown platforms {sorted(unknown)}")
+    for key in ("max_post_length", "posts_per_run", "low_water_mark", "refill_articles", "refill_interval_minutes"):
+        if daily_content.get(key) is not None and not positive(daily_content[key]):
+            problems.append(f"daily_content.{key}: must be a positive number")
+    for publish_time in daily_content.get("publish_times") or []:
+        if not re.fullmatch(r"([01]\d|2[0-3]):[0-5]\d", str(publish_time)):
+            problems.append(f"daily_content.publish_times: {publish_time} is not a quoted \"HH:MM\" time")
+
+    http = data.get("http") or {}
+    for key in ("max_connections", "max_keepalive_connections", "timeout_seconds", "connect_timeout_seconds"):
+        if http.get(key) is not None and not positive(http[key]):
+            problems.append(f"http.{key}: must be a positive number")
+
+    usage = data.get("usage") or {}
+    for scope, budget in (usage.get("budgets") or {}).items():
+        if scope not in ("article", "run", "day"):
+            problems.append(f"usage.budgets.{scope}: unknown scope, use article, run or day")
+        elif not isinstance(budget, dict) or set(budget) - {"tokens", "seconds"}:
+            problems.append(f"usage.budgets.{scope}: must set tokens and/or seconds")
+        else:
+            for kind, limit in budget.items():
+                if limit is not None and not positive(limit):
+                    problems.append(f"usage.budgets.{scope}.{kind}: must be a positive number")
+    if usage.get("degrade_at") is not None and not (positive(usage["degrade_at"]) and usage["degrade_at"] <= 1):
+        problems.append("usage.degrade_at: must be a fraction between 0 and 1")
+    if usage.get("fallback_max_tokens") is not None and not positive(usage["fallback_max_tokens"]):
+        problems.append("usage.fallback_max_tokens: must be a positive number")
+
+    openai = data.get("openai") or {}
+    if openai.get("max_tokens") is not None and not positive(openai["max_tokens"]):
+        problems.append("openai.max_tokens: must be a positive number")
+    if openai.get("temperature") is not None and not (isinstance(openai["temperature"], (int, float)) and 0 <= openai["temperature"] <= 2):
+        problems.append("openai.temperature: must be between 0 and 2")
+
+    if problems:
+        raise ErrInvalidConfig("; ".join(problems))
+
+
+def source_path():
+    """
+    Path of the config file to load, preferring the plain file over the encrypted one
+    """
+    path = os.environ.get(CONFIG_FILE_ENV, CONFIG_FILE)
+    if not os.path.exists(path) and os.path.exists(path + ENCRYPTED_SUFFIX):
+        return path + ENCRYPTED_SUFFIX
+    return path
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+# Decrypted config text of this process, by digest of the encrypted file
+_decrypted = {}
+
+
+def _cache_dir():
+    """
+    Directory holding decrypted configs between runs, or None to only cache
+    in memory. Only a directory owned by us and closed to everyone else is used.
+    """
+    base = os.environ.get(CACHE_DIR_ENV)
+    if base is None:
+        if not os.path.isdir(DEFAULT_CACHE_DIR):
+            return None
+        base = os.path.join(DEFAULT_CACHE_DIR, f"manshar-{os.getuid()}")
+    try:
+        os.makedirs(base, mode=0o700, exist_ok=True)
+        stat = os.stat(base)
+    except OSError:
+        return None
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        return None
+    return base
+
+
+def _decrypt(path):
+    with open(path, "rb") as f:
+        encrypted = f.read()
+    digest = hashlib.sha256(encrypted).hexdigest()
+    if digest in _decrypted:
+        return _decrypted[digest]
+
+    cache_dir = _cache_dir()
+    cache_file = os.path.join(cache_dir, f"config-{digest}.yaml") if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        command = ["gpg", "--batch", "--quiet", "--decrypt"]
+        passphrase = os.environ.get(PASSPHRASE_ENV)
+        if passphrase is not None:
+            command += ["--pinentry-mode", "loopback", "--passphrase-fd", "0"]
+        try:
+            result = subprocess.run(command + [path], input=(passphrase or "").encode(), capture_output=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None) or b""
+            raise ErrConfigDecryption(f"Could not decrypt {path}: {stderr.decode(errors='replace').strip() or e}")
+        text = result.stdout.decode("utf-8")
+        if cache_file:
+            _write_private(cache_dir, cache_file, text)
+
+    _decrypted.clear()
+    _decrypted[digest] = text
+    return text
+
+
+def _write_private(cache_dir, cache_file, text):
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_file, cache_file)
+
+    # Only the current version stays decrypted
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith("config-") and path != cache_file:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def load(previous=None):
+    """
+    Read, decrypt if needed, parse and validate the config file
+
+    :param previous: Snapshot whose unchanged sections are reused
+    :return: A new Config
+    :raises ErrInvalidConfig: If the file does not pass validation
+    :raises ErrConfigDecryption: If config.yaml.gpg cannot be decrypted
+    """
+    path = source_path()
+    # Taken before reading, so a write during the read triggers another reload
+    fingerprint = _fingerprint(path)
+    if path.endswith(ENCRYPTED_SUFFIX):
+        text = _decrypt(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+    data = yaml.load(text, Loader=_Loader) or {}
+    validate(data)
+    return Config(data, source=path, fingerprint=fingerprint, previous=previous)
+
+
+_current = None
+_lock = threading.Lock()
+_listeners = []
+
+
+def current():
+    """
+    The active Config, loaded on first access
+    """
+    global _current
+    snapshot = _current
+    if snapshot is None:
+        with _lock:
+            if _current is None:
+                _current = load()
+            snapshot = _current
+    return snapshot
+
+
+def __getattr__(name):
+    # `config.facebook` and `from config import facebook` read the active snapshot
+    if name in SECTIONS:
+        return getattr(current(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def subscribe(listener):
+    """
+    Call listener(changed_sections, config) after every reload that changed something
+    """
+    _listeners.append(listener)
+
+
+def reload(force=False):
+    """
+    Load the config file again and atomically replace the active snapshot.
+    An invalid file leaves the running config in place.
+
+    :param force: Reload even if the file did not change
+    :return: Set of section names that changed
+    """
+    global _current
+    with _lock:
+        previous = _current
+        if previous is not None and not force and _fingerprint(source_path()) == previous.fingerprint:
+            return set()
+        snapshot = load(previous)
+        _current = snapshot
+
+    if snapshot.changed:
+        for listener in list(_listeners):
+            try:
+                listener(snapshot.changed, snapshot)
+            except Exception as e:
+                _logger().error(f"Config reload listener {listener!r} failed: {str(e)}")
+    return snapshot.changed
+
+
+def _logger():
+    # Imported here, lib.logger reads this module while it is set up
+    import lib.logger
+    return lib.logger.get_logger(__name__)
+
+
+class ConfigWatcher:
+    """
+    Background thread that reloads the config when its file changes
+    """
+
+    def __init__(self, interval_seconds=5):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        current()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
 
-# Load YAML config
-with open("config.yaml", "r") as f:
-    _config = yaml.safe_load(f)
-
-# Global config objects
-x = X(_config.get("x", {}))
-facebook = Facebook(_config.get("facebook", {}))
-linkedin = LinkedIn(_config.get("linkedin", {}))
-telegram = Telegram(_config.get("telegram", {}))
-openai = OpenAI(_config.get("openai", {}))
-rss = RSS(_config.get("rss", {}))
-app = App(_config.get("app", {}))
+    def _run(self):
+        logger = _logger()
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                changed = reload()
+                if changed:
+                    logger.info(f"Reloaded config, changed sections: {', '.join(sorted(changed))}")
+            except FileNotFoundError:
+                # Deployments replace the file by removing it first
+                continue
+            except Exception as e:
+                logger.error(f"Keeping the running config, reload failed: {str(e)}")
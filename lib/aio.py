@@ -0,0 +1,81 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+
+class BackgroundLoop:
+    """
+    An asyncio event loop running forever on a daemon thread, so synchronous
+    code can run coroutines on it without creating a loop per call. Async
+    clients bound to it (httpx pools, the Telegram Bot) stay usable across calls.
+    """
+
+    def __init__(self, name="asyncio-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout=None):
+        """
+        Run a coroutine on the loop from another thread and wait for its result
+
+        :param timeout: (Optional) Seconds to wait; the coroutine is cancelled after them
+        :raises TimeoutError: If the coroutine did not finish in time
+        """
+        if self.is_current():
+            raise RuntimeError("BackgroundLoop.run() would block its own loop, await the coroutine instead")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not finish within {timeout:g}s")
+
+    async def run_async(self, coro):
+        """
+        Await a coroutine on the loop from any other event loop
+        """
+        if self.is_current():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def is_current(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def stop(self, timeout=None):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    The process-wide background loop, started on first use
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = BackgroundLoop()
+        return _loop
+
+
+def _after_fork_in_child():
+    # The loop thread does not survive a fork, the child starts its own on demand
+    global _loop, _lock
+    _loop = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
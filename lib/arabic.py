@@ -0,0 +1,123 @@
+import re
+
+# Harakat, tanween, shadda, sukun, dagger alef and Quranic annotation marks
+DIACRITICS = "\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06DC\u06DF-\u06E4\u06E7\u06E8\u06EA-\u06ED"
+TATWEEL = "\u0640"
+# Zero-width spaces and joiners, direction marks, bidi embeddings and isolates, BOM
+INVISIBLE = "\u200B-\u200F\u202A-\u202E\u2066-\u2069\uFEFF"
+
+EMOJI = "\u2600-\u27BF\U0001F1E0-\U0001F1FF\U0001F300-\U0001F5FF\U0001F600-\U0001F64F\U0001F680-\U0001F6FF\U0001F900-\U0001F9FF"
+ARABIC_LETTERS = "\u0621-\u063A\u0641-\u064A\u0671-\u06D3"
+
+
+def _expand(ranges):
+    """
+    Code points of a regex character class body made of characters and ranges, such as DIACRITICS
+    """
+    points, i = [], 0
+    while i < len(ranges):
+        if i + 2 < len(ranges) and ranges[i + 1] == "-":
+            points.extend(range(ord(ranges[i]), ord(ranges[i + 2]) + 1))
+            i += 3
+        else:
+            points.append(ord(ranges[i]))
+            i += 1
+    return points
+
+
+# Removes invisible characters, keeps everything that is displayed
+_CLEAN_TABLE = dict.fromkeys(_expand(INVISIBLE))
+
+# Folds the spellings of a word into one form for matching: no diacritics,
+# tatweel or invisible characters, one alef, one yaa, ASCII digits
+_STRIP = re.compile(f"[{DIACRITICS}{TATWEEL}{INVISIBLE}]+")
+_FOLD_TABLE = {
+    # Alef with hamza above / below, with madda, wasla
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0622": "\u0627", "\u0671": "\u0627",
+    # Alef maksura, Farsi and Pashto yeh
+    "\u0649": "\u064A", "\u06CC": "\u064A", "\u06D0": "\u064A",
+    # Keheh
+    "\u06A9": "\u0643",
+}
+# Arabic-Indic and extended Arabic-Indic digits
+_FOLD_TABLE.update(zip("\u0660\u0661\u0662\u0663\u0664\u0665\u0666\u0667\u0668\u0669"
+                       "\u06F0\u06F1\u06F2\u06F3\u06F4\u06F5\u06F6\u06F7\u06F8\u06F9",
+                       "01234567890123456789"))
+# Few characters of a text are folded, so they are looked up one match at a
+# time rather than with a str.translate() of every character
+_FOLD = re.compile(f"[{''.join(_FOLD_TABLE)}]")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# One pass over a text finds every token; a hashtag keeps its diacritics,
+# which \w alone would split it at
+_TOKENS = re.compile(
+    rf"(?P<hashtag>#(?:\w|[{DIACRITICS}])+)"
+    rf"|(?P<word>(?:\w|[{DIACRITICS}])+)"
+    rf"|(?P<emoji>[{EMOJI}])"
+    r"|(?P<question>[?؟])"
+)
+# Hashtags found in text that still has its invisible characters, which
+# are removed from the few matches instead of the whole text
+_HASHTAG = re.compile(
+    rf"#[{INVISIBLE}]*(?:\w|[{DIACRITICS}])(?:\w|[{DIACRITICS}{INVISIBLE}])*"
+)
+_EMOJI = re.compile(f"[{EMOJI}]")
+_ARABIC_LETTERS = re.compile(f"[{ARABIC_LETTERS}]+")
+
+
+def clean_text(text):
+    """
+    Remove invisible characters and collapse whitespace, for display
+    """
+    return _WHITESPACE.sub(" ", text.translate(_CLEAN_TABLE)).strip()
+
+
+def normalize(text):
+    """
+    Normalize text for matching, not for display: diacritics, tatweel and
+    invisible characters removed, alef and yaa variants and digits folded,
+    Latin letters lowercased
+    """
+    return _FOLD.sub(lambda match: _FOLD_TABLE[match.group()], _STRIP.sub("", text)).lower()
+
+
+def phrase_pattern(phrases):
+    """
+    Precompile a pattern finding any of the phrases in normalize()d text
+    """
+    alternatives = sorted({normalize(phrase) for phrase in phrases}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(phrase) for phrase in alternatives))
+
+
+def hashtags(text):
+    """
+    Hashtags of a text as written, invisible characters removed
+    """
+    return [tag.translate(_CLEAN_TABLE) for tag in _HASHTAG.findall(text)]
+
+
+def tokenize(text):
+    """
+    Normalized words and hashtags of a text
+    """
+    return [match.group() for match in _TOKENS.finditer(normalize(text)) if match.lastgroup in ("word", "hashtag")]
+
+
+def analyze(text):
+    """
+    Everything the post scoring and validation need, from one normalize()
+    of the text; every count runs in the regex engine, without a Python
+    loop over the tokens
+
+    :return: Dictionary with normalized text, hashtags (as written),
+        emoji_count, arabic_letters and has_question
+    """
+    normalized = normalize(text)
+    return {
+        "normalized": normalized,
+        "hashtags": hashtags(text),
+        "emoji_count": len(_EMOJI.findall(normalized)),
+        "arabic_letters": sum(map(len, _ARABIC_LETTERS.findall(normalized))),
+        "has_question": "?" in normalized or "\u061F" in normalized,
+    }
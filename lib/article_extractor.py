@@ -1,6 +1,9 @@
-import requests
+import httpx
 from bs4 import BeautifulSoup
 import re
+import lib.extraction_pool
+import lib.http
+import lib.metrics
 
 
 class ErrInvalidURL(Exception):
@@ -11,6 +14,14 @@ class ErrFailedToExtract(Exception):
     pass
 
 
+# Feeds that only carry an excerpt end it with one of these
+TRUNCATION_SUFFIXES = ('[…]', '[...]', '[&hellip;]', '…', '...')
+TRUNCATION_PHRASES = ('continue reading', 'read more', 'اقرأ المزيد', 'تابع القراءة', 'أكمل القراءة')
+
+# Feed bodies shorter than this are treated as excerpts
+MIN_FULL_CONTENT_LENGTH = 500
+
+
 def extract_article_content(url):
     """
     Extract article content from URL
@@ -27,10 +38,33 @@ def extract_article_content(url):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        with lib.metrics.timer("extract.fetch"):
+            response = lib.http.get_client().get(url, headers=headers)
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        raise ErrInvalidURL(f"Failed to fetch URL: {str(e)}")
+
+    return extract_content_from_html(response.content, url)
+
+
+def extract_content_from_html(html, url, title=""):
+    """
+    Extract article content from an HTML page or fragment
+    
+    :param html: HTML of the article page, or the article body from a feed
+    :param url: URL of the article
+    :param title: (Optional) Title to use when the HTML has no <title>
+    :return: Dictionary with title and content
+    :raises ErrFailedToExtract: If content extraction fails
+    """
+    with lib.metrics.timer("extract.parse"):
+        # On a worker process when an extraction pool is configured
+        return lib.extraction_pool.run(_extract_content_from_html, html, url, title)
+
+
+def _extract_content_from_html(html, url, title=""):
+    try:
+        soup = BeautifulSoup(html, 'html.parser')
         
         # Remove script and style elements
         for script in soup(["script", "style", "nav", "header", "footer", "aside"]):
@@ -38,7 +72,6 @@ def extract_article_content(url):
         
         # Try to find the main content
         content = ""
-        title = ""
         
         # Get title
         title_tag = soup.find('title')
@@ -74,16 +107,15 @@ def extract_article_content(url):
         
         # If still no content, get all text from body
         if not content:
-            body = soup.find('body')
-            if body:
-                content = body.get_text()
-        
-        if not content:
-            raise ErrFailedToExtract("No content found in the article")
+            body = soup.find('body') or soup
+            content = body.get_text()
         
         # Clean up the text
         content = re.sub(r'\s+', ' ', content).strip()
         
+        if not content:
+            raise ErrFailedToExtract("No content found in the article")
+        
         # Limit content to avoid token limits (8000 characters should be enough)
         if len(content) > 8000:
             content = content[:8000]
@@ -94,12 +126,50 @@ def extract_article_content(url):
             'url': url
         }
         
-    except requests.exceptions.RequestException as e:
-        raise ErrInvalidURL(f"Failed to fetch URL: {str(e)}")
+    except ErrFailedToExtract:
+        raise
     except Exception as e:
         raise ErrFailedToExtract(f"Failed to extract article content: {str(e)}")
 
 
+def is_truncated(content):
+    """
+    Check if extracted feed text looks like an excerpt rather than the full article
+    
+    :param content: Text extracted from the feed body
+    :return: Boolean indicating if the full article has to be fetched
+    """
+    # WordPress appends this footer to full and excerpt bodies alike
+    content = re.sub(r'The post .* appeared first on .*$', '', content or '').strip()
+    if len(content) < MIN_FULL_CONTENT_LENGTH:
+        return True
+    if content.endswith(TRUNCATION_SUFFIXES):
+        return True
+    tail = content[-200:].lower()
+    return any(phrase in tail for phrase in TRUNCATION_PHRASES)
+
+
+def extract_article(article):
+    """
+    Extract the content of a feed article, using the body the feed already
+    carries and only fetching the article URL when that body is truncated
+    
+    :param article: Article dictionary as returned by lib.rss
+    :return: Dictionary with title and content
+    :raises ErrInvalidURL: If the article has to be fetched and its URL is invalid or inaccessible
+    :raises ErrFailedToExtract: If content extraction fails
+    """
+    if article.get('content'):
+        try:
+            article_data = extract_content_from_html(article['content'], article.get('link'), article.get('title', ''))
+            if not is_truncated(article_data['content']):
+                return article_data
+        except ErrFailedToExtract:
+            pass
+
+    return extract_article_content(article.get('link'))
+
+
 def extract_article_metadata(url):
     """
     Extract article metadata including title, description, and image
@@ -114,7 +184,7 @@ def extract_article_metadata(url):
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
-        response = requests.get(url, headers=headers, timeout=30)
+        response = lib.http.get_client().get(url, headers=headers)
         response.raise_for_status()
         
         soup = BeautifulSoup(response.content, 'html.parser')
@@ -189,7 +259,7 @@ def extract_article_metadata(url):
         
         return metadata
         
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         raise ErrInvalidURL(f"Failed to fetch URL: {str(e)}")
     except Exception as e:
         raise ErrFailedToExtract(f"Failed to extract article metadata: {str(e)}")
@@ -0,0 +1,157 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import lib.logger
+
+logger = lib.logger.get_logger(__name__)
+
+PUBLISHED = "published"
+# Published on some platforms, the rest is left to the outbox's retries
+QUEUED = "queued"
+FAILED = "failed"
+
+
+class Checkpoint:
+    """
+    State of a backfill, kept so that an interrupted run resumes where it
+    stopped: the articles found in the archive, written once, and a journal
+    appended with the outcome of every article.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.articles_file = os.path.join(directory, "articles.json")
+        self.journal_file = os.path.join(directory, "journal.jsonl")
+        self.articles = None
+        self.status = {}
+
+        if os.path.exists(self.articles_file):
+            with open(self.articles_file, "r", encoding="utf-8") as f:
+                self.articles = json.load(f)
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    self.status[entry["id"]] = entry["status"]
+
+    @property
+    def walked(self):
+        return self.articles is not None
+
+    def set_articles(self, articles):
+        """
+        Store the articles to backfill, in publishing order
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_file = self.articles_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(articles, f, ensure_ascii=False)
+        os.replace(tmp_file, self.articles_file)
+        self.articles = articles
+
+    def mark(self, article_id, status):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.journal_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"id": article_id, "status": status, "at": time.time()}) + "\n")
+        self.status[article_id] = status
+
+    def pending(self):
+        """
+        Articles not published yet; failed ones are tried again
+        """
+        return [article for article in self.articles or [] if self.status.get(article["id"]) not in (PUBLISHED, QUEUED)]
+
+
+class Progress:
+    """
+    Counts finished articles and estimates throughput and time left
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+
+    def update(self, failed=False):
+        self.done += 1
+        if failed:
+            self.failed += 1
+
+    def rate_per_minute(self):
+        elapsed = time.monotonic() - self.started_at
+        return self.done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def eta_seconds(self):
+        rate = self.rate_per_minute()
+        return (self.total - self.done) / rate * 60 if rate else None
+
+    def __str__(self):
+        percent = self.done / self.total * 100 if self.total else 100
+        eta = self.eta_seconds()
+        eta = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta is not None else "--:--:--"
+        return (f"{self.done}/{self.total} ({percent:.0f}%), {self.failed} failed, "
+                f"{self.rate_per_minute():.1f} articles/min, ETA {eta}")
+
+
+def run(articles, prepare, publish, checkpoint=None, workers=4, pace_seconds=0):
+    """
+    Prepare articles in parallel and publish them in order, at most one
+    every pace_seconds
+
+    Preparation runs ahead of publishing by at most two articles per worker.
+    Every outcome is recorded in the checkpoint as soon as it is known.
+
+    :param articles: Articles to backfill, in publishing order
+    :param prepare: Callable taking an article and returning what publish needs, run on worker threads
+    :param publish: Callable taking an article and the result of prepare, returning True if it is
+        published everywhere or False if some platforms were left for retries
+    :param checkpoint: (Optional) Checkpoint to record outcomes in
+    :param workers: Number of articles prepared concurrently
+    :param pace_seconds: Minimum time between two publishes
+    :return: Progress of the run
+    """
+    progress = Progress(len(articles))
+    pending = iter(articles)
+    window = deque()
+    next_publish_at = 0
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        def submit_next():
+            article = next(pending, None)
+            if article is not None:
+                window.append((article, executor.submit(prepare, article)))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while window:
+            article, future = window.popleft()
+            submit_next()
+
+            status = FAILED
+            try:
+                prepared = future.result()
+                time.sleep(max(0, next_publish_at - time.monotonic()))
+                next_publish_at = time.monotonic() + pace_seconds
+                status = PUBLISHED if publish(article, prepared) else QUEUED
+            except Exception as e:
+                logger.error(f"Backfill of {article['id']} failed: {str(e)}")
+
+            if checkpoint:
+                checkpoint.mark(article["id"], status)
+            progress.update(failed=status == FAILED)
+            logger.info(f"Backfill {progress} - {article['id']}: {status}")
+    finally:
+        # An interrupted run drops the articles being prepared, they are still pending
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return progress
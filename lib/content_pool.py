@@ -0,0 +1,279 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import lib.deadline
+import lib.logger
+
+logger = lib.logger.get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    article_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    post TEXT NOT NULL,
+    hashtags TEXT NOT NULL,
+    engagement_score REAL NOT NULL DEFAULT 0,
+    article TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (article_id, post)
+);
+CREATE TABLE IF NOT EXISTS uses (
+    post_id INTEGER NOT NULL,
+    platform TEXT NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (post_id, platform)
+);
+CREATE TABLE IF NOT EXISTS sources (
+    article_id TEXT PRIMARY KEY,
+    generated_at REAL NOT NULL
+);
+"""
+
+# Article fields a daily post needs to be rendered without the article store
+ARTICLE_FIELDS = ("id", "title", "link", "cover_image")
+
+
+class ContentPool:
+    """
+    Daily posts generated ahead of time, backed by SQLite so that publishing
+    one is a local read instead of two OpenAI calls. Each post is used at
+    most once per platform; posts are handed out rotating over their types.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add(self, article, posts):
+        """
+        Store the daily posts generated from an article
+
+        :param article: Article dictionary as returned by lib.rss
+        :param posts: Posts as returned by the OpenAI client's generate_daily_posts
+        :return: Number of posts added
+        """
+        now = time.time()
+        source = json.dumps({field: article.get(field) for field in ARTICLE_FIELDS}, ensure_ascii=False)
+        with closing(self._connect()) as conn:
+            added = 0
+            for post in posts:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO posts (article_id, type, post, hashtags, engagement_score, article, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (article["id"], post.get("type") or "general", post["post"],
+                     json.dumps(post.get("hashtags") or [], ensure_ascii=False),
+                     post.get("engagement_score") or 0, source, now)
+                )
+                added += cursor.rowcount
+            # Remembered even without posts, so a refill does not ask again for the same article
+            conn.execute("INSERT OR REPLACE INTO sources (article_id, generated_at) VALUES (?, ?)", (article["id"], now))
+        return added
+
+    def has_source(self, article_id):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM sources WHERE article_id = ?", (article_id,)).fetchone() is not None
+
+    def _available_query(self, columns, platform, post_types=None):
+        query = (f"SELECT {columns} FROM posts WHERE NOT EXISTS"
+                 " (SELECT 1 FROM uses WHERE uses.post_id = posts.id AND uses.platform = ?)")
+        params = [platform]
+        if post_types:
+            query += f" AND type IN ({', '.join('?' for _ in post_types)})"
+            params.extend(post_types)
+        return query, params
+
+    def available(self, platform, post_types=None):
+        """
+        Number of posts not used on a platform yet
+
+        :param platform: Platform name
+        :param post_types: (Optional) Only count posts of these types
+        :return: Dictionary of post type to number of posts
+        """
+        query, params = self._available_query("type, COUNT(*) AS count", platform, post_types)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query + " GROUP BY type", params).fetchall()
+        return {row["type"]: row["count"] for row in rows}
+
+    def _next(self, conn, platform, post_types=None):
+        # The type used longest ago on the platform goes next, then the best scored post of it
+        last_used = dict(conn.execute(
+            "SELECT posts.type, MAX(uses.used_at) FROM uses JOIN posts ON posts.id = uses.post_id"
+            " WHERE uses.platform = ? GROUP BY posts.type", (platform,)
+        ).fetchall())
+        query, params = self._available_query("DISTINCT type", platform, post_types)
+        types = [row["type"] for row in conn.execute(query, params).fetchall()]
+        if not types:
+            return None
+        post_type = min(types, key=lambda t: (last_used.get(t, 0), post_types.index(t) if post_types else 0))
+
+        query, params = self._available_query("*", platform, [post_type])
+        return conn.execute(query + " ORDER BY engagement_score DESC, created_at LIMIT 1", params).fetchone()
+
+    def peek(self, platform, post_types=None):
+        """
+        The post take() would return, without using it
+
+        :return: Post dictionary, or None if the pool has nothing left for the platform
+        """
+        with closing(self._connect()) as conn:
+            return _to_post(self._next(conn, platform, post_types))
+
+    def take(self, platform, post_types=None):
+        """
+        Atomically pick the next post for a platform and mark it used there
+
+        :param platform: Platform name
+        :param post_types: (Optional) Post types to choose from, in order of preference
+        :return: Post dictionary with id, type, post, hashtags, engagement_score and the
+            article fields, or None if the pool has nothing left for the platform
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = self._next(conn, platform, post_types)
+            if row is not None:
+                conn.execute("INSERT INTO uses (post_id, platform, used_at) VALUES (?, ?, ?)",
+                             (row["id"], platform, time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return _to_post(row)
+
+    def prune(self, platforms):
+        """
+        Delete the posts used on every one of the platforms
+
+        :return: Number of posts deleted
+        """
+        if not platforms:
+            return 0
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "DELETE FROM posts WHERE id IN (SELECT post_id FROM uses"
+                f" WHERE platform IN ({', '.join('?' for _ in platforms)})"
+                " GROUP BY post_id HAVING COUNT(DISTINCT platform) = ?)", (*platforms, len(platforms))
+            )
+            conn.execute("DELETE FROM uses WHERE post_id NOT IN (SELECT id FROM posts)")
+        return cursor.rowcount
+
+
+def _to_post(row):
+    if row is None:
+        return None
+    return {
+        "id": row["id"],
+        "type": row["type"],
+        "post": row["post"],
+        "hashtags": json.loads(row["hashtags"]),
+        "engagement_score": row["engagement_score"],
+        "article": json.loads(row["article"]),
+    }
+
+
+def refill(pool, candidates, generate, platforms, post_types=None, low_water_mark=10, max_articles=3):
+    """
+    Generate daily posts from new articles while any platform has fewer than
+    low_water_mark posts left
+
+    :param pool: ContentPool to fill
+    :param candidates: Iterable of articles to generate from, newest first; articles
+        the pool already generated from are skipped
+    :param generate: Callable taking an article and returning its daily posts
+    :param platforms: Platforms the pool serves
+    :param post_types: (Optional) Post types the pool serves, the others are not stored
+    :param low_water_mark: Posts per platform below which the pool is refilled
+    :param max_articles: Maximum number of articles generated from in one call
+    :return: Number of posts added
+    """
+    def lowest():
+        return min((sum(pool.available(platform, post_types).values()) for platform in platforms), default=0)
+
+    if lowest() >= low_water_mark:
+        return 0
+
+    added = generated = 0
+    for article in candidates:
+        if generated >= max_articles or lowest() >= low_water_mark or lib.deadline.expired():
+            break
+        if pool.has_source(article["id"]):
+            continue
+        generated += 1
+        try:
+            posts = generate(article)
+        except Exception as e:
+            # Not remembered as a source, the next refill tries the article again
+            logger.error(f"Daily content pool: generating from {article['id']} failed: {str(e)}")
+            continue
+        if post_types:
+            posts = [post for post in posts if post.get("type") in post_types]
+        added += pool.add(article, posts)
+        logger.info(f"Daily content pool: {len(posts)} posts generated from {article['id']}")
+
+    if lowest() < low_water_mark:
+        logger.warning(f"Daily content pool is still below {low_water_mark} posts on some platform")
+    return added
+
+
+class ContentPoolRefiller:
+    """
+    Background thread that keeps the content pool above its low-water mark
+    """
+
+    def __init__(self, refill, interval_seconds=3600):
+        """
+        :param refill: Callable doing one refill, see refill()
+        :param interval_seconds: Time between two checks of the pool
+        """
+        self.refill = refill
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="content-pool-refiller", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refill()
+            except Exception as e:
+                logger.error(f"Content pool refill error: {str(e)}")
+            self._stop.wait(self.interval_seconds)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_content_pool():
+    """
+    The process-wide content pool, at daily_content.path
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from config import daily_content as daily_content_config
+            _pool = ContentPool(daily_content_config.path)
+    return _pool
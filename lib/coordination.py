@@ -0,0 +1,274 @@
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+
+import lib.logger
+
+logger = lib.logger.get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+class SQLiteLeases:
+    """
+    Leases in a SQLite database. Every node must open the same file, e.g. on
+    a shared volume whose file system supports POSIX locks; each lease
+    change is a single atomic statement.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def acquire(self, name, owner, ttl_seconds):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at"
+                " WHERE leases.done = 0 AND (leases.owner = excluded.owner OR leases.expires_at <= ?)",
+                (name, owner, now + ttl_seconds, now)
+            )
+            return cursor.rowcount == 1
+
+    def renew(self, names, owner, ttl_seconds):
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ? AND done = 0",
+                [(time.time() + ttl_seconds, name, owner) for name in names]
+            )
+
+    def release(self, name, owner):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ? AND done = 0", (name, owner))
+
+    def complete(self, name, owner):
+        with closing(self._connect()) as conn:
+            conn.execute("UPDATE leases SET done = 1 WHERE name = ? AND owner = ?", (name, owner))
+
+    def heartbeat(self, node_id):
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT OR REPLACE INTO nodes (node_id, last_seen) VALUES (?, ?)", (node_id, time.time()))
+
+    def leave(self, node_id):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+
+    def live_nodes(self, ttl_seconds):
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT node_id FROM nodes WHERE last_seen > ?", (time.time() - ttl_seconds,)).fetchall()
+        return sorted(row[0] for row in rows)
+
+
+class LocalLeases:
+    """
+    In-memory stand-in for a single process, with the same semantics as
+    SQLiteLeases. Used when coordination is disabled.
+    """
+
+    def __init__(self, path=None):
+        self._leases = {}
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, owner, ttl_seconds):
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and (lease["done"] or (lease["owner"] != owner and lease["expires_at"] > now)):
+                return False
+            self._leases[name] = {"owner": owner, "expires_at": now + ttl_seconds, "done": False}
+            return True
+
+    def renew(self, names, owner, ttl_seconds):
+        with self._lock:
+            for name in names:
+                lease = self._leases.get(name)
+                if lease and lease["owner"] == owner and not lease["done"]:
+                    lease["expires_at"] = time.time() + ttl_seconds
+
+    def release(self, name, owner):
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease["owner"] == owner and not lease["done"]:
+                del self._leases[name]
+
+    def complete(self, name, owner):
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease and lease["owner"] == owner:
+                lease["done"] = True
+
+    def heartbeat(self, node_id):
+        with self._lock:
+            self._nodes[node_id] = time.time()
+
+    def leave(self, node_id):
+        with self._lock:
+            self._nodes.pop(node_id, None)
+
+    def live_nodes(self, ttl_seconds):
+        with self._lock:
+            return sorted(node for node, last_seen in self._nodes.items() if last_seen > time.time() - ttl_seconds)
+
+
+BACKENDS = {
+    "sqlite": SQLiteLeases,
+    "local": LocalLeases,
+}
+
+
+class Coordinator:
+    """
+    Lets several nodes run the pipeline without double-posting: an article
+    is only published by the node holding its lease, a published article's
+    lease is kept forever, and feeds are spread over the live nodes with
+    rendezvous hashing so that a dead node's feeds move to the others once
+    its heartbeat expires.
+    """
+
+    def __init__(self, backend, node_id=None, lease_seconds=300, shard_feeds=True):
+        """
+        :param backend: SQLiteLeases, LocalLeases or an object with the same methods
+        :param node_id: Name of this node for feed sharding, defaults to the host name
+        :param lease_seconds: Lifetime of leases and heartbeats, renewed while this process runs
+        :param shard_feeds: If False, every node polls every feed
+        """
+        self.backend = backend
+        self.node_id = node_id or socket.gethostname()
+        # Leases belong to this process, so two processes of one node never share one
+        self.owner = f"{self.node_id}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.shard_feeds = shard_feeds
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Announce this node and keep its heartbeat and leases alive from a background thread
+        """
+        self.backend.heartbeat(self.node_id)
+        self._thread = threading.Thread(target=self._run, name="coordination", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Release unfinished leases and leave the cluster
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        with self._lock:
+            held, self._held = self._held, set()
+        for name in held:
+            self.backend.release(name, self.owner)
+        self.backend.leave(self.node_id)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                self.backend.heartbeat(self.node_id)
+                with self._lock:
+                    held = list(self._held)
+                self.backend.renew(held, self.owner, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Failed to renew leases: {str(e)}")
+
+    def claim(self, name):
+        """
+        Take a lease unless another process holds it or it was completed
+
+        :return: True if this process now holds the lease
+        """
+        if not self.backend.acquire(name, self.owner, self.lease_seconds):
+            return False
+        with self._lock:
+            self._held.add(name)
+        return True
+
+    def release(self, name):
+        """
+        Give a lease up so that another node may take over its work
+        """
+        with self._lock:
+            self._held.discard(name)
+        self.backend.release(name, self.owner)
+
+    def complete(self, name):
+        """
+        Mark a lease's work as done; nobody can claim it again
+        """
+        with self._lock:
+            self._held.discard(name)
+        self.backend.complete(name, self.owner)
+
+    def claim_article(self, feed_name, article_id):
+        return self.claim(article_lease(feed_name, article_id))
+
+    def release_article(self, feed_name, article_id):
+        self.release(article_lease(feed_name, article_id))
+
+    def complete_article(self, feed_name, article_id):
+        self.complete(article_lease(feed_name, article_id))
+
+    def owns_feed(self, feed_name):
+        """
+        Whether this node polls the feed: the live node ranking highest for it
+        """
+        if not self.shard_feeds:
+            return True
+        nodes = set(self.backend.live_nodes(self.lease_seconds)) | {self.node_id}
+        return max(nodes, key=lambda node: hashlib.sha256(f"{node}:{feed_name}".encode()).hexdigest()) == self.node_id
+
+
+def article_lease(feed_name, article_id):
+    return f"article:{feed_name}:{article_id}"
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator():
+    """
+    The process-wide coordinator, configured from the coordination section.
+    Without coordination, leases are kept in memory and every feed is polled.
+    """
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            from config import coordination as coordination_config
+            if coordination_config.enabled:
+                backend = BACKENDS[coordination_config.backend](coordination_config.path)
+                _coordinator = Coordinator(
+                    backend,
+                    node_id=coordination_config.node_id,
+                    lease_seconds=coordination_config.lease_seconds,
+                    shard_feeds=coordination_config.shard_feeds
+                )
+            else:
+                _coordinator = Coordinator(LocalLeases(), shard_feeds=False)
+    return _coordinator
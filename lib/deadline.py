@@ -0,0 +1,112 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+class ErrDeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """
+    A point in time by which a run must be done. Every blocking call made
+    under it takes the time left as its timeout, so one stalled host cannot
+    hold a run longer than the deadline.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what="the run"):
+        """
+        :raises ErrDeadlineExceeded: If the deadline has passed
+        """
+        if self.expired:
+            raise ErrDeadlineExceeded(f"Deadline of {self.seconds:g}s exceeded before {what}")
+
+    def timeout(self, default=None, what="the call"):
+        """
+        Timeout of a call made now: the time left, or default when it is shorter
+
+        :raises ErrDeadlineExceeded: If no time is left
+        """
+        self.check(what)
+        remaining = self.remaining()
+        return remaining if default is None else min(remaining, default)
+
+
+# Deadline of the work running in the current thread (or task)
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def scope(seconds):
+    """
+    Run the enclosed block under a deadline of the given number of seconds.
+    Nested scopes never extend an enclosing deadline; no seconds (0 or
+    None) keeps the current one.
+
+    :return: The Deadline in effect, or None
+    """
+    deadline = _current.get()
+    if seconds and (deadline is None or deadline.remaining() > seconds):
+        deadline = Deadline(seconds)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def use(deadline):
+    """
+    Run the enclosed block under an existing deadline, e.g. one handed to another thread
+    """
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def remaining():
+    """
+    :return: Seconds left of the current deadline, or None without one
+    """
+    deadline = _current.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def expired():
+    deadline = _current.get()
+    return deadline is not None and deadline.expired
+
+
+def check(what="the run"):
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(what)
+
+
+def timeout(default=None, what="the call"):
+    """
+    Timeout of a call made now under the current deadline
+
+    :param default: Timeout without a deadline, and the longest one with it
+    :raises ErrDeadlineExceeded: If the current deadline has passed
+    """
+    deadline = _current.get()
+    return default if deadline is None else deadline.timeout(default, what)
@@ -0,0 +1,114 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import lib.deadline
+
+# Set in the worker processes, which parse inline
+_in_worker = False
+
+
+def _init_worker():
+    global _in_worker
+    _in_worker = True
+
+
+class ExtractionPool:
+    """
+    Runs CPU-bound HTML parsing in worker processes, so that extraction in
+    batch and backfill runs uses every core instead of serializing on the
+    GIL. Jobs receive the raw HTML and return the compact extracted records
+    (dictionaries of strings); parse trees never cross the process boundary.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        # Workers are spawned rather than forked from a process running
+        # logging, asyncio and HTTP threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+
+    def submit(self, func, *args):
+        """
+        Run a module-level function on a worker process
+
+        :return: Future of its result
+        """
+        return self._executor.submit(func, *args)
+
+    def map(self, func, *iterables, timeout=None, chunksize=1):
+        return self._executor.map(func, *iterables, timeout=timeout, chunksize=chunksize)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(workers=None):
+    """
+    Send parsing jobs of this process to a pool of worker processes
+
+    :param workers: Number of processes, defaults to the number of CPUs
+    :return: The ExtractionPool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool(workers)
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def run(func, *args):
+    """
+    Call func(*args) on the configured pool and wait for the result, or
+    inline when no pool is configured. The calling thread releases the GIL
+    while it waits, so threads calling run() parse in parallel.
+
+    :raises lib.deadline.ErrDeadlineExceeded: If the current deadline passes first
+    """
+    pool = _pool
+    if pool is None or _in_worker:
+        return func(*args)
+    future = pool.submit(func, *args)
+    try:
+        return future.result(lib.deadline.remaining())
+    except FutureTimeoutError:
+        future.cancel()
+        raise lib.deadline.ErrDeadlineExceeded(f"Deadline exceeded while parsing with {func.__name__}")
+
+
+def run_all(func, items):
+    """
+    Call func(item) for every item on the configured pool, or inline when no
+    pool is configured. Items are sent in one chunk per worker rather than
+    one round trip each.
+
+    :return: List of the results, in order
+    :raises lib.deadline.ErrDeadlineExceeded: If the current deadline passes first
+    """
+    items = list(items)
+    pool = _pool
+    if pool is None or _in_worker or len(items) < 2:
+        return [func(item) for item in items]
+    chunksize = math.ceil(len(items) / pool.workers)
+    try:
+        return list(pool.map(func, items, timeout=lib.deadline.remaining(), chunksize=chunksize))
+    except FutureTimeoutError:
+        raise lib.deadline.ErrDeadlineExceeded(f"Deadline exceeded while parsing with {func.__name__}")
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import lib.deadline
+import lib.http
+import lib.logger
+import lib.metrics
+
+logger = lib.logger.get_logger(__name__)
+
+GRAPH_URL = "https://graph.facebook.com/v19.0"
+
+
+class ErrTokenRenewal(Exception):
+    pass
+
+
+def _fingerprint(token):
+    return hashlib.sha256((token or "").encode()).hexdigest()[:16]
+
+
+def _graph_json(response, what):
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code != 200 or "error" in data:
+        message = (data.get("error") or {}).get("message") or response.text
+        raise ErrTokenRenewal(f"{what} failed with {response.status_code}: {message}")
+    return data
+
+
+class TokenStore:
+    """
+    Long-lived Facebook user and page tokens with their expiry, persisted
+    so that clients take a valid token from memory and never wait on the
+    token exchange. Renewal happens off the publishing path, see renew_if_due().
+    """
+
+    def __init__(self, path, access_token, page_id=None, app_id=None, app_secret=None,
+                 renew_before_seconds=7 * 24 * 3600):
+        """
+        :param path: JSON file the tokens are kept in
+        :param access_token: Token of the config file, used until the first renewal
+        :param page_id: (Optional) Page whose token is looked up with the user token
+        :param app_id: (Optional) App ID, tokens are only renewed with it and app_secret
+        :param app_secret: (Optional) App secret
+        :param renew_before_seconds: Renew the user token this long before it expires
+        """
+        self.path = path
+        self.access_token = access_token
+        self.page_id = page_id
+        self.app_id = app_id
+        self.app_secret = app_secret
+        self.renew_before_seconds = renew_before_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._state = self._initial_state()
+        self._reload()
+
+    def _initial_state(self):
+        return {
+            "source": _fingerprint(self.access_token),
+            "user_token": self.access_token,
+            "user_expires_at": None,
+            "page_token": None,
+            "renewed_at": None,
+        }
+
+    def _reload(self):
+        # Another process (e.g. scripts/renew_fb_token.py) may have renewed the tokens
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable Facebook token file {self.path}: {str(e)}")
+            return
+        self._mtime = mtime
+        # A token replaced in the config file wins over the ones renewed from the old one
+        if state.get("source") == _fingerprint(self.access_token):
+            self._state = state
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        # The file holds credentials, only the owner may read it
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime
+
+    def token(self):
+        """
+        The token to publish with: the page token once renewed, the user token before
+        """
+        with self._lock:
+            self._reload()
+            return self._state.get("page_token") or self._state["user_token"]
+
+    def expires_at(self):
+        """
+        :return: Unix time the user token expires at, or None if unknown or never
+        """
+        with self._lock:
+            self._reload()
+            return self._state.get("user_expires_at")
+
+    def due(self, now=None):
+        """
+        :return: True if the tokens can be renewed and should be
+        """
+        if not (self.app_id and self.app_secret):
+            return False
+        now = time.time() if now is None else now
+        with self._lock:
+            self._reload()
+            if not self._state.get("renewed_at"):
+                return True
+            expires_at = self._state.get("user_expires_at")
+            return expires_at is not None and expires_at - now <= self.renew_before_seconds
+
+    def renew(self):
+        """
+        Exchange the user token for a new long-lived one, and look the page's
+        token up with it. Page tokens obtained from a long-lived user token do
+        not expire.
+
+        :return: The token to publish with
+        :raises ErrTokenRenewal: If Facebook refused the exchange
+        """
+        if not (self.app_id and self.app_secret):
+            raise ErrTokenRenewal("facebook.app_id and facebook.app_secret are required to renew tokens")
+        with self._lock:
+            self._reload()
+            user_token = self._state["user_token"]
+
+        client = lib.http.get_client()
+        with lib.metrics.timer("facebook.token_renewal"):
+            data = _graph_json(client.get(f"{GRAPH_URL}/oauth/access_token", params={
+                "grant_type": "fb_exchange_token",
+                "client_id": self.app_id,
+                "client_secret": self.app_secret,
+                "fb_exchange_token": user_token,
+            }), "Token exchange")
+            if not data.get("access_token"):
+                raise ErrTokenRenewal("Token exchange returned no access_token")
+            renewed_at = time.time()
+            user_token = data["access_token"]
+            expires_in = data.get("expires_in")
+
+            # The configured token may already be the page's own token, which is then used as is
+            page_token = None
+            if self.page_id:
+                try:
+                    page_token = _graph_json(client.get(f"{GRAPH_URL}/{self.page_id}", params={
+                        "fields": "access_token",
+                        "access_token": user_token,
+                    }), "Page token lookup").get("access_token")
+                except ErrTokenRenewal as e:
+                    logger.info(f"Using the exchanged Facebook token for the page: {str(e)}")
+
+        with self._lock:
+            self._state = {
+                "source": _fingerprint(self.access_token),
+                "user_token": user_token,
+                "user_expires_at": renewed_at + expires_in if expires_in else None,
+                "page_token": page_token,
+                "renewed_at": renewed_at,
+            }
+            self._save()
+            token = page_token or user_token
+        expires = f"in {expires_in / 86400:.0f} days" if expires_in else "never"
+        logger.info(f"Facebook tokens renewed, the user token expires {expires}")
+        return token
+
+
+class TokenRenewer:
+    """
+    Background thread renewing the Facebook tokens ahead of their expiry
+    """
+
+    def __init__(self, interval_seconds=3600, deadline_seconds=None):
+        """
+        :param interval_seconds: Time between two checks of the tokens' expiry
+        :param deadline_seconds: (Optional) Deadline of each renewal, see lib.deadline
+        """
+        self.interval_seconds = interval_seconds
+        self.deadline_seconds = deadline_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="facebook-token-renewer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with lib.deadline.scope(self.deadline_seconds):
+                    renew_if_due()
+            except Exception as e:
+                logger.error(f"Facebook token renewal error: {str(e)}")
+            self._stop.wait(self.interval_seconds)
+
+
+def renew_if_due():
+    """
+    Renew the process-wide token store's tokens if they are due
+
+    :return: True if they were renewed
+    """
+    store = get_token_store()
+    if not store.due():
+        return False
+    store.renew()
+    return True
+
+
+# (config section the store was built from, store)
+_store = None
+_lock = threading.Lock()
+
+
+def get_token_store(facebook_config=None):
+    """
+    The token store of a facebook config section, at its token_file;
+    rebuilt when the section changes
+
+    :param facebook_config: (Optional) config.Facebook, defaults to the current one
+    """
+    global _store
+    if facebook_config is None:
+        import config
+        facebook_config = config.facebook
+    with _lock:
+        if _store is None or _store[0] is not facebook_config:
+            _store = (facebook_config, TokenStore(
+                facebook_config.token_file,
+                facebook_config.access_token,
+                page_id=facebook_config.page_id,
+                app_id=facebook_config.app_id,
+                app_secret=facebook_config.app_secret,
+                renew_before_seconds=facebook_config.renew_before_days * 24 * 3600
+            ))
+        return _store[1]
@@ -0,0 +1,160 @@
+import os
+import threading
+
+import httpx
+import requests.adapters
+
+import lib.deadline
+
+# HTTP/2 needs the h2 package (pip install "httpx[http2]"); without it the
+# shared pools fall back to HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _options(http_config):
+    return {
+        "http2": http_config.http2 and HTTP2_AVAILABLE,
+        "limits": httpx.Limits(
+            max_connections=http_config.max_connections,
+            max_keepalive_connections=http_config.max_keepalive_connections,
+            keepalive_expiry=http_config.keepalive_expiry_seconds
+        ),
+        "timeout": httpx.Timeout(http_config.timeout_seconds, connect=http_config.connect_timeout_seconds),
+        "follow_redirects": True,
+    }
+
+
+def _rate_limit_hook(response):
+    import lib.ratelimit
+    lib.ratelimit.get_limiter().response_hook(response)
+
+
+async def _async_rate_limit_hook(response):
+    _rate_limit_hook(response)
+
+
+def _deadline_hook(request):
+    """
+    Cap the request's timeouts to what is left of the current deadline
+    """
+    remaining = lib.deadline.timeout(what=f"{request.method} {request.url.host}")
+    if remaining is None:
+        return
+    timeouts = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        name: remaining if timeouts.get(name) is None else min(timeouts[name], remaining)
+        for name in ("connect", "read", "write", "pool")
+    }
+
+
+class DeadlineAdapter(requests.adapters.HTTPAdapter):
+    """
+    requests transport adapter capping every request's timeout to what is
+    left of the current deadline, for the SDKs that bring their own
+    requests.Session (tweepy, facebook-sdk). Requests the SDK sets no
+    timeout for get the http section's ones.
+    """
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            from config import http as http_config
+            timeout = (http_config.connect_timeout_seconds, http_config.timeout_seconds)
+        remaining = lib.deadline.timeout(what=f"{request.method} {request.url}")
+        if remaining is not None:
+            if timeout is None:
+                timeout = remaining
+            elif isinstance(timeout, tuple):
+                timeout = tuple(remaining if part is None else min(part, remaining) for part in timeout)
+            else:
+                timeout = min(timeout, remaining)
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def instrument_session(session):
+    """
+    Make a requests.Session honour the current deadline
+
+    :return: The session
+    """
+    adapter = DeadlineAdapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ResponseReader:
+    """
+    File-like view of a streaming httpx response, for parsers that read()
+    (lxml's iterparse) while the body downloads. Content encodings are undone.
+    """
+
+    def __init__(self, response, chunk_size=64 * 1024):
+        self._chunks = response.iter_bytes(chunk_size)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        # Timeouts only bound each network read, the deadline bounds the whole body
+        lib.deadline.check("the end of the response")
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+_client = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The process-wide HTTP client. Requests to one host share its pooled
+    connections, multiplexed over HTTP/2 when the host supports it.
+    Timeouts are capped by the current deadline (lib.deadline), and
+    responses of rate-limited endpoints update the shared rate limiter.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            from config import http as http_config
+            _client = httpx.Client(
+                event_hooks={"request": [_deadline_hook], "response": [_rate_limit_hook]},
+                **_options(http_config)
+            )
+        return _client
+
+
+def get_async_client():
+    """
+    The process-wide async HTTP client. Its connections belong to the
+    event loop they are opened on, so it is only used on the lib.aio
+    background loop; callers pass their deadline's timeout explicitly.
+    """
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            from config import http as http_config
+            _async_client = httpx.AsyncClient(event_hooks={"response": [_async_rate_limit_hook]}, **_options(http_config))
+        return _async_client
+
+
+def _after_fork_in_child():
+    # Pooled sockets are shared with the parent after a fork, the child opens its own
+    global _client, _async_client, _lock
+    _client = None
+    _async_client = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
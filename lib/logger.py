@@ -1,12 +1,32 @@
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
 import sys
+import threading
 
 
 FORMATTER = logging.Formatter("%(asctime)s: [%(levelname)s] [%(name)s] %(message)s")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = BASE_DIR + "/../manshar.log"
 
+# Every logger enqueues its records on this handler; a single listener thread
+# formats them and does the console and file I/O off the publishing threads
+_queue_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _app_config():
+    try:
+        from config import app
+        return app
+    except (ImportError, OSError):
+        # Scripts can log before a config.yaml exists
+        return None
+
 
 def get_console_handler():
     console_handler = logging.StreamHandler(sys.stdout)
@@ -14,22 +34,127 @@ def get_console_handler():
     return console_handler
 
 
-def get_file_handler():
-    file_handler = logging.FileHandler(LOG_FILE)
+def get_file_handler(app_config=None):
+    log_file = getattr(app_config, "log_file", None) or LOG_FILE
+    backup_count = getattr(app_config, "log_backup_count", 5)
+
+    # Rotate at a time of day when configured, by size otherwise
+    when = getattr(app_config, "log_rotate_when", None)
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count, encoding="utf-8")
+    else:
+        max_bytes = getattr(app_config, "log_max_bytes", 10 * 1024 * 1024)
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
     file_handler.setFormatter(FORMATTER)
     return file_handler
 
 
+def get_level(app_config=None):
+    # better to have too much log than not enough
+    level = getattr(app_config, "log_level", None) or "DEBUG"
+    return logging.getLevelName(str(level).upper()) if isinstance(level, str) else level
+
+
+def _start_listener():
+    global _listener
+    app_config = _app_config()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(
+        log_queue, get_console_handler(), get_file_handler(app_config), respect_handler_level=True
+    )
+    _listener.start()
+    return log_queue
+
+
+def _in_worker_process():
+    # Spawned processes are named before they import the main module
+    return multiprocessing.current_process().name != "MainProcess"
+
+
+def _configure():
+    """
+    Set up the queue handler and its listener once per process
+    """
+    global _queue_handler
+    with _lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        if _in_worker_process():
+            # Extraction pool workers re-import the main module and every logger
+            # with it: they neither load the config nor share the log file
+            _queue_handler = logging.StreamHandler(sys.stderr)
+            _queue_handler.setFormatter(FORMATTER)
+            _queue_handler.setLevel(logging.WARNING)
+            return _queue_handler
+
+        _queue_handler = logging.handlers.QueueHandler(_start_listener())
+        _queue_handler.setLevel(get_level(_app_config()))
+        atexit.register(shutdown)
+        _follow_config_reloads()
+        return _queue_handler
+
+
+def _follow_config_reloads():
+    try:
+        import config
+    except ImportError:
+        return
+    config.subscribe(_on_config_reload)
+
+
+def _on_config_reload(changed, snapshot):
+    # The level is the only logging setting applied without a restart
+    if "app" in changed:
+        set_level(get_level(snapshot.app))
+
+
+def set_level(level):
+    """
+    Change the level of every logger obtained with get_logger()
+    """
+    handler = _queue_handler
+    if handler is None:
+        return
+    handler.setLevel(level)
+    for logger in list(logging.Logger.manager.loggerDict.values()):
+        if isinstance(logger, logging.Logger) and handler in logger.handlers:
+            logger.setLevel(level)
+
+
+def _after_fork_in_child():
+    # The listener thread does not survive a fork, give the child its own
+    global _lock
+    _lock = threading.Lock()
+    if isinstance(_queue_handler, logging.handlers.QueueHandler):
+        _queue_handler.queue = _start_listener()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def shutdown():
+    """
+    Flush every queued record; called automatically at exit
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def get_logger(logger_name):
     logger = logging.getLogger(logger_name)
+    handler = _configure()
 
-    # better to have too much log than not enough
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(handler.level)
 
-    logger.addHandler(get_console_handler())
-    logger.addHandler(get_file_handler())
+    # Calling get_logger again for the same name must not duplicate output
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
 
     # with this pattern, it's rarely necessary to propagate the error up to parent
     logger.propagate = False
 
-    return logger
\ No newline at end of file
+    return logger
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+# Media IDs are only reused this long before the platform says they expire
+EXPIRY_MARGIN_SECONDS = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    platform TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    media_id TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (platform, content_hash)
+);
+CREATE TABLE IF NOT EXISTS urls (
+    platform TEXT NOT NULL,
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (platform, url)
+);
+CREATE INDEX IF NOT EXISTS media_expiry ON media (expires_at);
+"""
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class MediaCache:
+    """
+    Platform media IDs by the SHA-256 of the uploaded bytes, and the hash of
+    the bytes last downloaded from each image URL, backed by SQLite so that
+    retries in later runs reuse an upload until it expires.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get(self, platform, digest):
+        """
+        :return: The unexpired media ID uploaded with these bytes, or None
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT media_id FROM media WHERE platform = ? AND content_hash = ? AND expires_at > ?",
+                (platform, digest, time.time() + EXPIRY_MARGIN_SECONDS)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_by_url(self, platform, url):
+        """
+        :return: The unexpired media ID of the bytes last downloaded from url, or None.
+            The URL may serve other bytes since, only reuse it through get() with their hash.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT media.media_id FROM urls JOIN media USING (platform, content_hash)"
+                " WHERE urls.platform = ? AND urls.url = ? AND media.expires_at > ?",
+                (platform, url, time.time() + EXPIRY_MARGIN_SECONDS)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_url(self, platform, url, digest):
+        """
+        Remember that url served the bytes with this digest
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (platform, url, content_hash) VALUES (?, ?, ?)",
+                (platform, url, digest)
+            )
+
+    def put(self, platform, digest, media_id, expires_in_seconds, url=None):
+        """
+        Remember an upload
+
+        :param digest: content_hash() of the uploaded bytes
+        :param expires_in_seconds: Lifetime of the media ID reported by the platform
+        :param url: (Optional) URL the bytes were downloaded from
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media (platform, content_hash, media_id, expires_at) VALUES (?, ?, ?, ?)",
+                (platform, digest, str(media_id), now + expires_in_seconds)
+            )
+            conn.execute("DELETE FROM media WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM urls WHERE NOT EXISTS"
+                         " (SELECT 1 FROM media WHERE media.platform = urls.platform AND media.content_hash = urls.content_hash)")
+        if url:
+            self.add_url(platform, url, digest)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_media_cache():
+    """
+    The process-wide media cache, stored in the data directory
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config import app as app_config
+            _cache = MediaCache(os.path.join(app_config.data_dir, "media.sqlite3"))
+    return _cache
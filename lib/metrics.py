@@ -0,0 +1,243 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram buckets in seconds, from a local parse to a slow LLM call
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_DURATION = "manshar_stage_duration_seconds"
+STAGE_CALLS = "manshar_stage_calls_total"
+OPENAI_TOKENS = "manshar_openai_tokens_total"
+
+HELP = {
+    STAGE_DURATION: "Time spent in each pipeline stage and client call",
+    STAGE_CALLS: "Pipeline stage and client calls by outcome",
+    OPENAI_TOKENS: "OpenAI tokens used by client method and kind (prompt, completion, cached)",
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _percentile(samples, percent):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    """
+    In-process counters and histograms, exported in the Prometheus text
+    format, plus the raw stage timings of the current run.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._run_samples = {}
+        self._run_started_at = time.time()
+        self._lock = threading.Lock()
+        # Objects with stage_started(stage) / stage_finished(stage, seconds, error)
+        self.listeners = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = _Histogram(self.buckets)
+            self._histograms[key].observe(value)
+
+    def record_stage(self, stage, seconds, error=False):
+        """
+        Record one call of a stage
+        """
+        self.observe(STAGE_DURATION, seconds, stage=stage)
+        self.inc(STAGE_CALLS, stage=stage, status="error" if error else "ok")
+        with self._lock:
+            self._run_samples.setdefault(stage, []).append((seconds, error))
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time the enclosed block as one call of a stage; exceptions count as errors
+        """
+        for listener in self.listeners:
+            listener.stage_started(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self._finish_stage(stage, time.perf_counter() - start, error=True)
+            raise
+        self._finish_stage(stage, time.perf_counter() - start)
+
+    def _finish_stage(self, stage, seconds, error=False):
+        self.record_stage(stage, seconds, error=error)
+        for listener in self.listeners:
+            listener.stage_finished(stage, seconds, error)
+
+    def timed(self, stage):
+        """
+        Decorator timing every call of a function as a stage
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_prometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """
+        Atomically write the metrics for the node_exporter textfile collector
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def run_summary(self):
+        """
+        Per-stage timing summary of the current run
+        """
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._run_samples.items()}
+
+        stages = {}
+        for stage, values in sorted(samples.items()):
+            durations = [seconds for seconds, _ in values]
+            errors = sum(1 for _, error in values if error)
+            stages[stage] = {
+                "count": len(values),
+                "errors": errors,
+                "error_rate": errors / len(values),
+                "total_seconds": sum(durations),
+                "p50_seconds": _percentile(durations, 50),
+                "p95_seconds": _percentile(durations, 95),
+                "max_seconds": max(durations),
+            }
+        return {
+            "started_at": self._run_started_at,
+            "duration_seconds": time.time() - self._run_started_at,
+            "stages": stages,
+        }
+
+    def write_run_summary(self, directory, name=None):
+        """
+        Write the run summary as JSON and start a new run
+
+        :return: Path of the written file
+        """
+        summary = self.run_summary()
+        os.makedirs(directory, exist_ok=True)
+        name = name or time.strftime("%Y%m%dT%H%M%S", time.gmtime(summary["started_at"]))
+        path = os.path.join(directory, f"{name}.json")
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        self.start_run()
+        return path
+
+    def start_run(self):
+        with self._lock:
+            self._run_samples = {}
+            self._run_started_at = time.time()
+
+    def serve(self, host="0.0.0.0", port=9100):
+        """
+        Serve /metrics from a background thread
+
+        :return: The running HTTP server
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+
+# Process-wide registry used by the pipeline and the clients
+registry = Registry()
+timer = registry.timer
+timed = registry.timed
@@ -0,0 +1,301 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import lib.deadline
+import lib.logger
+
+logger = lib.logger.get_logger(__name__)
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+# A job left in progress longer than its send's deadline plus this margin
+# belongs to a worker that died; reclaiming it earlier would post it twice
+STALE_MARGIN_SECONDS = 300
+# Same, for outboxes whose sends have no deadline
+STALE_AFTER_SECONDS = 3600
+
+# Jobs claimed at once for a platform that publishes in batches
+BATCH_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    article_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    post_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_attempt_at);
+"""
+
+
+class ErrUnknownPlatform(Exception):
+    pass
+
+
+def idempotency_key(article_id, platform):
+    return f"{article_id}:{platform}"
+
+
+def post_id_from_response(response):
+    """
+    Extract the platform's post ID from a client response
+
+    :param response: Response of a platform client's send()
+    :return: Post ID as a string, or None if the response has none
+    """
+    if response is None:
+        return None
+    if isinstance(response, dict):
+        post_id = response.get("post_id") or response.get("id")
+        return str(post_id) if post_id else None
+    # tweepy.Response
+    data = getattr(response, "data", None)
+    if isinstance(data, dict) and data.get("id"):
+        return str(data["id"])
+    # telegram.Message
+    message_id = getattr(response, "message_id", None)
+    if message_id:
+        return str(message_id)
+    return None
+
+
+class Outbox:
+    """
+    Persistent queue of (article, platform, rendered payload) publish jobs,
+    backed by SQLite so that jobs survive crashes and restarts.
+    """
+
+    def __init__(self, path, max_attempts=8, base_delay_seconds=30, max_delay_seconds=3600, job_deadline_seconds=None):
+        """
+        :param job_deadline_seconds: (Optional) Deadline of each send, see lib.deadline; sends
+            made under a shorter deadline keep it
+        """
+        self.path = path
+        self.job_deadline_seconds = job_deadline_seconds
+        self.stale_after_seconds = (job_deadline_seconds + STALE_MARGIN_SECONDS
+                                    if job_deadline_seconds else STALE_AFTER_SECONDS)
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, article_id, platform, payload):
+        """
+        Add a publish job, unless the article already has one for the platform
+
+        :param article_id: ID of the article
+        :param platform: Platform name
+        :param payload: JSON serializable keyword arguments of the platform client's send()
+        :return: Tuple of (job ID, True if the job was created by this call)
+        """
+        now = time.time()
+        key = idempotency_key(article_id, platform)
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (idempotency_key, article_id, platform, payload, status,"
+                " next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, article_id, platform, json.dumps(payload, ensure_ascii=False), PENDING, now, now, now)
+            )
+            created = cursor.rowcount == 1
+            job_id = conn.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (key,)).fetchone()["id"]
+        return job_id, created
+
+    def claim_due(self, limit=10, article_id=None, platform=None):
+        """
+        Atomically take due jobs for processing
+
+        :param limit: Maximum number of jobs to claim
+        :param article_id: (Optional) Only claim jobs of this article
+        :param platform: (Optional) Only claim jobs of this platform
+        :return: List of job rows
+        """
+        now = time.time()
+        query = ("SELECT * FROM jobs WHERE ((status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at <= ?))")
+        params = [PENDING, now, IN_PROGRESS, now - self.stale_after_seconds]
+        if article_id:
+            query += " AND article_id = ?"
+            params.append(article_id)
+        if platform:
+            query += " AND platform = ?"
+            params.append(platform)
+        query += " ORDER BY next_attempt_at LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            jobs = conn.execute(query, params).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                [(IN_PROGRESS, now, job["id"]) for job in jobs]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return jobs
+
+    def complete(self, job_id, post_id=None):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, post_id = ?, last_error = NULL, attempts = attempts + 1,"
+                " updated_at = ? WHERE id = ?",
+                (DONE, post_id, time.time(), job_id)
+            )
+
+    def fail(self, job_id, error, retry=True):
+        """
+        Record a failed attempt and schedule the next one with exponential
+        backoff and jitter, or give up after max_attempts
+
+        :param retry: (Optional) If False, give up right away
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()["attempts"] + 1
+            delay = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempts - 1))
+            delay = random.uniform(delay / 2, delay)
+            status = FAILED if not retry or attempts >= self.max_attempts else PENDING
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?"
+                " WHERE id = ?",
+                (status, attempts, now + delay, str(error), now, job_id)
+            )
+        return status
+
+    def get(self, article_id, platform):
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key(article_id, platform),)
+            ).fetchone()
+
+    def pending_count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, IN_PROGRESS)).fetchone()[0]
+
+    def drain(self, senders, article_id=None, limit=None, batch_senders=None):
+        """
+        Send every due job once
+
+        :param senders: Dictionary of platform name to a callable taking the job payload as keyword arguments
+        :param article_id: (Optional) Only send jobs of this article
+        :param limit: (Optional) Maximum number of jobs to send
+        :param batch_senders: (Optional) Dictionary of platform name to a callable taking a list of payloads
+            and returning one response or exception per payload; due jobs of these platforms go out together
+        :return: Dictionary of job status to number of jobs
+        """
+        results = {DONE: 0, PENDING: 0, FAILED: 0}
+        # Jobs left once the caller's deadline has passed stay due for the next drain
+        for platform, send_batch in (batch_senders or {}).items():
+            while (limit is None or sum(results.values()) < limit) and not lib.deadline.expired():
+                remaining = BATCH_SIZE if limit is None else min(BATCH_SIZE, limit - sum(results.values()))
+                jobs = self.claim_due(limit=remaining, article_id=article_id, platform=platform)
+                if not jobs:
+                    break
+                for status in self._send_batch(jobs, send_batch):
+                    results[status] += 1
+
+        while (limit is None or sum(results.values()) < limit) and not lib.deadline.expired():
+            jobs = self.claim_due(limit=1, article_id=article_id)
+            if not jobs:
+                break
+            status = self._send(jobs[0], senders)
+            results[status] += 1
+        return results
+
+    def _send(self, job, senders):
+        platform = job["platform"]
+        try:
+            sender = senders.get(platform)
+            if not sender:
+                raise ErrUnknownPlatform(f"No sender for platform {platform}")
+            with lib.deadline.scope(self.job_deadline_seconds):
+                response = sender(**json.loads(job["payload"]))
+        except Exception as e:
+            response = e
+        return self._record(job, response)
+
+    def _send_batch(self, jobs, send_batch):
+        try:
+            with lib.deadline.scope(self.job_deadline_seconds):
+                responses = send_batch([json.loads(job["payload"]) for job in jobs])
+        except Exception as e:
+            responses = [e] * len(jobs)
+        return [self._record(job, response) for job, response in zip(jobs, responses)]
+
+    def _record(self, job, response):
+        """
+        Complete a job with its platform response, or fail it with an exception.
+        Exceptions with a false retryable attribute, e.g. of a send whose
+        outcome is unknown, are not retried.
+        """
+        platform = job["platform"]
+        if isinstance(response, Exception):
+            retry = getattr(response, "retryable", True)
+            status = self.fail(job["id"], response, retry=retry)
+            logger.error(f"Failed to post {job['article_id']} to {platform} (attempt {job['attempts'] + 1}): {str(response)}")
+            if not retry:
+                logger.error(f"Not retrying {job['article_id']} on {platform}, check whether it was published")
+            return status
+
+        post_id = post_id_from_response(response)
+        self.complete(job["id"], post_id)
+        logger.info(f"Posted {job['article_id']} to {platform}: {post_id}")
+        return DONE
+
+
+class OutboxWorker:
+    """
+    Background thread that keeps draining an outbox
+    """
+
+    def __init__(self, outbox, senders, interval_seconds=15, batch_senders=None):
+        self.outbox = outbox
+        self.senders = senders
+        self.batch_senders = batch_senders
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.outbox.drain(self.senders, batch_senders=self.batch_senders)
+            except Exception as e:
+                logger.error(f"Outbox worker error: {str(e)}")
+            self._stop.wait(self.interval_seconds)
@@ -0,0 +1,226 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import lib.logger
+import lib.metrics
+
+logger = lib.logger.get_logger(__name__)
+
+# Environment variables enabling profiling without --profile, e.g. in daemon mode
+PROFILE_ENV = "MANSHAR_PROFILE"
+PROFILE_DIR_ENV = "MANSHAR_PROFILE_DIR"
+
+# Source paths grouped into the components of the per-stage breakdown
+COMPONENTS = [
+    (re.compile(r"[/\\]lib[/\\]rss\.py$"), "lib.rss"),
+    (re.compile(r"[/\\]lib[/\\]article_extractor\.py$"), "lib.article_extractor"),
+    (re.compile(r"[/\\]lib[/\\]summarizer\.py$"), "lib.summarizer"),
+    (re.compile(r"[/\\]clients[/\\]openai[/\\]"), "clients.openai"),
+    (re.compile(r"[/\\]clients[/\\]facebook[/\\]"), "clients.facebook"),
+    (re.compile(r"[/\\]clients[/\\]x[/\\]"), "clients.x"),
+    (re.compile(r"[/\\]clients[/\\]telegram[/\\]"), "clients.telegram"),
+    (re.compile(r"[/\\]clients[/\\]linkedin[/\\]"), "clients.linkedin"),
+    (re.compile(r"[/\\]lib[/\\]"), "lib (other)"),
+    (re.compile(r"[/\\]main\.py$"), "main"),
+]
+
+
+def enabled_from_env():
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+
+def _component(filename):
+    for pattern, component in COMPONENTS:
+        if pattern.search(filename):
+            return component
+    return None
+
+
+class _Session:
+    def __init__(self, name, memory):
+        self.name = name
+        self.memory = memory
+        self.profile = None
+        self.started_at = time.time()
+        self.stages = []
+        self._open_stages = []
+
+    def stage_started(self, stage):
+        # Entries are listed in start order, nested stages after their parent
+        entry = {"stage": stage, "depth": len(self._open_stages)}
+        self.stages.append(entry)
+        snapshot = tracemalloc.take_snapshot() if self.memory else None
+        current = tracemalloc.get_traced_memory()[0] if self.memory else None
+        self._open_stages.append((entry, snapshot, current))
+
+    def stage_finished(self, stage, seconds, error):
+        if not self._open_stages:
+            return
+        entry, start_snapshot, start_memory = self._open_stages.pop()
+        entry.update({"seconds": seconds, "error": error})
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            entry["allocated_bytes"] = current - start_memory
+            entry["peak_bytes"] = peak
+            entry["top_allocations"] = [
+                {"location": str(diff.traceback), "size_diff_bytes": diff.size_diff, "count_diff": diff.count_diff}
+                for diff in snapshot.compare_to(start_snapshot, "lineno")[:5]
+            ]
+
+
+class Profiler:
+    """
+    Profiles pipeline runs with cProfile and per-stage tracemalloc snapshots
+    and writes one report per session, named after the article it handled.
+
+    Stages are the lib.metrics timers that run on the session's thread.
+    """
+
+    def __init__(self, output_dir, memory=True, top=30):
+        self.output_dir = output_dir
+        self.memory = memory
+        self.top = top
+        self._local = threading.local()
+        # cProfile can only profile one session at a time
+        self._cprofile_lock = threading.Lock()
+        lib.metrics.registry.listeners.append(self)
+
+    def _current(self):
+        return getattr(self._local, "session", None)
+
+    def stage_started(self, stage):
+        session = self._current()
+        if session:
+            session.stage_started(stage)
+
+    def stage_finished(self, stage, seconds, error):
+        session = self._current()
+        if session:
+            session.stage_finished(stage, seconds, error)
+
+    def tag(self, name):
+        """
+        Name the report of the current thread's session, e.g. after an article ID
+        """
+        session = self._current()
+        if session:
+            session.name = name
+
+    @contextmanager
+    def session(self, name):
+        """
+        Profile the enclosed block on the current thread
+
+        :param name: Default report name, replaced by tag()
+        """
+        session = _Session(name, self.memory)
+        self._local.session = session
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        if self._cprofile_lock.acquire(blocking=False):
+            session.profile = cProfile.Profile()
+            session.profile.enable()
+        else:
+            logger.info(f"Another session is being CPU profiled, only recording stages of {name}")
+
+        try:
+            yield session
+        finally:
+            if session.profile:
+                session.profile.disable()
+                self._cprofile_lock.release()
+            self._local.session = None
+            try:
+                self.write_report(session)
+            except Exception as e:
+                logger.error(f"Failed to write profile report: {str(e)}")
+
+    def write_report(self, session):
+        """
+        Write <name>-<timestamp>.prof (pstats), .txt and .json reports
+
+        :return: Path of the text report
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_name = re.sub(r'[^\w\-.]', '_', session.name or "run")
+        base = os.path.join(self.output_dir, f"{safe_name}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime(session.started_at))}")
+
+        components = {}
+        text = io.StringIO()
+        if session.profile:
+            session.profile.dump_stats(base + ".prof")
+            stats = pstats.Stats(session.profile, stream=text)
+            for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+                component = _component(filename)
+                if component:
+                    components[component] = components.get(component, 0) + tottime
+
+        lines = [f"Profile of {session.name}", "", "Stages (wall time):"]
+        for entry in session.stages:
+            if "seconds" not in entry:
+                continue
+            line = f"  {'  ' * entry['depth']}{entry['stage']:<40} {entry['seconds'] * 1000:>10.1f} ms"
+            if "allocated_bytes" in entry:
+                line += f" {entry['allocated_bytes'] / 1024:>10.1f} KiB allocated"
+            if entry["error"]:
+                line += "  (error)"
+            lines.append(line)
+
+        if components:
+            lines += ["", "Own CPU time by component:"]
+            for component, seconds in sorted(components.items(), key=lambda item: -item[1]):
+                lines.append(f"  {component:<40} {seconds * 1000:>10.1f} ms")
+
+        if session.profile:
+            stats.sort_stats("cumulative").print_stats(self.top)
+            lines += ["", text.getvalue()]
+
+        with open(base + ".txt", "w") as f:
+            f.write("\n".join(lines))
+        with open(base + ".json", "w") as f:
+            json.dump({"name": session.name, "started_at": session.started_at,
+                       "stages": session.stages, "components": components}, f, indent=2)
+
+        logger.info(f"Profile report written to {base}.txt")
+        return base + ".txt"
+
+
+_profiler = None
+
+
+def configure(output_dir, memory=True):
+    """
+    Enable profiling for this process
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(output_dir, memory=memory)
+    return _profiler
+
+
+@contextmanager
+def session(name):
+    """
+    Profile the enclosed block if profiling is enabled, do nothing otherwise
+    """
+    if _profiler is None:
+        yield None
+        return
+    with _profiler.session(name) as current:
+        yield current
+
+
+def tag(name):
+    if _profiler is not None:
+        _profiler.tag(name)
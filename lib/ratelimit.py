@@ -0,0 +1,281 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import lib.deadline
+import lib.logger
+
+logger = lib.logger.get_logger(__name__)
+
+# Bucket sizes per platform endpoint: (capacity, refill period in seconds).
+# Conservative defaults, override them with the rate_limits config section.
+DEFAULT_LIMITS = {
+    "x.tweet_create": (100, 900),
+    "x.media_upload": (415, 900),
+    "facebook.photos": (200, 3600),
+    "facebook.feed": (200, 3600),
+    "facebook.batch": (200, 3600),
+    "telegram.send_photo": (20, 60),
+    "telegram.send_message": (20, 60),
+    "linkedin.ugc_posts": (100, 86400),
+}
+
+# Requests made through instrumented sessions are mapped to their bucket by URL
+ENDPOINTS = [
+    ("POST", re.compile(r"//api\.(twitter|x)\.com/2/tweets/?$"), "x.tweet_create"),
+    ("POST", re.compile(r"//upload\.(twitter|x)\.com/1\.1/media/upload"), "x.media_upload"),
+    ("POST", re.compile(r"//graph\.facebook\.com/(v[\d.]+/)?[^/?]+/photos"), "facebook.photos"),
+    ("POST", re.compile(r"//graph\.facebook\.com/(v[\d.]+/)?[^/?]+/feed"), "facebook.feed"),
+    ("POST", re.compile(r"//graph\.facebook\.com/?(v[\d.]+/?)?(\?|$)"), "facebook.batch"),
+    ("POST", re.compile(r"//api\.telegram\.org/bot[^/]+/sendPhoto"), "telegram.send_photo"),
+    ("POST", re.compile(r"//api\.telegram\.org/bot[^/]+/sendMessage"), "telegram.send_message"),
+    ("POST", re.compile(r"//api\.linkedin\.com/v2/ugcPosts"), "linkedin.ugc_posts"),
+]
+
+# How long to back off after a 429 that does not say how long to wait
+DEFAULT_RETRY_AFTER_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class ErrRateLimited(Exception):
+    def __init__(self, key, wait_seconds):
+        super().__init__(f"Rate limit of {key} reached, retry in {wait_seconds:.1f}s")
+        self.key = key
+        self.wait_seconds = wait_seconds
+
+
+def endpoint_for(method, url):
+    """
+    Find the bucket key of a request
+
+    :return: Bucket key, or None if the request is not rate limited
+    """
+    for endpoint_method, pattern, key in ENDPOINTS:
+        if method.upper() == endpoint_method and pattern.search(url):
+            return key
+    return None
+
+
+class RateLimiter:
+    """
+    Token buckets per platform endpoint, stored in SQLite so that every
+    thread and process publishing from the same data directory shares them.
+    """
+
+    def __init__(self, path, limits=None):
+        self.path = path
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _update(self, key, change):
+        """
+        Run change(tokens, blocked_until, now) on the refilled bucket inside
+        a write transaction and store the (tokens, blocked_until) it returns
+
+        :return: Whatever change returns as its third value
+        """
+        capacity, period = self.limits[key]
+        rate = capacity / period
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at, blocked_until FROM buckets WHERE key = ?", (key,)).fetchone()
+            if row:
+                tokens = min(capacity, row[0] + (now - row[1]) * rate)
+                blocked_until = row[2]
+            else:
+                tokens, blocked_until = capacity, 0
+
+            tokens, blocked_until, result = change(tokens, blocked_until, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, blocked_until)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return result
+
+    def try_acquire(self, key, tokens=1):
+        """
+        Take tokens from a bucket if available
+
+        :return: 0 if the tokens were taken, otherwise seconds until they will be
+        """
+        if key not in self.limits:
+            return 0
+        capacity, period = self.limits[key]
+        rate = capacity / period
+
+        def change(available, blocked_until, now):
+            if blocked_until > now:
+                return available, blocked_until, blocked_until - now
+            if available >= tokens:
+                return available - tokens, blocked_until, 0
+            return available, blocked_until, (tokens - available) / rate
+
+        return self._update(key, change)
+
+    def acquire(self, key, tokens=1, block=True, max_wait_seconds=None):
+        """
+        Take tokens from a bucket, waiting for them if needed
+
+        :param key: Bucket key, e.g. "x.tweet_create"
+        :param tokens: Number of tokens to take
+        :param block: If False, raise instead of waiting
+        :param max_wait_seconds: (Optional) Raise instead of waiting longer than this, defaults
+            to what is left of the current deadline
+        :raises ErrRateLimited: If the tokens are not available without waiting too long
+        """
+        if max_wait_seconds is None:
+            max_wait_seconds = lib.deadline.remaining()
+        waited = 0
+        while True:
+            wait = self.try_acquire(key, tokens)
+            if not wait:
+                return
+            if not block or (max_wait_seconds is not None and waited + wait > max_wait_seconds):
+                raise ErrRateLimited(key, wait)
+            logger.info(f"Rate limit of {key} reached, waiting {wait:.1f}s")
+            time.sleep(wait)
+            waited += wait
+
+    def block(self, key, seconds):
+        """
+        Empty a bucket and keep it closed for the given number of seconds
+        """
+        if key not in self.limits:
+            return
+        logger.warning(f"Rate limit of {key} hit, pausing it for {seconds:.0f}s")
+        self._update(key, lambda tokens, blocked_until, now: (0, max(blocked_until, now + seconds), None))
+
+    def limit_remaining(self, key, remaining, reset_at=None):
+        """
+        Align a bucket with the remaining calls reported by the platform
+        """
+        if key not in self.limits:
+            return
+
+        def change(tokens, blocked_until, now):
+            if remaining <= 0 and reset_at:
+                blocked_until = max(blocked_until, reset_at)
+            return min(tokens, max(remaining, 0)), blocked_until, None
+
+        self._update(key, change)
+
+    def update_from_headers(self, key, headers, status_code=200):
+        """
+        Update a bucket from the rate-limit headers of a platform response
+
+        Understands X's x-rate-limit-*, Graph API usage headers and Retry-After.
+        """
+        retry_after = headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return self.block(key, int(retry_after))
+
+        # X: remaining calls in the window and its reset time
+        remaining = headers.get("x-rate-limit-remaining")
+        if remaining is not None and remaining.isdigit():
+            reset = headers.get("x-rate-limit-reset")
+            self.limit_remaining(key, int(remaining), float(reset) if reset and reset.isdigit() else None)
+        else:
+            # Graph API: usage as a percentage of the allowed calls / time
+            usage = _graph_usage(headers)
+            if usage is not None:
+                percent, regain_minutes = usage
+                capacity, _ = self.limits.get(key, (0, 1))
+                if percent >= 100:
+                    self.block(key, (regain_minutes or 60) * 60)
+                elif percent >= 75:
+                    self.limit_remaining(key, int(capacity * (100 - percent) / 100))
+
+        if status_code == 429:
+            wait = 0
+            reset = headers.get("x-rate-limit-reset")
+            if reset and reset.isdigit():
+                wait = float(reset) - time.time()
+            self.block(key, max(wait, DEFAULT_RETRY_AFTER_SECONDS))
+
+    def response_hook(self, response, *args, **kwargs):
+        """
+        requests (or httpx) response hook updating the bucket of the request's endpoint
+        """
+        key = endpoint_for(response.request.method, str(response.request.url))
+        if key:
+            self.update_from_headers(key, response.headers, response.status_code)
+        return response
+
+    def instrument(self, session):
+        """
+        Attach the response hook to a requests.Session
+        """
+        session.hooks.setdefault("response", []).append(self.response_hook)
+        return session
+
+
+def _graph_usage(headers):
+    """
+    Highest usage percentage and minutes to regain access from Graph API headers
+    """
+    percent = None
+    regain_minutes = None
+    for header in ("x-app-usage", "x-page-usage", "x-ad-account-usage", "x-business-use-case-usage"):
+        value = headers.get(header)
+        if not value:
+            continue
+        try:
+            data = json.loads(value)
+        except ValueError:
+            continue
+        # Business use case usage is keyed by business ID, with a list per ID
+        usages = [usage for entries in data.values() for usage in entries] if header == "x-business-use-case-usage" else [data]
+        for usage in usages:
+            for field in ("call_count", "total_time", "total_cputime", "acc_id_util_pct"):
+                if isinstance(usage.get(field), (int, float)):
+                    percent = max(percent or 0, usage[field])
+            if usage.get("estimated_time_to_regain_access"):
+                regain_minutes = max(regain_minutes or 0, usage["estimated_time_to_regain_access"])
+    if percent is None:
+        return None
+    return percent, regain_minutes
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """
+    The process-wide rate limiter, configured from the rate_limits section
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            from config import app as app_config
+            from config import rate_limits as rate_limits_config
+            _limiter = RateLimiter(os.path.join(app_config.data_dir, "ratelimit.sqlite3"), rate_limits_config.limits)
+    return _limiter
@@ -1,9 +1,16 @@
 import feedparser
+import io
+import json
+import os
 import random
-import requests
-from config import rss as rss_config
-from urllib.parse import urlparse
+import config
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlparse, parse_qsl
 from bs4 import BeautifulSoup
+from lxml import etree
+import lib.extraction_pool
+import lib.http
+import lib.metrics
 
 # User-Agent to avoid being blocked by some servers
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
@@ -16,123 +23,377 @@ class ErrEmptyFeed(Exception):
     pass
 
 
-def fetch_latest_article():
-    if not rss_config.feed_url:
+# Namespaced tags read by the streaming reader
+ATOM = "{http://www.w3.org/2005/Atom}"
+CONTENT_ENCODED = "{http://purl.org/rss/1.0/modules/content/}encoded"
+MEDIA_CONTENT = "{http://search.yahoo.com/mrss/}content"
+ENTRY_TAGS = ("item", ATOM + "entry")
+
+# Entries whose cover images are looked up with one extraction pool round trip
+COVER_IMAGE_BATCH_SIZE = 16
+
+
+def load_feed_state(filename):
+    """
+    Load the conditional-request state (ETag / Last-Modified) of a feed
+
+    :param filename: Path of the feed's state file
+    :return: State dictionary, empty if the feed was never fetched
+    """
+    try:
+        with open(filename, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_feed_state(filename, state):
+    """
+    Persist the conditional-request state of a feed
+
+    :param filename: Path of the feed's state file
+    :param state: State dictionary as updated by fetch_feed
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_filename, filename)
+
+
+def fetch_feed(feed_url=None, state=None):
+    """
+    Fetch and parse a feed, using a conditional request when state is given
+
+    :param feed_url: URL of the feed, defaults to the configured rss.feed_url
+    :param state: (Optional) Conditional-request state, updated in place
+    :return: Parsed feed, or None if the feed was not modified since the last fetch
+    """
+    feed_url = feed_url or config.rss.feed_url
+    if not feed_url:
         raise ErrInvalidFeedURL("Feed URL is not set")
 
     # Fetch with User-Agent to avoid being blocked
-    response = requests.get(rss_config.feed_url, headers={'User-Agent': USER_AGENT}, timeout=30)
-    response.raise_for_status()
+    headers = {'User-Agent': USER_AGENT}
+    if state:
+        if state.get("etag"):
+            headers['If-None-Match'] = state["etag"]
+        if state.get("last_modified"):
+            headers['If-Modified-Since'] = state["last_modified"]
+
+    with lib.metrics.timer("rss.fetch"):
+        response = lib.http.get_client().get(feed_url, headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+    if state is not None:
+        state["etag"] = response.headers.get("ETag")
+        state["last_modified"] = response.headers.get("Last-Modified")
 
-    feed = feedparser.parse(response.content)
+    with lib.metrics.timer("rss.parse"):
+        return parse_feed(response.content)
+
+
+def parse_feed(content):
+    """
+    Parse a raw feed document
+
+    :param content: Feed body as bytes or string
+    :return: Parsed feed
+    :raises ErrEmptyFeed: If the feed has no entries
+    """
+    feed = feedparser.parse(content)
     if not feed.entries:
         raise ErrEmptyFeed("Feed is empty")
-    
-    entry = feed.entries[0]
-    title = entry.get("title", "")
-    link = entry.get("link", "")
-    content = entry.get("content", [{}])[0].get("value", "") or entry.get("summary", "")
-    
-    # Extract cover image from HTML content
-    cover_image = None
-    if content:
-        soup = BeautifulSoup(content, 'html.parser')
-        # Try to find the first image in the content
-        img = soup.find('img')
-        if img:
-            # Try to get the full-size image URL first
-            if img.get('srcset'):
-                # Get the largest image from srcset
-                srcset = img['srcset'].split(',')
-                largest_image = srcset[-1].strip().split(' ')[0]
-                cover_image = largest_image
-            # Fall back to src if no srcset
-            elif img.get('src'):
-                cover_image = img.get('src')
-    
-    # If no image found in content, try other methods
-    if not cover_image:
-        # Try to get image from media:content
-        if hasattr(entry, 'media_content'):
-            for media in entry.media_content:
-                if media.get('type', '').startswith('image/'):
-                    cover_image = media.get('url')
-                    break
-        
-        # Try to get image from enclosure
-        if not cover_image and hasattr(entry, 'enclosures'):
-            for enclosure in entry.enclosures:
-                if enclosure.get('type', '').startswith('image/'):
-                    cover_image = enclosure.get('href')
-                    break
-        
-        # Try to get image from image tag
-        if not cover_image and hasattr(entry, 'image'):
-            cover_image = entry.image.get('href')
-    
-    return {
-        "id": get_slug_from_link(link),
-        "title": title, 
-        "content": content,
-        "link": link,
-        "cover_image": cover_image
-    }
+    return feed
+
+
+def fetch_latest_article(feed_url=None, state=None):
+    """
+    Fetch the latest article of a feed
 
-def fetch_random_article(exclude_posted=None):
+    :param feed_url: URL of the feed, defaults to the configured rss.feed_url
+    :param state: (Optional) Conditional-request state, updated in place
+    :return: Article dictionary, or None if the feed was not modified
+    """
+    feed = fetch_feed(feed_url, state)
+    if feed is None:
+        return None
+
+    return entry_to_article(feed.entries[0])
+
+def fetch_random_article(exclude_posted=None, feed_url=None):
     """
     Fetch a random article from the feed, excluding already posted ones
 
     :param exclude_posted: Set of article IDs to exclude
+    :param feed_url: URL of the feed, defaults to the configured rss.feed_url
     :return: Article dictionary or None if no articles found
     """
-    if not rss_config.feed_url:
-        raise ErrInvalidFeedURL("Feed URL is not set")
+    feed = fetch_feed(feed_url)
 
-    # Fetch with User-Agent to avoid being blocked
-    response = requests.get(rss_config.feed_url, headers={'User-Agent': USER_AGENT}, timeout=30)
-    response.raise_for_status()
-
-    feed = feedparser.parse(response.content)
-    if not feed.entries:
-        raise ErrEmptyFeed("Feed is empty")
-    
     # Filter out already posted articles
     exclude_posted = exclude_posted or set()
     available_entries = []
-    
+
     for entry in feed.entries:
         article_id = get_slug_from_link(entry.get("link", ""))
         if article_id and article_id not in exclude_posted:
             available_entries.append(entry)
-    
+
     if not available_entries:
         # If all articles have been posted, start over with the latest ones
         available_entries = feed.entries[:10]  # Use latest 10 articles
-    
+
     # Select a random article
-    entry = random.choice(available_entries)
-    
+    return entry_to_article(random.choice(available_entries))
+
+def fetch_new_articles(feed_url=None, known_ids=None, state=None, limit=None):
+    """
+    Stream a feed and return its entries newer than the first known one
+
+    The response is parsed while it downloads and the download stops as soon
+    as a known entry (or limit) is reached.
+
+    :param feed_url: URL of the feed, defaults to the configured rss.feed_url
+    :param known_ids: Set of article IDs already posted
+    :param state: (Optional) Conditional-request state, updated in place
+    :param limit: (Optional) Maximum number of articles to return
+    :return: List of articles, newest first, or None if the feed was not modified
+    """
+    feed_url = feed_url or config.rss.feed_url
+    if not feed_url:
+        raise ErrInvalidFeedURL("Feed URL is not set")
+
+    headers = {'User-Agent': USER_AGENT}
+    if state:
+        if state.get("etag"):
+            headers['If-None-Match'] = state["etag"]
+        if state.get("last_modified"):
+            headers['If-Modified-Since'] = state["last_modified"]
+
+    with lib.metrics.timer("rss.fetch"), lib.http.get_client().stream("GET", feed_url, headers=headers) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        # Parsed while downloading, closing the stream early stops the download
+        articles = list(iter_entries(lib.http.ResponseReader(response), known_ids=known_ids, limit=limit))
+
+    if state is not None:
+        state["etag"] = response.headers.get("ETag")
+        state["last_modified"] = response.headers.get("Last-Modified")
+
+    return articles
+
+
+def archive_page_url(feed_url, page):
+    """
+    URL of a page of a WordPress feed's paginated archive
+    """
+    parts = urlparse(feed_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != "paged"]
+    return parts._replace(query=urlencode(query + [("paged", page)])).geturl()
+
+
+def fetch_archive_page(feed_url, page):
+    """
+    Stream one page of a WordPress feed's paginated archive (?paged=N)
+
+    :param feed_url: URL of the feed
+    :param page: Page number, 1 being the current feed
+    :return: List of articles, newest first; empty past the last page
+    """
+    headers = {'User-Agent': USER_AGENT}
+    with lib.metrics.timer("rss.fetch"), lib.http.get_client().stream("GET", archive_page_url(feed_url, page), headers=headers) as response:
+        # WordPress answers 404 past the last page
+        if response.status_code == 404:
+            return []
+        response.raise_for_status()
+        return list(iter_entries(lib.http.ResponseReader(response)))
+
+
+def iter_archive(feed_url=None, workers=4, start_page=1, max_pages=None):
+    """
+    Walk a feed's paginated archive, fetching several pages at once
+
+    :param feed_url: URL of the feed, defaults to the configured rss.feed_url
+    :param workers: Number of pages fetched concurrently
+    :param start_page: First page to fetch
+    :param max_pages: (Optional) Maximum number of pages to fetch
+    :return: Generator of (page, articles) in page order, ending before the first empty page
+    """
+    feed_url = feed_url or config.rss.feed_url
+    if not feed_url:
+        raise ErrInvalidFeedURL("Feed URL is not set")
+
+    last_page = start_page + max_pages - 1 if max_pages else None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        next_page = start_page
+        try:
+            while True:
+                while len(in_flight) < workers and (last_page is None or next_page <= last_page):
+                    in_flight[next_page] = executor.submit(fetch_archive_page, feed_url, next_page)
+                    next_page += 1
+                if not in_flight:
+                    return
+
+                page = min(in_flight)
+                articles = in_flight.pop(page).result()
+                if not articles:
+                    return
+                yield page, articles
+        finally:
+            # Pages requested past the end are not waited for
+            for future in in_flight.values():
+                future.cancel()
+
+
+def iter_entries(source, known_ids=None, limit=None):
+    """
+    Incrementally parse RSS items / Atom entries into compact articles
+
+    Every entry is cleared from the tree once read, so memory stays flat
+    regardless of the feed size.
+
+    :param source: File-like object or bytes of the feed
+    :param known_ids: (Optional) Set of article IDs; parsing stops at the first one
+    :param limit: (Optional) Maximum number of articles to yield
+    :return: Generator of article dictionaries, in feed order
+    """
+    batch = []
+    for article in _iter_raw_entries(source, known_ids, limit):
+        batch.append(article)
+        if len(batch) >= COVER_IMAGE_BATCH_SIZE:
+            yield from _with_cover_images(batch)
+            batch = []
+    yield from _with_cover_images(batch)
+
+
+def _iter_raw_entries(source, known_ids=None, limit=None):
+    """
+    iter_entries() without the cover images found in the entries' HTML
+    """
+    if isinstance(source, (bytes, str)):
+        source = io.BytesIO(source.encode() if isinstance(source, str) else source)
+
+    known_ids = known_ids or set()
+    count = 0
+    # Feed bodies come from the network (or a WebSub push): entities are never
+    # resolved, so a declared SYSTEM entity cannot read local files into articles
+    entries = etree.iterparse(source, events=("end",), tag=ENTRY_TAGS, recover=True,
+                              resolve_entities=False, no_network=True)
+    for _, elem in entries:
+        article = _element_to_article(elem)
+
+        # Drop the entry and everything before it from the tree
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+        if article["id"] in known_ids:
+            return
+        yield article
+
+        count += 1
+        if limit and count >= limit:
+            return
+
+
+def _element_to_article(elem):
+    """
+    Convert an RSS <item> or Atom <entry> element to an article dictionary
+    """
+    if elem.tag == "item":
+        title = elem.findtext("title") or ""
+        link = (elem.findtext("link") or "").strip()
+        content = elem.findtext(CONTENT_ENCODED) or elem.findtext("description") or ""
+    else:
+        title = elem.findtext(ATOM + "title") or ""
+        link = ""
+        for link_elem in elem.iter(ATOM + "link"):
+            if link_elem.get("rel", "alternate") == "alternate":
+                link = link_elem.get("href", "")
+                break
+        content_elem = elem.find(ATOM + "content")
+        if content_elem is None:
+            content_elem = elem.find(ATOM + "summary")
+        content = _inner_html(content_elem) if content_elem is not None else ""
+
+    # The first image of the content takes precedence, see _with_cover_images
+    cover_image = None
+    for media in elem.iter(MEDIA_CONTENT, "enclosure", ATOM + "link"):
+        if media.tag == ATOM + "link" and media.get("rel") != "enclosure":
+            continue
+        if media.get("type", "").startswith("image/"):
+            cover_image = media.get("url") or media.get("href")
+            break
+
+    return {
+        "id": get_slug_from_link(link),
+        "title": title.strip(),
+        "content": content,
+        "link": link,
+        "cover_image": cover_image
+    }
+
+
+def _with_cover_images(articles):
+    """
+    Set the cover image of articles to the first image of their content,
+    parsing every article's HTML in a single extraction pool round trip
+    """
+    images = lib.extraction_pool.run_all(_cover_image_from_html, [article["content"] for article in articles])
+    for article, image in zip(articles, images):
+        article["cover_image"] = image or article["cover_image"]
+    return articles
+
+
+def _inner_html(elem):
+    # Atom xhtml content is wrapped in child elements rather than escaped text
+    if len(elem):
+        return (elem.text or "") + "".join(etree.tostring(child, encoding="unicode") for child in elem)
+    return elem.text or ""
+
+
+def _cover_image_from_html(content):
+    """
+    Find the cover image of an article in its HTML content
+    """
+    if not content:
+        return None
+
+    soup = BeautifulSoup(content, 'html.parser')
+    # Try to find the first image in the content
+    img = soup.find('img')
+    if img:
+        # Try to get the full-size image URL first
+        if img.get('srcset'):
+            # Get the largest image from srcset
+            srcset = img['srcset'].split(',')
+            return srcset[-1].strip().split(' ')[0]
+        # Fall back to src if no srcset
+        elif img.get('src'):
+            return img.get('src')
+    return None
+
+
+def entry_to_article(entry):
+    """
+    Convert a parsed feed entry to an article dictionary
+
+    :param entry: feedparser entry
+    :return: Article dictionary
+    """
     title = entry.get("title", "")
     link = entry.get("link", "")
     content = entry.get("content", [{}])[0].get("value", "") or entry.get("summary", "")
-    
+
     # Extract cover image from HTML content
-    cover_image = None
-    if content:
-        soup = BeautifulSoup(content, 'html.parser')
-        # Try to find the first image in the content
-        img = soup.find('img')
-        if img:
-            # Try to get the full-size image URL first
-            if img.get('srcset'):
-                # Get the largest image from srcset
-                srcset = img['srcset'].split(',')
-                largest_image = srcset[-1].strip().split(' ')[0]
-                cover_image = largest_image
-            # Fall back to src if no srcset
-            elif img.get('src'):
-                cover_image = img.get('src')
-    
+    cover_image = lib.extraction_pool.run(_cover_image_from_html, content)
+
     # If no image found in content, try other methods
     if not cover_image:
         # Try to get image from media:content
@@ -141,21 +402,21 @@ def fetch_random_article(exclude_posted=None):
                 if media.get('type', '').startswith('image/'):
                     cover_image = media.get('url')
                     break
-        
+
         # Try to get image from enclosure
         if not cover_image and hasattr(entry, 'enclosures'):
             for enclosure in entry.enclosures:
                 if enclosure.get('type', '').startswith('image/'):
                     cover_image = enclosure.get('href')
                     break
-        
+
         # Try to get image from image tag
         if not cover_image and hasattr(entry, 'image'):
             cover_image = entry.image.get('href')
-    
+
     return {
         "id": get_slug_from_link(link),
-        "title": title, 
+        "title": title,
         "content": content,
         "link": link,
         "cover_image": cover_image
@@ -171,6 +432,6 @@ def get_slug_from_link(link):
 if __name__ == "__main__":
     article = fetch_latest_article()
     if article:
-        print("Title:", article["title"])        
+        print("Title:", article["title"])
     else:
         print("No articles found.")
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+# Article fields that define a version of an article; any change invalidates
+# every stage computed from the previous version
+HASHED_FIELDS = ("title", "link", "content", "cover_image")
+
+
+class ErrInvalidArticle(Exception):
+    pass
+
+
+def content_hash(article):
+    """
+    Hash the source fields of an article
+
+    :param article: Article dictionary as returned by lib.rss
+    :return: Hex digest identifying this version of the article
+    """
+    digest = hashlib.sha256()
+    for field in HASHED_FIELDS:
+        digest.update((article.get(field) or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def cached(record, stage, compute):
+    """
+    Load a stage from a record, computing and storing it if missing
+
+    :param record: ArticleRecord, or None to always compute
+    :param stage: Stage name
+    :param compute: Function returning the stage output (JSON serializable)
+    :return: The stage output
+    """
+    if record is None:
+        return compute()
+    return record.cached(stage, compute)
+
+
+class ArticleStore:
+    """
+    On-disk store of pipeline stage outputs, keyed by article slug and
+    content hash.
+
+    Layout: <root>/<slug>/<content hash>/<stage>.json
+
+    A slug directory's modification time is when the article was last
+    opened; prune() drops the articles not opened for a while.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def open(self, article):
+        """
+        Open the record of the current version of an article, dropping
+        the stages stored for any previous version
+
+        :param article: Article dictionary as returned by lib.rss
+        :return: ArticleRecord
+        :raises ErrInvalidArticle: If the article has no id
+        """
+        slug = article.get("id")
+        if not slug:
+            raise ErrInvalidArticle("Article has no id")
+
+        record = ArticleRecord(self._slug_dir(slug), slug, content_hash(article))
+        self._prune(slug, keep=record.content_hash)
+        if os.path.isdir(self._slug_dir(slug)):
+            os.utime(self._slug_dir(slug))
+        return record
+
+    def prune(self, max_age_seconds):
+        """
+        Delete the stored stages of the articles not opened for max_age_seconds
+
+        :return: Number of articles deleted
+        """
+        cutoff = time.time() - max_age_seconds
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        deleted = 0
+        for entry in entries:
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    deleted += 1
+            except FileNotFoundError:
+                continue
+        return deleted
+
+    def _slug_dir(self, slug):
+        # Slugs come from URLs, keep them to a safe file name
+        return os.path.join(self.root, re.sub(r'[^\w\-.%]', '_', slug))
+
+    def _prune(self, slug, keep):
+        slug_dir = self._slug_dir(slug)
+        if not os.path.isdir(slug_dir):
+            return
+        for name in os.listdir(slug_dir):
+            if name != keep:
+                shutil.rmtree(os.path.join(slug_dir, name), ignore_errors=True)
+
+
+class ArticleRecord:
+    def __init__(self, slug_dir, slug, content_hash):
+        self.slug = slug
+        self.content_hash = content_hash
+        self.path = os.path.join(slug_dir, content_hash)
+        # Reentrant, a stage may be computed from other cached stages of the record
+        self._lock = threading.RLock()
+
+    def _stage_file(self, stage):
+        return os.path.join(self.path, f"{stage}.json")
+
+    def has(self, stage):
+        return os.path.exists(self._stage_file(stage))
+
+    def get(self, stage, default=None):
+        """
+        Load the output of a stage
+
+        :return: The stored output, or default if the stage is not stored
+        """
+        try:
+            with open(self._stage_file(stage), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return default
+
+    def put(self, stage, value):
+        """
+        Store the output of a stage atomically
+        """
+        os.makedirs(self.path, exist_ok=True)
+        tmp_file = f"{self._stage_file(stage)}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_file, self._stage_file(stage))
+        return value
+
+    def cached(self, stage, compute):
+        """
+        Load a stage, computing and storing it if missing
+        """
+        value = self.get(stage)
+        if value is not None:
+            return value
+        with self._lock:
+            value = self.get(stage)
+            if value is None:
+                value = self.put(stage, compute())
+        return value
@@ -1,6 +1,6 @@
-import re
 from bs4 import BeautifulSoup
 import html
+import lib.arabic
 
 def clean_html(html_content):
     """Clean HTML content by removing tags and decoding HTML entities."""
@@ -9,9 +9,8 @@ def clean_html(html_content):
     text = soup.get_text()
     # Decode HTML entities
     text = html.unescape(text)
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    # Remove invisible characters and extra whitespace
+    return lib.arabic.clean_text(text)
 
 def summarize(content, max_length=140):
     """
@@ -0,0 +1,278 @@
+import contextvars
+import datetime
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+
+import lib.metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at REAL NOT NULL,
+    day TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    article_id TEXT,
+    method TEXT NOT NULL,
+    model TEXT,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL,
+    error INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS calls_day ON calls (day);
+CREATE INDEX IF NOT EXISTS calls_run ON calls (run_id);
+CREATE INDEX IF NOT EXISTS calls_article ON calls (article_id);
+"""
+
+# Scopes a budget can be set for, and the column their calls are grouped by
+SCOPES = {
+    "article": "article_id",
+    "run": "run_id",
+    "day": "day",
+}
+
+TOKENS = "tokens"
+SECONDS = "seconds"
+
+
+class ErrBudgetExceeded(Exception):
+    pass
+
+
+# Article the calls of the current thread (or task) are made for
+_article = contextvars.ContextVar("usage_article", default=None)
+# One run is one invocation; --daemon starts a new one periodically
+_run_id = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+@contextmanager
+def article(article_id):
+    """
+    Attribute the OpenAI calls made in the enclosed block to an article
+    """
+    token = _article.set(article_id)
+    try:
+        yield
+    finally:
+        _article.reset(token)
+
+
+def current_article():
+    return _article.get()
+
+
+def start_run():
+    """
+    Begin a new run: per-run budgets start from zero
+
+    :return: ID of the run
+    """
+    global _run_id
+    _run_id = f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    return _run_id
+
+
+def current_run():
+    return _run_id
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+class UsageLedger:
+    """
+    Every OpenAI call with its token usage and wall time, in SQLite so that
+    daily totals add up across runs and processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def record(self, method, model, usage, seconds, error=False, article_id=None, run_id=None):
+        """
+        Record one call
+
+        :param method: Client method that made the call, e.g. summarize
+        :param model: Model the call used
+        :param usage: The response's usage object, or None if the call failed
+        :param seconds: Wall time of the call
+        :param error: Whether the call failed
+        :param article_id: (Optional) Article the call was made for, defaults to the current one
+        :param run_id: (Optional) Run the call belongs to, defaults to the current one
+        :return: Dictionary of prompt_tokens, completion_tokens and cached_tokens
+        """
+        tokens = usage_tokens(usage)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO calls (at, day, run_id, article_id, method, model, prompt_tokens, completion_tokens,"
+                " cached_tokens, seconds, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), _today(), run_id or current_run(), article_id or current_article(), method, model,
+                 tokens["prompt_tokens"], tokens["completion_tokens"], tokens["cached_tokens"], seconds, int(error))
+            )
+        for kind, count in tokens.items():
+            if count:
+                lib.metrics.registry.inc(lib.metrics.OPENAI_TOKENS, count, method=method, kind=kind.replace("_tokens", ""))
+        return tokens
+
+    def totals(self, scope, key):
+        """
+        Totals of the calls of one article, run or day
+
+        :param scope: article, run or day
+        :param key: The article ID, run ID or ISO date
+        :return: Dictionary of calls, prompt_tokens, completion_tokens, cached_tokens, tokens and seconds
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS calls, TOTAL(prompt_tokens) AS prompt_tokens,"
+                " TOTAL(completion_tokens) AS completion_tokens, TOTAL(cached_tokens) AS cached_tokens,"
+                f" TOTAL(seconds) AS seconds FROM calls WHERE {SCOPES[scope]} = ?", (key,)
+            ).fetchone()
+        totals = {name: int(row[name]) for name in ("calls", "prompt_tokens", "completion_tokens", "cached_tokens")}
+        totals["tokens"] = totals["prompt_tokens"] + totals["completion_tokens"]
+        totals["seconds"] = row["seconds"]
+        return totals
+
+    def report(self, day=None, group_by="method"):
+        """
+        Totals of a day per method, model or article
+
+        :param day: ISO date, defaults to today
+        :param group_by: method, model or article_id
+        :return: List of dictionaries, most tokens first
+        """
+        if group_by not in ("method", "model", "article_id"):
+            raise ValueError(f"Cannot group usage by {group_by}")
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {group_by} AS name, COUNT(*) AS calls, SUM(error) AS errors,"
+                " TOTAL(prompt_tokens) AS prompt_tokens, TOTAL(completion_tokens) AS completion_tokens,"
+                " TOTAL(cached_tokens) AS cached_tokens, TOTAL(seconds) AS seconds, MAX(seconds) AS max_seconds"
+                f" FROM calls WHERE day = ? GROUP BY {group_by}"
+                " ORDER BY TOTAL(prompt_tokens) + TOTAL(completion_tokens) DESC",
+                (day or _today(),)
+            ).fetchall()
+        report = []
+        for row in rows:
+            entry = dict(row)
+            for name in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                entry[name] = int(entry[name])
+            report.append(entry)
+        return report
+
+
+def usage_tokens(usage):
+    """
+    Token counts of an OpenAI response's usage object
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+    }
+
+
+class Budget:
+    """
+    Token and time limits per article, run and day. Past degrade_at of any
+    limit, calls switch to cheaper settings; once a limit is reached, calls
+    are refused and the pipeline falls back to local summarization.
+    """
+
+    def __init__(self, ledger, limits=None, degrade_at=0.8):
+        """
+        :param ledger: UsageLedger the spending is read from
+        :param limits: Dictionary of scope (article, run, day) to a dictionary of
+            tokens and/or seconds
+        :param degrade_at: Fraction of a limit after which calls are degraded
+        """
+        self.ledger = ledger
+        self.limits = {scope: limit for scope, limit in (limits or {}).items() if limit}
+        self.degrade_at = degrade_at
+
+    def _keys(self, article_id=None):
+        return {
+            "article": article_id or current_article(),
+            "run": current_run(),
+            "day": _today(),
+        }
+
+    def status(self, article_id=None):
+        """
+        :return: Tuple of (fraction of the most used limit, description of it), (0.0, None) without limits
+        """
+        worst = (0.0, None)
+        for scope, key in self._keys(article_id).items():
+            limit = self.limits.get(scope)
+            if not limit or key is None:
+                continue
+            totals = self.ledger.totals(scope, key)
+            for kind in (TOKENS, SECONDS):
+                if limit.get(kind):
+                    used = totals[kind] / limit[kind]
+                    if used > worst[0]:
+                        worst = (used, f"{scope} {kind} budget ({totals[kind]:.0f} of {limit[kind]})")
+        return worst
+
+    def exceeded(self, article_id=None):
+        """
+        :return: Description of the exhausted budget, or None if every budget has room left
+        """
+        used, description = self.status(article_id)
+        return description if used >= 1 else None
+
+    def check(self, article_id=None):
+        """
+        :return: True if calls should be degraded to cheaper settings
+        :raises ErrBudgetExceeded: If a budget is exhausted
+        """
+        used, description = self.status(article_id)
+        if used >= 1:
+            raise ErrBudgetExceeded(f"OpenAI {description} exhausted")
+        return used >= self.degrade_at
+
+
+_ledger = None
+_budget = None
+_lock = threading.Lock()
+
+
+def get_ledger():
+    """
+    The process-wide usage ledger, at usage.path
+    """
+    global _ledger
+    with _lock:
+        if _ledger is None:
+            from config import usage as usage_config
+            _ledger = UsageLedger(usage_config.path)
+    return _ledger
+
+
+def get_budget():
+    """
+    The budget configured in the usage section; rebuilt when the section changes
+    """
+    global _budget
+    import config
+    ledger = get_ledger()
+    usage_config = config.usage
+    with _lock:
+        if _budget is None or _budget[0] is not usage_config:
+            _budget = (usage_config, Budget(ledger, usage_config.budgets, usage_config.degrade_at))
+        return _budget[1]
@@ -0,0 +1,394 @@
+import hashlib
+import hmac
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import lib.logger
+
+logger = lib.logger.get_logger(__name__)
+
+# Digest algorithms a hub may use in X-Hub-Signature
+SIGNATURE_ALGORITHMS = {
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "sha384": hashlib.sha384,
+    "sha512": hashlib.sha512,
+}
+
+# Largest pushed body accepted, feeds are far smaller
+MAX_PUSH_BYTES = 10 * 1024 * 1024
+
+
+class ErrSubscriptionFailed(Exception):
+    pass
+
+
+class ErrNoHub(Exception):
+    pass
+
+
+def discover_hub(feed):
+    """
+    Find the WebSub hub and self URL advertised by a parsed feed
+
+    :param feed: Feed parsed by lib.rss.parse_feed
+    :return: Tuple of (hub_url, self_url), self_url may be None
+    :raises ErrNoHub: If the feed does not advertise a hub
+    """
+    hub_url = None
+    self_url = None
+    for link in feed.feed.get("links", []):
+        if link.get("rel") == "hub" and not hub_url:
+            hub_url = link.get("href")
+        elif link.get("rel") == "self" and not self_url:
+            self_url = link.get("href")
+
+    if not hub_url:
+        raise ErrNoHub("Feed does not advertise a WebSub hub")
+    return hub_url, self_url
+
+
+def sign(secret, body, algorithm="sha256"):
+    """
+    Compute the X-Hub-Signature header value of a body
+    """
+    digest = hmac.new(secret.encode(), body, SIGNATURE_ALGORITHMS[algorithm]).hexdigest()
+    return f"{algorithm}={digest}"
+
+
+def verify_signature(secret, body, signature):
+    """
+    Check an X-Hub-Signature header against the body it came with
+    """
+    if not signature or "=" not in signature:
+        return False
+    algorithm, _ = signature.split("=", 1)
+    if algorithm not in SIGNATURE_ALGORITHMS:
+        return False
+    return hmac.compare_digest(sign(secret, body, algorithm), signature)
+
+
+class _Subscription:
+    def __init__(self, topic, hub_url, callback_url, on_feed):
+        self.topic = topic
+        self.hub_url = hub_url
+        self.callback_url = callback_url
+        self.on_feed = on_feed
+        self.verified = threading.Event()
+        self.expires_at = None
+
+
+class Subscriber:
+    """
+    WebSub subscriber: a small HTTP endpoint that answers hub verification
+    challenges and hands pushed feed bodies to a callback.
+
+    Each topic is served on its own path, taken from its callback URL.
+    Pushes are only accepted signed with the secret shared with the hub.
+    """
+
+    def __init__(self, host="0.0.0.0", port=8080, secret=None, lease_seconds=86400):
+        """
+        :raises ValueError: Without a secret, anyone reaching the callback could publish
+        """
+        if not secret:
+            raise ValueError("A WebSub subscriber needs a secret to verify pushed content")
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.lease_seconds = lease_seconds
+        self.subscriptions = {}
+        self._server = None
+
+    def start(self):
+        """
+        Start serving callbacks in a background thread
+        """
+        subscriber = self
+
+        class Handler(_SubscriberHandler):
+            pass
+        Handler.subscriber = subscriber
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever, name="websub-subscriber", daemon=True)
+        thread.start()
+        logger.info(f"WebSub subscriber listening on {self.host}:{self.port}")
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def subscribe(self, topic, hub_url, callback_url, on_feed, timeout=30):
+        """
+        Ask a hub to push updates of a topic to our callback
+
+        :param topic: Feed URL to subscribe to
+        :param hub_url: URL of the WebSub hub
+        :param callback_url: Public URL of this subscriber for the topic
+        :param on_feed: Called with the raw feed body of every valid push
+        :param timeout: Seconds to wait for the hub to verify the subscription
+        :return: True if the hub verified the subscription within timeout
+        :raises ErrSubscriptionFailed: If the hub rejects the request
+        """
+        path = urlparse(callback_url).path or "/"
+        subscription = _Subscription(topic, hub_url, callback_url, on_feed)
+        self.subscriptions[path] = subscription
+
+        data = {
+            "hub.mode": "subscribe",
+            "hub.topic": topic,
+            "hub.callback": callback_url,
+            "hub.lease_seconds": self.lease_seconds,
+            "hub.secret": self.secret,
+        }
+
+        try:
+            response = requests.post(hub_url, data=data, timeout=30)
+        except requests.exceptions.RequestException as e:
+            raise ErrSubscriptionFailed(f"Failed to reach hub: {str(e)}")
+        if response.status_code not in (202, 204):
+            raise ErrSubscriptionFailed(f"Hub rejected subscription: {response.status_code} {response.text}")
+
+        return subscription.verified.wait(timeout)
+
+    def renew_due(self, margin_seconds=3600):
+        """
+        Re-subscribe every topic whose lease expires within margin_seconds
+        """
+        for subscription in list(self.subscriptions.values()):
+            if subscription.expires_at and subscription.expires_at - time.time() > margin_seconds:
+                continue
+            try:
+                self.subscribe(subscription.topic, subscription.hub_url,
+                               subscription.callback_url, subscription.on_feed)
+            except ErrSubscriptionFailed as e:
+                logger.error(f"Failed to renew WebSub subscription for {subscription.topic}: {str(e)}")
+
+
+class _SubscriberHandler(BaseHTTPRequestHandler):
+    subscriber = None
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """
+        Verification of intent: echo hub.challenge for topics we asked for
+        """
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        subscription = self.subscriber.subscriptions.get(url.path or "/")
+
+        if not subscription or params.get("hub.topic") != subscription.topic:
+            return self._reply(404)
+
+        mode = params.get("hub.mode")
+        if mode == "denied":
+            logger.warning(f"Hub denied subscription to {subscription.topic}: {params.get('hub.reason')}")
+            return self._reply(200)
+        if mode not in ("subscribe", "unsubscribe") or "hub.challenge" not in params:
+            return self._reply(404)
+
+        if mode == "subscribe":
+            try:
+                lease_seconds = int(params.get("hub.lease_seconds") or self.subscriber.lease_seconds)
+            except ValueError:
+                lease_seconds = 0
+            if lease_seconds <= 0:
+                lease_seconds = self.subscriber.lease_seconds
+            subscription.expires_at = time.time() + lease_seconds
+            subscription.verified.set()
+        self._reply(200, params["hub.challenge"].encode())
+
+    def do_POST(self):
+        """
+        Content distribution: hand the pushed feed body to the topic's callback
+        """
+        subscription = self.subscriber.subscriptions.get(urlparse(self.path).path or "/")
+        if not subscription:
+            return self._reply(404)
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_PUSH_BYTES:
+            # The body is left unread, the connection cannot be reused
+            self.close_connection = True
+            return self._reply(413 if length > MAX_PUSH_BYTES else 400)
+        body = self.rfile.read(length)
+
+        signature = self.headers.get("X-Hub-Signature")
+        if not signature:
+            logger.warning(f"Rejecting unsigned WebSub push for {subscription.topic}")
+            return self._reply(403)
+        # Hubs expect a 2xx even for bodies we ignore, otherwise they retry
+        if not verify_signature(self.subscriber.secret, body, signature):
+            logger.warning(f"Ignoring WebSub push with invalid signature for {subscription.topic}")
+            return self._reply(202)
+
+        self._reply(202)
+        threading.Thread(target=self._dispatch, args=(subscription, body), daemon=True).start()
+
+    def _dispatch(self, subscription, body):
+        try:
+            subscription.on_feed(body)
+        except Exception as e:
+            logger.error(f"Failed to handle WebSub push for {subscription.topic}: {str(e)}")
+
+    def log_message(self, format, *args):
+        logger.debug(f"WebSub subscriber: {format % args}")
+
+
+class LocalHub:
+    """
+    Minimal in-process WebSub hub for offline testing.
+
+    Accepts subscription requests, verifies intent against the subscriber's
+    callback, and distributes content given to publish() or POSTed to the
+    hub with hub.mode=publish.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.subscriptions = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self):
+        hub = self
+
+        class Handler(_HubHandler):
+            pass
+        Handler.hub = hub
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever, name="websub-hub", daemon=True)
+        thread.start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def verify(self, mode, topic, callback, secret=None, lease_seconds=None):
+        """
+        Verify intent with the subscriber and record the subscription
+        """
+        challenge = hashlib.sha256(f"{time.time()}{callback}".encode()).hexdigest()
+        params = {"hub.mode": mode, "hub.topic": topic, "hub.challenge": challenge}
+        if lease_seconds:
+            params["hub.lease_seconds"] = lease_seconds
+
+        try:
+            response = requests.get(callback, params=params, timeout=10)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Local hub could not verify {callback}: {str(e)}")
+            return False
+        if response.status_code != 200 or response.text != challenge:
+            return False
+
+        with self._lock:
+            callbacks = self.subscriptions.setdefault(topic, {})
+            if mode == "subscribe":
+                callbacks[callback] = secret
+            else:
+                callbacks.pop(callback, None)
+        return True
+
+    def publish(self, topic, content, content_type="application/rss+xml"):
+        """
+        Push content to every subscriber of a topic
+
+        :return: Number of subscribers that accepted the content
+        """
+        if isinstance(content, str):
+            content = content.encode()
+
+        with self._lock:
+            callbacks = dict(self.subscriptions.get(topic, {}))
+
+        delivered = 0
+        for callback, secret in callbacks.items():
+            headers = {
+                "Content-Type": content_type,
+                "Link": f'<{self.url}>; rel="hub", <{topic}>; rel="self"',
+            }
+            if secret:
+                headers["X-Hub-Signature"] = sign(secret, content)
+            try:
+                response = requests.post(callback, data=content, headers=headers, timeout=10)
+                if 200 <= response.status_code < 300:
+                    delivered += 1
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Local hub failed to deliver to {callback}: {str(e)}")
+        return delivered
+
+
+class _HubHandler(BaseHTTPRequestHandler):
+    hub = None
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+
+        # Raw feed bodies can be published with ?hub.topic=<feed url>
+        if not self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            if "hub.topic" not in query:
+                return self._reply(400, b"hub.topic is required")
+            self._reply(202)
+            self.hub.publish(query["hub.topic"], body, self.headers.get("Content-Type") or "application/rss+xml")
+            return
+
+        params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        mode = params.get("hub.mode")
+
+        if mode in ("subscribe", "unsubscribe"):
+            if not params.get("hub.topic") or not params.get("hub.callback"):
+                return self._reply(400, b"hub.topic and hub.callback are required")
+            self._reply(202)
+            threading.Thread(target=self.hub.verify, daemon=True, args=(
+                mode, params["hub.topic"], params["hub.callback"],
+                params.get("hub.secret"), params.get("hub.lease_seconds"),
+            )).start()
+        elif mode == "publish":
+            topic = params.get("hub.url") or params.get("hub.topic")
+            if not topic:
+                return self._reply(400, b"hub.url is required")
+            try:
+                response = requests.get(topic, timeout=30)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                return self._reply(502, str(e).encode())
+            self._reply(204)
+            self.hub.publish(topic, response.content, response.headers.get("Content-Type") or "application/rss+xml")
+        else:
+            self._reply(400, b"Unsupported hub.mode")
+
+    def log_message(self, format, *args):
+        logger.debug(f"Local hub: {format % args}")
@@ -1,6 +1,28 @@
+import argparse
+import datetime
+import hashlib
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import schedule
+
 import lib.rss
 import lib.summarizer
 import lib.logger
+import lib.content_pool
+import lib.coordination
+import lib.deadline
+import lib.extraction_pool
+import lib.facebook_tokens
+import lib.metrics
+import lib.outbox
+import lib.profiling
+import lib.store
+import lib.usage
+import lib.websub
 
 from clients.facebook.client import Client as FacebookClient
 from clients.x.client import Client as XClient
@@ -8,14 +30,69 @@ from clients.linkedin.client import Client as LinkedinClient
 from clients.telegram.client import Client as TelegramClient
 from clients.openai.client import Client as OpenAIClient
 
-from config import facebook as facebook_config
-from config import x as x_config
-from config import linkedin as linkedin_config
-from config import telegram as telegram_config
-from config import openai as openai_config
+import config
 
 logger = lib.logger.get_logger(__name__)
 
+CLIENTS = {
+    "facebook": FacebookClient,
+    "x": XClient,
+    "telegram": TelegramClient,
+    "linkedin": LinkedinClient,
+    "openai": OpenAIClient
+}
+
+# Latest articles of each feed considered when refilling the daily content pool
+DAILY_CANDIDATES_PER_FEED = 20
+
+# Built on first use: extraction pool workers re-import this module and must
+# not load the config or open the stores
+_article_store = None
+_outbox = None
+_state_lock = threading.Lock()
+
+
+def get_article_store():
+    """
+    Shared store of the articles' summaries and analyses, built on first use
+    """
+    global _article_store
+    with _state_lock:
+        if _article_store is None:
+            _article_store = lib.store.ArticleStore(os.path.join(config.app.data_dir, "articles"))
+        return _article_store
+
+
+def get_outbox():
+    """
+    Shared outbox of the publish jobs, built on first use
+    """
+    global _outbox
+    with _state_lock:
+        if _outbox is None:
+            _outbox = lib.outbox.Outbox(os.path.join(config.app.data_dir, "outbox.sqlite3"),
+                                        job_deadline_seconds=config.app.run_deadline_seconds)
+        return _outbox
+
+
+# Client name -> (config section it was built from, client)
+_clients = {}
+
+def get_client(name):
+    """
+    Shared client of a platform (or openai), built on first use
+
+    A config reload only rebuilds the clients whose section changed, the
+    others keep their sessions and tokens.
+    """
+    section = getattr(config, name)
+    with _state_lock:
+        entry = _clients.get(name)
+        if entry is None or entry[0] is not section:
+            entry = (section, CLIENTS[name](section))
+            _clients[name] = entry
+        return entry[1]
+
 def read_history(filename="history.txt"):
     try:
         with open(filename, "r") as f:
@@ -23,82 +100,634 @@ def read_history(filename="history.txt"):
     except FileNotFoundError:
         return set()
 
-def post_to_social_media(article, dry_run=False):
+def post_to_social_media(article, dry_run=False, platforms=None):
     """
-    Post article to all configured social media platforms
+    Post article to the given social media platforms
+
+    :param article: Article dictionary as returned by lib.rss
+    :param dry_run: If True, nothing is published
+    :param platforms: Platforms to post to, defaults to config.DEFAULT_PLATFORMS
     """
-    # Generate engaging message using OpenAI
-    try:
-        openai_client = OpenAIClient(openai_config)
-        ai_result = openai_client.summarize_article(
-            url=article['link'],
-            max_length=500,
-            include_hashtags=True,
-            dry_run=dry_run
+    payloads = prepare_payloads(article, dry_run=dry_run)
+    return publish_payloads(article, payloads, platforms=platforms, dry_run=dry_run)
+
+def prepare_payloads(article, dry_run=False):
+    """
+    Generate the posts of an article and render them for every platform
+
+    :param article: Article dictionary as returned by lib.rss
+    :param dry_run: If True, OpenAI is not called and the store is not used
+    :return: Dictionary of platform name to send() keyword arguments
+    """
+    # Reruns of the same article version load finished stages instead of
+    # recomputing them; dry runs never touch the store
+    record = None if dry_run else get_article_store().open(article)
+    if record:
+        record.put("article", article)
+
+    posts = record.get("posts") if record else None
+    if posts is None:
+        # Generate engaging message using OpenAI, unless a usage budget is spent
+        generated = False
+        exhausted = None if dry_run else lib.usage.get_budget().exceeded(article["id"])
+        if exhausted:
+            logger.warning(f"OpenAI {exhausted} exhausted, summarizing {article['id']} locally")
+            message = local_message(article)
+        else:
+            try:
+                with lib.metrics.timer("pipeline.generate"), lib.usage.article(article["id"]):
+                    ai_result = get_client("openai").summarize_article(
+                        article=article,
+                        max_length=500,
+                        include_hashtags=True,
+                        dry_run=dry_run,
+                        record=record
+                    )
+                message = ai_result['social_post']
+                generated = True
+            except lib.usage.ErrBudgetExceeded as e:
+                # A budget spent by other articles of the run, between the check above and the call
+                logger.warning(f"{str(e)}, summarizing {article['id']} locally")
+                message = local_message(article)
+            except Exception as e:
+                logger.warning(f"Failed to generate AI message, using fallback: {str(e)}")
+                # Fallback to simple message format
+                message = f"{article['title']}\n\n{article['link']}"
+
+        posts = render_posts(article, message)
+        # A fallback message is not stored so that the next run tries the AI again
+        if record and generated:
+            record.put("posts", posts)
+
+    return render_payloads(article, posts)
+
+def local_message(article, max_length=280):
+    """
+    Message of an article made without OpenAI: its title, the start of its text and its link
+    """
+    summary = lib.summarizer.summarize(article.get("content") or "", max_length=max_length)
+    return f"{article['title']}\n\n{summary}\n\n{article['link']}" if summary else f"{article['title']}\n\n{article['link']}"
+
+def publish_payloads(article, payloads, platforms=None, dry_run=False):
+    """
+    Publish the rendered payloads of an article
+
+    :param article: Article dictionary as returned by lib.rss
+    :param payloads: Dictionary of platform name to send() keyword arguments, see prepare_payloads
+    :param platforms: Platforms to post to, defaults to config.DEFAULT_PLATFORMS
+    :param dry_run: If True, nothing is published
+    :return: True if every platform is done, False if some are left to outbox retries
+    """
+    platforms = platforms or config.DEFAULT_PLATFORMS
+
+    # Dry runs go straight through the clients, which publish nothing
+    if dry_run:
+        senders = platform_senders(dry_run=True)
+        for platform in platforms:
+            try:
+                response = senders[platform](**payloads[platform])
+                logger.info(f"{platform} post successful: {response}")
+            except Exception as e:
+                logger.error(f"Failed to post to {platform}: {str(e)}")
+        return True
+
+    # Every platform gets a durable job; the ones that fail now are retried
+    # from the outbox without running the pipeline again
+    for platform in platforms:
+        get_outbox().enqueue(article["id"], platform, payloads[platform])
+    if lib.deadline.expired():
+        logger.warning(f"Article {article['id']}: run deadline exceeded, publishing is left to outbox retries")
+        return False
+    results = get_outbox().drain(platform_senders(), article_id=article["id"])
+    if results[lib.outbox.PENDING] or results[lib.outbox.FAILED]:
+        logger.warning(f"Article {article['id']}: {results[lib.outbox.PENDING]} platform(s) scheduled for retry, "
+                       f"{results[lib.outbox.FAILED]} gave up")
+        return False
+    return True
+
+def platform_senders(dry_run=False):
+    """
+    Map each platform to a callable publishing an outbox payload on it
+    """
+    def sender(platform):
+        # The client is looked up on every call so a config reload applies to queued jobs
+        return lambda **payload: get_client(platform).send(dry_run=dry_run, **payload)
+
+    # Each platform's whole publish, client setup included, is one stage
+    return {platform: lib.metrics.timed(f"publish.{platform}")(sender(platform)) for platform in config.PLATFORMS}
+
+def batch_senders(dry_run=False):
+    """
+    Map each platform that can publish several outbox payloads in one
+    request to a callable doing so
+    """
+    return {
+        "facebook": lib.metrics.timed("publish.facebook_batch")(
+            lambda payloads: get_client("facebook").send_batch(payloads, dry_run=dry_run)
         )
-        message = ai_result['social_post']        
-    except Exception as e:
-        logger.warning(f"Failed to generate AI message, using fallback: {str(e)}")
-        # Fallback to simple message format
-        message = f"{article['title']}\n\n{article['link']}"
-    
-    # Post to Facebook
+    }
+
+def render_posts(article, message):
+    """
+    Render the text posted to each platform
+
+    :param article: Article dictionary as returned by lib.rss
+    :param message: Generated social media message
+    :return: Dictionary of platform name to post text
+    """
+    return {
+        "facebook": message,
+        # Note, twitter does not accept more than 140 chars so we limit the post to only the link and the title with an image
+        "x": f"{article['title']}\n\n{article['link']}",
+        "telegram": message,
+        "linkedin": message
+    }
+
+def render_payloads(article, posts):
+    """
+    Render the keyword arguments of each platform client's send()
+
+    :param article: Article dictionary as returned by lib.rss
+    :param posts: Dictionary of platform name to post text, see render_posts
+    :return: Dictionary of platform name to send() keyword arguments
+    """
+    return {
+        "facebook": {"message": posts["facebook"], "link": article["link"], "image_url": article["cover_image"]},
+        "x": {"message": posts["x"], "image_url": article["cover_image"]},
+        "telegram": {"message": posts["telegram"], "link": article["link"], "image_url": article["cover_image"]},
+        "linkedin": {"message": posts["linkedin"], "link": article["link"]}
+    }
+
+def refill_content_pool():
+    """
+    Generate daily posts from the feeds' latest articles if the content pool
+    runs low on any platform
+
+    :return: Number of posts added
+    """
+    daily_config = config.daily_content
+    pool = lib.content_pool.get_content_pool()
+
+    def candidates():
+        # Fetched lazily, a pool above its low-water mark does not touch the feeds
+        for feed in config.rss.feeds:
+            yield from lib.rss.fetch_new_articles(feed.feed_url, limit=DAILY_CANDIDATES_PER_FEED) or []
+
+    def generate(article):
+        # Articles published through the pipeline already have their extraction and analysis stored
+        with lib.usage.article(article["id"]):
+            posts = get_client("openai").generate_daily_posts(
+                article=article,
+                num_posts=daily_config.posts_per_run,
+                record=get_article_store().open(article)
+            )
+        return [post for post in posts if len(post["post"]) <= daily_config.max_post_length]
+
+    exhausted = lib.usage.get_budget().exceeded()
+    if exhausted:
+        logger.warning(f"OpenAI {exhausted} exhausted, not refilling the daily content pool")
+        return 0
+
+    # Nodes sharing the pool do not generate from the same articles at once
+    coordinator = lib.coordination.get_coordinator()
+    if not coordinator.claim("daily:refill"):
+        return 0
     try:
-        fb_client = FacebookClient(facebook_config)
-        response = fb_client.send(message, link=article["link"], image_url=article["cover_image"], dry_run=dry_run)
-        logger.info(f"Facebook post successful: {response}")
-    except Exception as e:
-        logger.error(f"Failed to post to Facebook: {str(e)}")
+        with lib.deadline.scope(config.app.run_deadline_seconds), lib.metrics.timer("daily.refill"):
+            pool.prune(daily_config.platforms)
+            return lib.content_pool.refill(
+                pool,
+                candidates(),
+                generate,
+                daily_config.platforms,
+                post_types=daily_config.post_types,
+                low_water_mark=daily_config.low_water_mark,
+                max_articles=daily_config.refill_articles
+            )
+    finally:
+        coordinator.release("daily:refill")
+
+def render_daily_payloads(post):
+    """
+    Render the keyword arguments of each platform client's send() for a pool post
 
+    :param post: Post dictionary as returned by lib.content_pool.ContentPool.take
+    :return: Dictionary of platform name to send() keyword arguments
+    """
+    article = post["article"]
+    link = article.get("link") if config.daily_content.include_article_link else None
+    return {
+        "facebook": {"message": post["post"], "link": link, "image_url": article.get("cover_image")},
+        # X has no link attachment
+        "x": {"message": f"{post['post']}\n\n{link}" if link else post["post"], "image_url": article.get("cover_image")},
+        "telegram": {"message": post["post"], "link": link, "image_url": article.get("cover_image")},
+        "linkedin": {"message": post["post"], "link": link}
+    }
+
+def publish_daily_posts(platforms=None, dry_run=False, slot=None):
+    """
+    Publish the next post of the content pool on every platform, without calling OpenAI
+
+    :param platforms: Platforms to post to, defaults to daily_content.platforms
+    :param dry_run: If True, nothing is published and the pool is left as is
+    :param slot: (Optional) Name of the publishing slot, e.g. its date and time; only one
+        node publishes each slot
+    :return: Dictionary of platform name to the pool post published there
+    """
+    daily_config = config.daily_content
+    platforms = platforms or daily_config.platforms
+    pool = lib.content_pool.get_content_pool()
+
+    coordinator = lib.coordination.get_coordinator()
+    if slot and not dry_run and not coordinator.claim(f"daily:{slot}"):
+        logger.info(f"Daily posts of {slot} are published by another node")
+        return {}
 
-    # Post to X (Twitter)
     try:
-        # Note, twitter does not accept more than 140 chars so we limit the post to only the link and the title with an image
-        x_client = XClient(x_config)
-        response = x_client.send(f"{article['title']}\n\n{article['link']}", image_url=article["cover_image"], dry_run=dry_run)
-        logger.info(f"X post successful: {response}")
-    except Exception as e:
-        logger.error(f"Failed to post to X: {str(e)}")   
+        published = {}
+        for platform in platforms:
+            post_types = daily_config.post_types or None
+            post = pool.peek(platform, post_types) if dry_run else pool.take(platform, post_types)
+            if post is None:
+                logger.warning(f"Daily content pool has no post left for {platform}")
+                continue
+
+            payload = render_daily_payloads(post)[platform]
+            if dry_run:
+                response = platform_senders(dry_run=True)[platform](**payload)
+                logger.info(f"Daily {post['type']} post on {platform} successful: {response}")
+            else:
+                # Keyed by the text, so the same post never goes out twice on a platform
+                job_id = "daily-" + hashlib.sha256(post["post"].encode()).hexdigest()[:16]
+                get_outbox().enqueue(job_id, platform, payload)
+                get_outbox().drain(platform_senders(), article_id=job_id)
+            published[platform] = post
+    except Exception:
+        if slot and not dry_run:
+            coordinator.release(f"daily:{slot}")
+        raise
 
-    # Post to Telegram
+    if slot and not dry_run:
+        coordinator.complete(f"daily:{slot}")
+    return published
+
+def _publish_daily_posts_safely(dry_run=False, publish_time=None):
     try:
-        telegram_client = TelegramClient(telegram_config)
-        response = telegram_client.send(message, link=article["link"], image_url=article["cover_image"], dry_run=dry_run)
-        logger.info(f"Telegram post successful: {response}")
+        slot = f"{datetime.date.today().isoformat()} {publish_time}" if publish_time else None
+        with lib.deadline.scope(config.app.run_deadline_seconds), lib.metrics.timer("pipeline.daily"):
+            publish_daily_posts(dry_run=dry_run, slot=slot)
     except Exception as e:
-        logger.error(f"Failed to post to Telegram: {str(e)}")
+        logger.error(f"Error publishing daily posts: {str(e)}")
 
 def update_history(article_id, filename="history.txt"):
     """
     Update the history file with the posted article ID
     """
     try:
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
         with open(filename, "a") as f:
             f.write(article_id + "\n")
         logger.info(f"Updated history with article ID: {article_id}")
     except Exception as e:
         logger.error(f"Failed to update history: {str(e)}")
 
+def feed_state_file(feed):
+    """
+    Path of the conditional-request state file of a feed
+    """
+    return os.path.join(config.app.data_dir, "feeds", feed.name, "feed_state.json")
+
+# Serializes polling and WebSub pushes of the same feed
+_feed_locks = defaultdict(threading.Lock)
+
+def process_feed(feed, dry_run=False):
+    """
+    Publish the latest article of a feed if it was not posted yet
+
+    :param feed: config.Feed to poll
+    :param dry_run: If True, nothing is published
+    :return: The published article, or None if there was nothing new
+    """
+    with _feed_locks[feed.name]:
+        state = lib.rss.load_feed_state(feed_state_file(feed))
+
+        # Stream the feed up to the latest article, stopping early if it was already posted
+        articles = lib.rss.fetch_new_articles(feed.feed_url, read_history(feed.history_file), state, limit=1)
+        if articles is None:
+            logger.info(f"[{feed.name}] Feed not modified since last check")
+            return None
+
+        published = None
+        if articles:
+            published = publish_article(feed, articles[0], dry_run=dry_run)
+        else:
+            logger.info(f"[{feed.name}] No new articles")
+
+        # Only remember the feed's validators once its article went out, so a failed
+        # run fetches the full feed again next time
+        lib.rss.save_feed_state(feed_state_file(feed), state)
+        return published
+
+def process_pushed_feed(feed, content, dry_run=False):
+    """
+    Publish the latest article of a feed body pushed by a WebSub hub
+
+    :param feed: config.Feed the push belongs to
+    :param content: Raw feed body
+    :param dry_run: If True, nothing is published
+    :return: The published article, or None if there was nothing new
+    """
+    with _feed_locks[feed.name], lib.deadline.scope(config.app.run_deadline_seconds):
+        articles = list(lib.rss.iter_entries(content, known_ids=read_history(feed.history_file), limit=1))
+        if not articles:
+            return None
+        return publish_article(feed, articles[0], dry_run=dry_run)
+
+def publish_article(feed, article, dry_run=False):
+    """
+    Publish an article of a feed unless it is in the feed's history
+    """
+    logger.info(f"[{feed.name}] Fetched article: {article['title']}")
+    lib.profiling.tag(article["id"])
+
+    # Check if article was already posted
+    history = read_history(feed.history_file)
+    if article["id"] in history:
+        logger.info(f"[{feed.name}] Article already posted: {article['id']}")
+        return None
+
+    # Only the node holding the article's lease publishes it
+    coordinator = lib.coordination.get_coordinator()
+    if not dry_run and not coordinator.claim_article(feed.name, article["id"]):
+        logger.info(f"[{feed.name}] Article {article['id']} is published by another node")
+        return None
+
+    # Post to social media with AI-generated content
+    try:
+        post_to_social_media(article, dry_run=dry_run, platforms=feed.platforms)
+    except Exception:
+        if not dry_run:
+            coordinator.release_article(feed.name, article["id"])
+        raise
+
+    # Update history
+    update_history(article["id"], feed.history_file)
+    if not dry_run:
+        coordinator.complete_article(feed.name, article["id"])
+
+    logger.info(f"[{feed.name}] Successfully published article {article['id']}")
+    return article
+
+def _process_feed_safely(feed, dry_run=False):
+    if not lib.coordination.get_coordinator().owns_feed(feed.name):
+        logger.debug(f"[{feed.name}] Polled by another node")
+        return None
+    try:
+        with lib.deadline.scope(config.app.run_deadline_seconds), \
+                lib.profiling.session(f"feed-{feed.name}"), lib.metrics.timer("pipeline.feed"):
+            return process_feed(feed, dry_run=dry_run)
+    except Exception as e:
+        logger.error(f"[{feed.name}] Error processing feed: {str(e)}")
+        raise
+
+def poll_feeds(feeds, dry_run=False):
+    """
+    Poll all feeds concurrently, one worker per feed
+
+    :param feeds: List of config.Feed
+    :param dry_run: If True, nothing is published
+    :raises Exception: The first feed error, after every feed has been polled
+    """
+    with ThreadPoolExecutor(max_workers=max(len(feeds), 1)) as executor:
+        futures = [executor.submit(_process_feed_safely, feed, dry_run) for feed in feeds]
+
+    errors = [future.exception() for future in futures if future.exception()]
+    if errors:
+        raise errors[0]
+
+def export_metrics(run_summary=False):
+    """
+    Write the Prometheus textfile and, at the end of a run, its timing summary
+    """
+    try:
+        lib.metrics.registry.write_textfile(config.metrics.textfile)
+        if run_summary:
+            path = lib.metrics.registry.write_run_summary(config.metrics.run_summary_dir)
+            logger.info(f"Run timings written to {path}")
+            log_usage()
+    except Exception as e:
+        logger.error(f"Failed to export metrics: {str(e)}")
+
+def log_usage():
+    """
+    Log the OpenAI tokens and time spent by the current run and today
+    """
+    try:
+        ledger = lib.usage.get_ledger()
+        for scope, key in (("run", lib.usage.current_run()), ("day", datetime.date.today().isoformat())):
+            totals = ledger.totals(scope, key)
+            logger.info(f"OpenAI usage this {scope}: {totals['calls']} calls, {totals['prompt_tokens']} prompt "
+                        f"({totals['cached_tokens']} cached) and {totals['completion_tokens']} completion tokens, "
+                        f"{totals['seconds']:.1f}s")
+    except Exception as e:
+        logger.error(f"Failed to read OpenAI usage: {str(e)}")
+
+def prune_article_store():
+    """
+    Delete the stored stages of the articles not processed for app.article_retention_days
+    """
+    retention_days = config.app.article_retention_days
+    if not retention_days:
+        return
+    try:
+        deleted = get_article_store().prune(retention_days * 24 * 3600)
+        if deleted:
+            logger.info(f"Pruned {deleted} article(s) not processed for {retention_days} days from the store")
+    except Exception as e:
+        logger.error(f"Failed to prune the article store: {str(e)}")
+
+def start_usage_run():
+    """
+    Close the current usage run with its totals and begin a new one
+    """
+    log_usage()
+    lib.usage.start_run()
+
+def start_websub(feeds, dry_run=False):
+    """
+    Subscribe to every feed's WebSub hub so new articles are pushed to us
+
+    :return: The running lib.websub.Subscriber
+    """
+    websub_config = config.websub
+    subscriber = lib.websub.Subscriber(
+        host=websub_config.host,
+        port=websub_config.port,
+        secret=websub_config.secret,
+        lease_seconds=websub_config.lease_seconds
+    )
+    subscriber.start()
+
+    for feed in feeds:
+        try:
+            hub_url, topic = websub_config.hub_url, feed.feed_url
+            if not hub_url:
+                hub_url, self_url = lib.websub.discover_hub(lib.rss.fetch_feed(feed.feed_url))
+                topic = self_url or feed.feed_url
+
+            callback_url = f"{websub_config.callback_url.rstrip('/')}/{feed.name}"
+            on_feed = lambda content, feed=feed: process_pushed_feed(feed, content, dry_run=dry_run)
+            if subscriber.subscribe(topic, hub_url, callback_url, on_feed):
+                logger.info(f"[{feed.name}] Subscribed to {topic} via {hub_url}")
+            else:
+                logger.warning(f"[{feed.name}] Hub {hub_url} did not verify the subscription yet")
+        except Exception as e:
+            logger.error(f"[{feed.name}] WebSub subscription failed, relying on polling: {str(e)}")
+
+    return subscriber
+
+def schedule_feeds(executor, feeds, dry_run=False):
+    """
+    (Re)schedule polling of every feed at its own check interval
+    """
+    schedule.clear("feeds")
+    for feed in feeds:
+        interval = feed.check_interval_minutes or 15
+        schedule.every(interval).minutes.do(executor.submit, _process_feed_safely, feed, dry_run).tag("feeds")
+        logger.info(f"[{feed.name}] Polling {feed.feed_url} every {interval} minutes")
+
+def schedule_daily_posts(executor, dry_run=False):
+    """
+    (Re)schedule publishing from the daily content pool at daily_content.publish_times
+    """
+    schedule.clear("daily")
+    daily_config = config.daily_content
+    if not daily_config.enabled:
+        return
+    for publish_time in daily_config.publish_times:
+        schedule.every().day.at(publish_time).do(
+            executor.submit, _publish_daily_posts_safely, dry_run, publish_time
+        ).tag("daily")
+        logger.info(f"Publishing daily posts at {publish_time}")
+
+def run_daemon(feeds, dry_run=False):
+    """
+    Keep polling every feed at its own check interval, and take WebSub
+    pushes when enabled. Config file changes are picked up while running.
+    """
+    # Reload listeners run on the watcher thread, schedule is only touched from this one
+    feeds_changed = threading.Event()
+    daily_changed = threading.Event()
+    config.subscribe(lambda changed, _: "rss" in changed and feeds_changed.set())
+    config.subscribe(lambda changed, _: "daily_content" in changed and daily_changed.set())
+    if config.app.config_watch_seconds:
+        config.ConfigWatcher(config.app.config_watch_seconds).start()
+
+    websub_config = config.websub
+    if websub_config.enabled:
+        subscriber = start_websub(feeds, dry_run=dry_run)
+        schedule.every(1).hours.do(subscriber.renew_due)
+
+    if not dry_run:
+        lib.outbox.OutboxWorker(get_outbox(), platform_senders(), batch_senders=batch_senders()).start()
+
+    metrics_config = config.metrics
+    if metrics_config.port:
+        lib.metrics.registry.serve(metrics_config.host, metrics_config.port)
+        logger.info(f"Serving metrics on {metrics_config.host}:{metrics_config.port}/metrics")
+    schedule.every(1).minutes.do(export_metrics)
+    # Per-run usage budgets apply to each hour of a daemon
+    schedule.every(1).hours.do(start_usage_run)
+    schedule.every(1).days.do(prune_article_store)
+
+    daily_config = config.daily_content
+    if daily_config.enabled:
+        # Generation runs in the background, publishing a daily post only reads the pool
+        lib.content_pool.ContentPoolRefiller(
+            refill_content_pool, interval_seconds=daily_config.refill_interval_minutes * 60
+        ).start()
+
+    executor = ThreadPoolExecutor(max_workers=max(len(feeds), 1))
+    schedule_feeds(executor, feeds, dry_run=dry_run)
+    schedule_daily_posts(executor, dry_run=dry_run)
+
+    for feed in feeds:
+        executor.submit(_process_feed_safely, feed, dry_run)
+    while True:
+        if feeds_changed.is_set():
+            feeds_changed.clear()
+            # WebSub subscriptions of added feeds start with the next restart
+            schedule_feeds(executor, config.rss.feeds, dry_run=dry_run)
+        if daily_changed.is_set():
+            daily_changed.clear()
+            schedule_daily_posts(executor, dry_run=dry_run)
+        schedule.run_pending()
+        time.sleep(1)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish new blog posts to social media")
+    parser.add_argument("--daemon", action="store_true", help="Keep running and poll feeds at their check interval")
+    parser.add_argument("--dry-run", action="store_true", help="Do everything except publishing")
+    parser.add_argument("--drain-outbox", action="store_true", help="Only retry the outbox's due publish jobs")
+    parser.add_argument("--daily-post", action="store_true",
+                        help="Only publish the next post of the daily content pool on every daily_content platform")
+    parser.add_argument("--refill-pool", action="store_true",
+                        help="Only generate daily posts if the daily content pool is below its low-water mark")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Write CPU and per-stage memory profiles of each article (or set {lib.profiling.PROFILE_ENV}=1)")
+    args = parser.parse_args()
+
+    if args.profile or lib.profiling.enabled_from_env():
+        profile_dir = os.environ.get(lib.profiling.PROFILE_DIR_ENV) or os.path.join(config.app.data_dir, "profiles")
+        lib.profiling.configure(profile_dir)
+        logger.info(f"Profiling enabled, reports go to {profile_dir}")
+
+    if config.app.extraction_workers:
+        lib.extraction_pool.configure(config.app.extraction_workers)
+
+    if args.drain_outbox:
+        with lib.deadline.scope(config.app.run_deadline_seconds):
+            results = get_outbox().drain(platform_senders(), batch_senders=batch_senders())
+        logger.info(f"Outbox drained: {results}, {get_outbox().pending_count()} job(s) still pending")
+        exit(0)
+
+    if args.daily_post:
+        with lib.deadline.scope(config.app.run_deadline_seconds):
+            published = publish_daily_posts(dry_run=args.dry_run)
+        logger.info(f"Daily posts published on {len(published)} platform(s)")
+        exit(0)
+
+    if not config.rss.feeds:
+        raise lib.rss.ErrInvalidFeedURL("No feeds configured")
+
+    if args.refill_pool:
+        added = refill_content_pool()
+        logger.info(f"Daily content pool refilled with {added} post(s)")
+        exit(0)
+
+    # Announce this node to the others, keeping its leases alive while it runs
+    coordinator = lib.coordination.get_coordinator()
+    coordinator.start()
+    # Facebook tokens are renewed ahead of their expiry while feeds are processed,
+    # so publishing never waits on the token exchange; one-shot runs renew at start
+    token_renewer = lib.facebook_tokens.TokenRenewer(deadline_seconds=config.app.run_deadline_seconds)
+    if not args.dry_run:
+        token_renewer.start()
+
     try:
-        # Fetch the latest article
-        article = lib.rss.fetch_latest_article()
-        logger.info(f"Fetched article: {article['title']}")
-        
-        # Check if article was already posted
-        history = read_history()
-        if article["id"] in history:
-            logger.info(f"Article already posted: {article['id']}")
-            exit(0)
-        
-        # Post to social media with AI-generated content
-        post_to_social_media(article, dry_run=False)
-        
-        # Update history
-        update_history(article["id"])
-        
-        logger.info(f"Successfully published article {article['id']}")
-        
+        if args.daemon:
+            run_daemon(config.rss.feeds, dry_run=args.dry_run)
+        else:
+            # Retry publish jobs left over by previous runs first
+            if not args.dry_run:
+                with lib.deadline.scope(config.app.run_deadline_seconds):
+                    get_outbox().drain(platform_senders(), batch_senders=batch_senders())
+            poll_feeds(config.rss.feeds, dry_run=args.dry_run)
+            prune_article_store()
     except Exception as e:
         logger.error(f"Error in main process: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        coordinator.stop(timeout=5)
+        token_renewer.stop(timeout=30)
+        export_metrics(run_summary=not args.daemon)
@@ -0,0 +1,131 @@
+import argparse
+import os
+import shutil
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import main and lib
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config
+import lib.backfill
+import lib.coordination
+import lib.deadline
+import lib.extraction_pool
+import lib.logger
+import lib.rss
+import main
+
+logger = lib.logger.get_logger("backfill")
+
+
+def select_feed(name=None):
+    feeds = config.rss.feeds
+    if not feeds:
+        raise lib.rss.ErrInvalidFeedURL("No feeds configured")
+    if name is None:
+        return feeds[0]
+    for feed in feeds:
+        if feed.name == name:
+            return feed
+    raise SystemExit(f"Unknown feed {name}, configured feeds: {', '.join(feed.name for feed in feeds)}")
+
+
+def walk_archive(feed, workers, max_pages=None, newest_first=False):
+    """
+    Collect the archive's articles that are not in the feed's history
+
+    :return: List of articles in publishing order, oldest first unless newest_first
+    """
+    history = main.read_history(feed.history_file)
+    articles, seen = [], set()
+    for page, page_articles in lib.rss.iter_archive(feed.feed_url, workers=workers, max_pages=max_pages):
+        new = [article for article in page_articles if article["id"] not in history and article["id"] not in seen]
+        seen.update(article["id"] for article in new)
+        articles.extend(new)
+        logger.info(f"[{feed.name}] Archive page {page}: {len(page_articles)} articles, {len(new)} to backfill")
+
+    # Archive pages list the newest articles first
+    return articles if newest_first else articles[::-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish a feed's archive, resuming where the last run stopped")
+    parser.add_argument("--feed", help="Name of the feed to backfill, defaults to the first configured feed")
+    parser.add_argument("--workers", type=int, default=4, help="Archive pages fetched and articles prepared concurrently")
+    parser.add_argument("--pace-seconds", type=float, default=60, help="Minimum time between two published articles")
+    parser.add_argument("--extraction-workers", type=int,
+                        help="Processes parsing article HTML, defaults to app.extraction_workers or the number of CPUs")
+    parser.add_argument("--max-pages", type=int, help="Only walk this many archive pages")
+    parser.add_argument("--max-articles", type=int, help="Stop after this many articles, the rest stays pending")
+    parser.add_argument("--newest-first", action="store_true", help="Publish the newest articles first")
+    parser.add_argument("--restart", action="store_true", help="Forget the checkpoint and walk the archive again")
+    parser.add_argument("--dry-run", action="store_true", help="Do everything except publishing, without checkpointing")
+    args = parser.parse_args()
+
+    feed = select_feed(args.feed)
+    # Extraction is CPU-bound, parse on every core instead of the prepare threads
+    lib.extraction_pool.configure(args.extraction_workers or config.app.extraction_workers or None)
+    checkpoint_dir = os.path.join(config.app.data_dir, "backfill", feed.name)
+    if args.restart:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    checkpoint = lib.backfill.Checkpoint(checkpoint_dir)
+
+    if checkpoint.walked:
+        logger.info(f"[{feed.name}] Resuming backfill of {len(checkpoint.articles)} articles from {checkpoint_dir}")
+        articles = checkpoint.articles
+    else:
+        articles = walk_archive(feed, args.workers, max_pages=args.max_pages, newest_first=args.newest_first)
+        if not args.dry_run:
+            checkpoint.set_articles(articles)
+
+    # Regular runs may have published some of them in the meantime
+    history = main.read_history(feed.history_file)
+    pending = articles if args.dry_run else checkpoint.pending()
+    todo = [article for article in pending if article["id"] not in history]
+    todo = todo[:args.max_articles] if args.max_articles else todo
+    logger.info(f"[{feed.name}] {len(todo)} articles to backfill")
+
+    coordinator = lib.coordination.get_coordinator()
+    coordinator.start()
+
+    # Preparing and publishing an article each get the deadline of a regular run
+    def prepare(article):
+        with lib.deadline.scope(config.app.run_deadline_seconds):
+            return main.prepare_payloads(article, dry_run=args.dry_run)
+
+    def publish(article, payloads):
+        with lib.deadline.scope(config.app.run_deadline_seconds):
+            return publish_article(article, payloads)
+
+    def publish_article(article, payloads):
+        if args.dry_run:
+            return main.publish_payloads(article, payloads, platforms=feed.platforms, dry_run=True)
+        # Regular runs on other nodes may be publishing the same article
+        if not coordinator.claim_article(feed.name, article["id"]):
+            logger.info(f"[{feed.name}] Article {article['id']} is published by another node")
+            return True
+        try:
+            published = main.publish_payloads(article, payloads, platforms=feed.platforms)
+        except Exception:
+            coordinator.release_article(feed.name, article["id"])
+            raise
+        main.update_history(article["id"], feed.history_file)
+        coordinator.complete_article(feed.name, article["id"])
+        return published
+
+    try:
+        progress = lib.backfill.run(
+            todo,
+            prepare=prepare,
+            publish=publish,
+            checkpoint=None if args.dry_run else checkpoint,
+            workers=args.workers,
+            pace_seconds=0 if args.dry_run else args.pace_seconds
+        )
+        logger.info(f"[{feed.name}] Backfill finished: {progress}")
+    except KeyboardInterrupt:
+        logger.info(f"[{feed.name}] Backfill interrupted, run again to resume")
+    finally:
+        coordinator.stop(timeout=5)
+        main.export_metrics(run_summary=True)
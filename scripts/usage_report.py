@@ -0,0 +1,26 @@
+import argparse
+import datetime
+import sys
+from pathlib import Path
+
+# Add parent directory to path so we can import lib
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import lib.usage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the OpenAI tokens and time spent on a day")
+    parser.add_argument("--day", default=datetime.date.today().isoformat(), help="ISO date, defaults to today")
+    parser.add_argument("--by", choices=["method", "model", "article_id"], default="method",
+                        help="Group the calls by client method, model or article")
+    args = parser.parse_args()
+
+    rows = lib.usage.get_ledger().report(args.day, group_by=args.by)
+    print(f"{args.by:<40} {'calls':>6} {'errors':>6} {'prompt':>10} {'cached':>10} {'completion':>10} {'seconds':>9} {'max s':>7}")
+    for row in rows:
+        print(f"{str(row['name']):<40} {row['calls']:>6} {row['errors']:>6} {row['prompt_tokens']:>10} "
+              f"{row['cached_tokens']:>10} {row['completion_tokens']:>10} {row['seconds']:>9.1f} {row['max_seconds']:>7.1f}")
+    totals = lib.usage.get_ledger().totals("day", args.day)
+    print(f"{'total':<40} {totals['calls']:>6} {'':>6} {totals['prompt_tokens']:>10} "
+          f"{totals['cached_tokens']:>10} {totals['completion_tokens']:>10} {totals['seconds']:>9.1f}")
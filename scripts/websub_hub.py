@@ -0,0 +1,28 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add parent directory to path so we can import lib
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from lib.websub import LocalHub
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local WebSub hub for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    hub = LocalHub(host=args.host, port=args.port)
+    hub.start()
+
+    print(f"✅ Local WebSub hub running at {hub.url}")
+    print("➡ Point websub.hub_url in config.yaml at it, then push a feed body with:")
+    print(f"   curl -H 'Content-Type: application/rss+xml' --data-binary @feed.xml '{hub.url}?hub.topic=<feed_url>'")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        hub.stop()
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import yaml
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Tests run on the sample config, with state and logs in a scratch directory
+_data_dir = tempfile.mkdtemp(prefix="manshar-tests-")
+_config = yaml.safe_load((ROOT / "sample.config.yaml").read_text())
+_config["app"].update(data_dir=_data_dir, log_file=os.path.join(_data_dir, "manshar.log"))
+_config_file = os.path.join(_data_dir, "config.yaml")
+with open(_config_file, "w") as f:
+    yaml.safe_dump(_config, f, allow_unicode=True)
+os.environ["MANSHAR_CONFIG"] = _config_file
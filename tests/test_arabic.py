@@ -0,0 +1,23 @@
+import lib.arabic
+
+
+def test_normalize_folds_spellings():
+    assert lib.arabic.normalize("أإآٱ ىیې ک ٠١٢ ۳۴۵ ABC") == "اااا ييي ك 012 345 abc"
+    assert lib.arabic.normalize("مُحَمَّـــد‌﻿") == "محمد"
+
+
+def test_hashtags_are_kept_as_written_without_invisible_characters():
+    text = "#مرحبا‌_بكم و #عَرَبي x#y # #​"
+    assert lib.arabic.hashtags(text) == ["#مرحبا_بكم", "#عَرَبي", "#y"]
+
+
+def test_analyze():
+    analysis = lib.arabic.analyze("هل تعلم أنّ الذكاء الاصطناعي؟ 🤖🚀 #ذكاء_اصطناعي")
+
+    assert analysis == {
+        "normalized": "هل تعلم ان الذكاء الاصطناعي؟ 🤖🚀 #ذكاء_اصطناعي",
+        "hashtags": ["#ذكاء_اصطناعي"],
+        "emoji_count": 2,
+        "arabic_letters": 34,
+        "has_question": True,
+    }
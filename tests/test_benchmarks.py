@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from benchmarks import run
+
+BASELINE = {"results": {
+    "fast": {"p50_seconds": 1.0},
+    "steady": {"p50_seconds": 1.0},
+    "slow": {"p50_seconds": 1.0},
+}}
+
+
+def results(**p50s):
+    return {name: {"p50_seconds": p50} for name, p50 in p50s.items()}
+
+
+def test_compare_flags_changes_past_the_threshold():
+    comparison = run.compare(results(fast=0.7, steady=1.1, slow=1.3, new=5.0), BASELINE, threshold=0.2)
+
+    assert {name: verdict for name, (_, verdict) in comparison.items()} == {
+        "fast": "faster", "steady": "same", "slow": "SLOWER",
+    }
+    assert comparison["slow"][0] == pytest.approx(1.3)
+    assert run.regressions(comparison) == ["slow"]
+
+
+def test_changes_within_the_threshold_are_not_regressions():
+    comparison = run.compare(results(steady=1.2), BASELINE, threshold=0.25)
+    assert run.regressions(comparison) == []
+
+
+def test_committed_baseline_covers_every_benchmark():
+    baseline = json.loads(run.BASELINE_FILE.read_text())
+    pytest.importorskip("lxml")
+    assert set(run.collect()) - set(baseline["results"]) <= {
+        name for name in run.collect() if name.startswith("extract.batch.workers_")
+    }
@@ -0,0 +1,156 @@
+import copy
+import itertools
+import logging
+import os
+import subprocess
+import threading
+
+import pytest
+import yaml
+
+import config
+import lib.logger
+
+SAMPLE = yaml.safe_load(open(os.environ["MANSHAR_CONFIG"]).read())
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    # Subscribe lib.logger before the listeners are swapped for the test's own
+    lib.logger.get_logger(__name__)
+    path = tmp_path / "config.yaml"
+    write(path, SAMPLE)
+    monkeypatch.setenv(config.CONFIG_FILE_ENV, str(path))
+    monkeypatch.setattr(config, "_current", None)
+    monkeypatch.setattr(config, "_listeners", list(config._listeners))
+    return path
+
+
+# Rewrites within the same mtime tick are told apart by size alone otherwise
+_seconds_later = itertools.count(1)
+
+
+def write(path, data):
+    path.write_text(yaml.safe_dump(data, allow_unicode=True))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + next(_seconds_later) * 10 ** 9))
+
+
+def changed(**sections):
+    data = copy.deepcopy(SAMPLE)
+    for name, values in sections.items():
+        data.setdefault(name, {}).update(values)
+    return data
+
+
+def test_validate_lists_every_problem():
+    data = changed(app={"check_interval_minutes": 0}, openai={"temperature": 3})
+
+    with pytest.raises(config.ErrInvalidConfig) as e:
+        config.validate(data)
+
+    assert "app.check_interval_minutes" in str(e.value) and "openai.temperature" in str(e.value)
+
+
+def test_reload_only_rebuilds_changed_sections(config_file):
+    before = config.current()
+    assert config.reload() == set()
+    assert config.current() is before
+
+    notified = []
+    config.subscribe(lambda sections, snapshot: notified.append((sections, snapshot)))
+    write(config_file, changed(openai={"max_tokens": 123}))
+
+    assert config.reload() == {"openai"}
+    after = config.current()
+    assert after.openai.max_tokens == 123
+    assert after.telegram is before.telegram and after.app is before.app
+    assert notified == [({"openai"}, after)]
+
+
+def test_reload_rebuilds_sections_derived_from_a_changed_one(config_file, tmp_path):
+    config.current()
+    write(config_file, changed(app={"data_dir": str(tmp_path / "data")}))
+
+    sections = config.reload()
+
+    assert {"app", "facebook", "rss", "metrics", "coordination", "daily_content", "usage"} <= sections
+    assert config.current().facebook.token_file == f"{tmp_path / 'data'}/facebook_tokens.json"
+
+
+def test_invalid_file_keeps_the_running_config(config_file):
+    before = config.current()
+    write(config_file, changed(openai={"temperature": 3}))
+
+    with pytest.raises(config.ErrInvalidConfig):
+        config.reload()
+
+    assert config.current() is before
+
+
+def test_watcher_reloads_a_changed_file(config_file):
+    config.current()
+    reloaded = threading.Event()
+    config.subscribe(lambda sections, snapshot: reloaded.set())
+    watcher = config.ConfigWatcher(interval_seconds=0.05)
+    watcher.start()
+    try:
+        write(config_file, changed(openai={"max_tokens": 321}))
+        assert reloaded.wait(5)
+    finally:
+        watcher.stop(timeout=5)
+
+    assert config.current().openai.max_tokens == 321
+
+
+def test_reloaded_log_level_applies_to_existing_loggers(config_file):
+    logger = lib.logger.get_logger("tests.config")
+    level = logger.level
+    try:
+        config.current()
+        write(config_file, changed(app={"log_level": "ERROR"}))
+        config.reload()
+        assert logger.level == logging.ERROR
+        assert not logger.isEnabledFor(logging.WARNING)
+    finally:
+        lib.logger.set_level(level)
+
+
+def test_decrypted_config_is_cached_in_a_private_directory(config_file, tmp_path, monkeypatch):
+    encrypted = tmp_path / "config.yaml.gpg"
+    encrypted.write_bytes(b"encrypted")
+    os.remove(config_file)
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv(config.CACHE_DIR_ENV, str(cache_dir))
+    monkeypatch.setattr(config, "_decrypted", {})
+    runs = []
+
+    def gpg(command, **kwargs):
+        runs.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout=yaml.safe_dump(SAMPLE).encode())
+    monkeypatch.setattr(config.subprocess, "run", gpg)
+
+    assert config.load().source == str(encrypted)
+    [cache_file] = cache_dir.iterdir()
+    assert oct(os.stat(cache_dir).st_mode & 0o777) == "0o700"
+    assert oct(os.stat(cache_file).st_mode & 0o777) == "0o600"
+
+    # Another process reads the cached text instead of running gpg again
+    config._decrypted.clear()
+    config.load()
+    assert len(runs) == 1
+
+    # A new version of the file replaces the cached one
+    encrypted.write_bytes(b"encrypted again")
+    config.load()
+    assert len(runs) == 2
+    assert len(list(cache_dir.iterdir())) == 1
+
+
+def test_decrypted_config_is_not_cached_in_a_shared_directory(tmp_path, monkeypatch):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    os.chmod(shared, 0o755)
+    monkeypatch.setenv(config.CACHE_DIR_ENV, str(shared))
+
+    assert config._cache_dir() is None
@@ -0,0 +1,103 @@
+import itertools
+
+import pytest
+
+import lib.content_pool
+from lib.content_pool import ContentPool
+
+ARTICLE = {"id": "article", "title": "Title", "link": "https://example.com/article", "cover_image": None,
+           "content": "Not kept"}
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    # Every use gets its own time, so the rotation never depends on ties
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(lib.content_pool.time, "time", lambda: next(ticks))
+    return ContentPool(str(tmp_path / "content_pool.sqlite3"))
+
+
+def post(text, post_type="tip", score=0):
+    return {"post": text, "type": post_type, "hashtags": ["#وسم"], "engagement_score": score}
+
+
+def test_add_ignores_duplicate_posts_of_an_article(pool):
+    assert pool.add(ARTICLE, [post("one"), post("two"), post("one")]) == 2
+    assert pool.add(ARTICLE, [post("two"), post("three")]) == 1
+    # The same text from another article is another post
+    assert pool.add(dict(ARTICLE, id="other"), [post("one")]) == 1
+
+    assert pool.available("x") == {"tip": 4}
+
+
+def test_take_uses_a_post_at_most_once_per_platform(pool):
+    pool.add(ARTICLE, [post("one", score=1), post("two", score=2)])
+
+    assert [pool.take("x")["post"] for _ in range(2)] == ["two", "one"]
+    assert pool.take("x") is None
+    assert pool.take("telegram")["post"] == "two"
+    assert pool.available("telegram") == {"tip": 1}
+
+
+def test_take_returns_the_post_with_its_article(pool):
+    pool.add(ARTICLE, [post("one")])
+
+    taken = pool.take("x")
+
+    assert taken["post"] == "one" and taken["hashtags"] == ["#وسم"]
+    assert taken["article"] == {"id": "article", "title": "Title", "link": "https://example.com/article",
+                                "cover_image": None}
+
+
+def test_take_rotates_post_types(pool):
+    pool.add(ARTICLE, [post(f"{post_type}{i}", post_type, score=i)
+                       for post_type in ("tip", "definition", "did_you_know") for i in range(2)])
+
+    taken = [pool.take("x", ["did_you_know", "tip", "definition"]) for _ in range(6)]
+
+    # Preferred type first, then the type used longest ago, best scored post first
+    assert [p["post"] for p in taken] == ["did_you_know1", "tip1", "definition1", "did_you_know0", "tip0", "definition0"]
+    assert pool.take("x") is None
+
+
+def test_take_only_hands_out_the_requested_types(pool):
+    pool.add(ARTICLE, [post("tip", "tip"), post("definition", "definition")])
+
+    assert pool.take("x", ["definition"])["post"] == "definition"
+    assert pool.take("x", ["definition"]) is None
+    assert pool.peek("x")["post"] == "tip"
+
+
+def test_prune_deletes_posts_used_on_every_platform(pool):
+    pool.add(ARTICLE, [post("one", score=1), post("two")])
+    pool.take("x")
+    pool.take("telegram")
+    pool.take("x")
+
+    assert pool.prune(["x", "telegram"]) == 1
+    assert pool.available("telegram") == {"tip": 1}
+
+
+def test_refill_skips_articles_already_generated_from(pool):
+    generated = []
+
+    def generate(article):
+        generated.append(article["id"])
+        return [post(f"{article['id']}-{i}") for i in range(2)]
+    articles = [dict(ARTICLE, id=f"article{i}") for i in range(4)]
+    # Remembered even though it gave no posts
+    pool.add(articles[0], [])
+
+    added = lib.content_pool.refill(pool, articles, generate, ["x"], low_water_mark=4, max_articles=10)
+
+    assert added == 4
+    assert generated == ["article1", "article2"]
+    assert pool.has_source("article1") and not pool.has_source("article3")
+
+
+def test_failed_generation_is_tried_again_by_the_next_refill(pool):
+    def fail(article):
+        raise RuntimeError("API unavailable")
+
+    assert lib.content_pool.refill(pool, [ARTICLE], fail, ["x"]) == 0
+    assert not pool.has_source("article")
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import lib.coordination
+from lib.coordination import Coordinator, LocalLeases, SQLiteLeases
+
+
+@pytest.fixture(params=["sqlite", "local"])
+def leases(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteLeases(str(tmp_path / "coordination.sqlite3"))
+    return LocalLeases()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(lib.coordination.time, "time", lambda: now[0])
+    return now
+
+
+def test_lease_is_held_by_one_owner_until_it_expires(leases, clock):
+    assert leases.acquire("article", "a", 60)
+    assert not leases.acquire("article", "b", 60)
+    # The owner may take its own lease again
+    assert leases.acquire("article", "a", 60)
+
+    clock[0] += 61
+    assert leases.acquire("article", "b", 60)
+    assert not leases.acquire("article", "a", 60)
+
+
+def test_renewed_lease_outlives_its_first_ttl(leases, clock):
+    leases.acquire("article", "a", 60)
+    clock[0] += 50
+    leases.renew(["article"], "a", 60)
+    # Only the owner's renewal counts
+    leases.renew(["article"], "b", 0)
+
+    clock[0] += 50
+    assert not leases.acquire("article", "b", 60)
+
+
+def test_completed_lease_can_never_be_claimed_again(leases, clock):
+    leases.acquire("article", "a", 60)
+    leases.complete("article", "a")
+
+    clock[0] += 3600
+    assert not leases.acquire("article", "b", 60)
+    assert not leases.acquire("article", "a", 60)
+    # Nor released or renewed back into use
+    leases.release("article", "a")
+    leases.renew(["article"], "a", 60)
+    assert not leases.acquire("article", "b", 60)
+
+
+def test_only_the_owner_completes_a_lease(leases):
+    leases.acquire("article", "a", 60)
+    leases.complete("article", "b")
+    leases.release("article", "a")
+
+    assert leases.acquire("article", "b", 60)
+
+
+def test_released_lease_is_free_for_others(leases):
+    leases.acquire("article", "a", 60)
+    leases.release("article", "b")
+    assert not leases.acquire("article", "b", 60)
+
+    leases.release("article", "a")
+    assert leases.acquire("article", "b", 60)
+
+
+def test_coordinator_claims_articles_once(leases):
+    first, second = Coordinator(leases, node_id="a"), Coordinator(leases, node_id="b")
+
+    assert first.claim_article("feed", "article")
+    assert not second.claim_article("feed", "article")
+    first.complete_article("feed", "article")
+    assert not second.claim_article("feed", "article")
+
+    assert first.claim_article("feed", "other")
+    first.stop()
+    assert second.claim_article("feed", "other")
+
+
+def test_feeds_are_sharded_over_live_nodes_and_fail_over(leases, clock):
+    nodes = {name: Coordinator(leases, node_id=name, lease_seconds=60) for name in ("a", "b", "c")}
+    for name in nodes:
+        leases.heartbeat(name)
+    feeds = [f"feed{i}" for i in range(30)]
+
+    owners = {feed: [name for name, node in nodes.items() if node.owns_feed(feed)] for feed in feeds}
+    assert all(len(owner) == 1 for owner in owners.values())
+    assert {owner[0] for owner in owners.values()} == {"a", "b", "c"}
+
+    # c stops sending heartbeats, its feeds move to a and b only
+    clock[0] += 61
+    leases.heartbeat("a")
+    leases.heartbeat("b")
+    for feed in feeds:
+        new_owners = [name for name in ("a", "b") if nodes[name].owns_feed(feed)]
+        assert len(new_owners) == 1
+        if owners[feed] != ["c"]:
+            assert new_owners == owners[feed]
+
+
+def test_every_node_polls_every_feed_without_sharding(leases):
+    leases.heartbeat("b")
+    assert Coordinator(leases, node_id="a", shard_feeds=False).owns_feed("feed")
@@ -0,0 +1,20 @@
+import lib.extraction_pool
+import main  # noqa: F401, workers import it as the pipeline's scripts do
+
+
+def _worker_state(_):
+    import config
+    import lib.logger
+    return config._current is None, type(lib.logger._queue_handler).__name__
+
+
+def test_workers_neither_load_the_config_nor_log_to_the_file():
+    pool = lib.extraction_pool.ExtractionPool(workers=1)
+    try:
+        assert list(pool.map(_worker_state, [1], timeout=60)) == [(True, "StreamHandler")]
+    finally:
+        pool.shutdown()
+
+
+def test_run_all_runs_inline_without_a_pool():
+    assert lib.extraction_pool.run_all(len, ["a", "bb", "ccc"]) == [1, 2, 3]
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("facebook")
+import requests
+import urllib3
+
+import config
+import lib.facebook_tokens
+import lib.http
+import lib.ratelimit
+from clients.facebook.client import Client
+
+
+class FakeGraph:
+    def __init__(self, responses):
+        self.responses = responses
+        self.batches = []
+
+    def request(self, path, post_args=None, files=None, method=None):
+        self.batches.append(post_args["batch"])
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = Client.__new__(Client)
+    client.page_id = "page"
+    client.photo_by_url = True
+    client.limiter = SimpleNamespace(acquire=lambda key, tokens=1: None)
+    monkeypatch.setattr(client, "_current_token", lambda: "token")
+    return client
+
+
+def test_constructor_wires_the_token_store_limiter_and_session():
+    client = Client(config.facebook)
+
+    assert client.tokens is lib.facebook_tokens.get_token_store(config.facebook)
+    assert client.access_token == client.graph.access_token == config.facebook.access_token
+    assert client.limiter is lib.ratelimit.get_limiter()
+    session = client.graph.session
+    assert isinstance(session.get_adapter("https://graph.facebook.com/"), lib.http.DeadlineAdapter)
+    assert client.limiter.response_hook in session.hooks["response"]
+
+
+def test_renewed_token_is_picked_up_without_a_new_client(monkeypatch):
+    client = Client(config.facebook)
+    monkeypatch.setattr(client.tokens, "token", lambda: "renewed-page-token")
+
+    client.send_batch([])
+
+    assert client.access_token == client.graph.access_token == "renewed-page-token"
+
+
+def test_timed_out_batch_operation_is_neither_retried_nor_published_another_way(client):
+    client.graph = FakeGraph([[None, {"code": 200, "body": '{"id": "post2"}'}]])
+
+    results = client.send_batch([
+        {"message": "first", "image_url": "https://example.com/image.png"},
+        {"message": "second"},
+    ])
+
+    assert len(client.graph.batches) == 1
+    assert results[0].retryable is False
+    assert results[1] == {"id": "post2"}
+
+
+def test_batch_request_that_may_have_reached_graph_is_not_retried(client):
+    client.graph = FakeGraph([requests.exceptions.ReadTimeout("Read timed out")])
+
+    results = client.send_batch([{"message": "first"}, {"message": "second"}])
+
+    assert [result.retryable for result in results] == [False, False]
+    assert "may have been published" in str(results[0])
+
+
+@pytest.mark.parametrize("error", [
+    requests.exceptions.ConnectTimeout("Connect timed out"),
+    requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(
+        None, "/", urllib3.exceptions.NewConnectionError(None, "Connection refused")
+    )),
+])
+def test_batch_request_that_never_went_out_is_retried(client, error):
+    client.graph = FakeGraph([error])
+
+    results = client.send_batch([{"message": "first"}])
+
+    assert results == [error]
+    assert getattr(results[0], "retryable", True)
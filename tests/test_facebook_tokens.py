@@ -0,0 +1,102 @@
+import json
+import os
+import stat
+import threading
+import time
+
+import httpx
+import pytest
+
+import lib.deadline
+import lib.facebook_tokens
+import lib.http
+from lib.facebook_tokens import TokenStore
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path.endswith("/oauth/access_token"):
+            return httpx.Response(200, json={"access_token": "renewed-user-token", "expires_in": 60 * DAY})
+        return httpx.Response(200, json={"access_token": "page-token"})
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(lib.http, "get_client", lambda: client)
+    return requests
+
+
+def store(tmp_path, access_token="config-token", app=True):
+    credentials = {"app_id": "app", "app_secret": "secret"} if app else {}
+    return TokenStore(str(tmp_path / "facebook_tokens.json"), access_token, page_id="page",
+                      renew_before_seconds=7 * DAY, **credentials)
+
+
+def test_due(tmp_path, graph):
+    assert not store(tmp_path, app=False).due()
+
+    tokens = store(tmp_path)
+    assert tokens.due()
+    tokens.renew()
+    assert not tokens.due()
+    assert not tokens.due(now=time.time() + 52 * DAY)
+    assert tokens.due(now=time.time() + 54 * DAY)
+
+
+def test_renew_persists_the_tokens_for_the_owner_only(tmp_path, graph):
+    tokens = store(tmp_path)
+
+    assert tokens.renew() == "page-token"
+
+    path = tmp_path / "facebook_tokens.json"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert os.listdir(tmp_path) == ["facebook_tokens.json"]
+    state = json.loads(path.read_text())
+    assert state["user_token"] == "renewed-user-token" and state["page_token"] == "page-token"
+    assert [request.url.params["fb_exchange_token"] for request in graph[:1]] == ["config-token"]
+
+    # Another process picks the renewed tokens up from the file
+    reloaded = store(tmp_path)
+    assert reloaded.token() == "page-token"
+    assert reloaded.expires_at() == pytest.approx(time.time() + 60 * DAY, abs=60)
+
+
+def test_renew_replaces_the_file_atomically(tmp_path, graph, monkeypatch):
+    tokens = store(tmp_path)
+    tokens.renew()
+    replaced = []
+    monkeypatch.setattr(os, "replace", lambda src, dst: replaced.append((src, dst)) or os.rename(src, dst))
+
+    tokens.renew()
+
+    path = str(tmp_path / "facebook_tokens.json")
+    assert replaced == [(path + ".tmp", path)]
+
+
+def test_tokens_renewed_from_another_config_token_are_ignored(tmp_path, graph):
+    store(tmp_path).renew()
+
+    replaced = store(tmp_path, access_token="new-config-token")
+
+    assert replaced.token() == "new-config-token"
+    assert replaced.due()
+
+
+def test_renewer_renews_under_its_deadline(monkeypatch):
+    checked = threading.Event()
+    deadlines = []
+
+    def renew_if_due():
+        deadlines.append(lib.deadline.remaining())
+        checked.set()
+    monkeypatch.setattr(lib.facebook_tokens, "renew_if_due", renew_if_due)
+
+    renewer = lib.facebook_tokens.TokenRenewer(deadline_seconds=60)
+    renewer.start()
+    assert checked.wait(5)
+    renewer.stop(timeout=5)
+
+    assert 0 < deadlines[0] <= 60
@@ -0,0 +1,41 @@
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("httpx")
+import lib.deadline
+import lib.http
+
+
+@pytest.fixture
+def sent_timeouts(monkeypatch):
+    timeouts = []
+
+    def send(self, request, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, "send", send)
+    return timeouts
+
+
+def test_sdk_sessions_get_a_timeout_without_a_deadline(sent_timeouts):
+    session = lib.http.instrument_session(requests.Session())
+    session.get("https://example.com/")
+    assert sent_timeouts == [(10, 30)]
+
+
+def test_sdk_session_timeouts_are_capped_by_the_deadline(sent_timeouts):
+    session = lib.http.instrument_session(requests.Session())
+    with lib.deadline.scope(5):
+        session.get("https://example.com/")
+    connect, read = sent_timeouts[0]
+    assert connect <= 5 and read <= 5
+
+
+def test_sdk_sessions_refuse_requests_past_the_deadline(sent_timeouts):
+    session = lib.http.instrument_session(requests.Session())
+    with lib.deadline.scope(1e-6), pytest.raises(lib.deadline.ErrDeadlineExceeded):
+        session.get("https://example.com/")
+    assert not sent_timeouts
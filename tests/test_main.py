@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("tweepy")
+pytest.importorskip("telegram")
+pytest.importorskip("facebook")
+import lib.usage
+import main
+
+ARTICLE = {
+    "id": "article",
+    "title": "Title",
+    "link": "https://example.com/article",
+    "content": "<p>" + "First sentence of the article. " * 5 + "</p>",
+    "cover_image": None,
+}
+
+
+class ExhaustedOpenAI:
+    def summarize_article(self, **kwargs):
+        raise lib.usage.ErrBudgetExceeded("OpenAI run tokens budget exhausted")
+
+
+def test_budget_exhausted_mid_article_uses_the_local_summary(monkeypatch):
+    monkeypatch.setattr(main, "get_client", lambda name: ExhaustedOpenAI())
+    monkeypatch.setattr(lib.usage.get_budget(), "exceeded", lambda article_id=None: None)
+
+    payloads = main.prepare_payloads(ARTICLE)
+
+    assert payloads["telegram"]["message"].startswith(main.local_message(ARTICLE).split("\n\n")[0])
+    assert "First sentence" in payloads["telegram"]["message"]
+    # Not stored, the next run tries OpenAI again
+    assert main.get_article_store().open(ARTICLE).get("posts") is None
+
+
+def test_concurrent_callers_share_one_client(monkeypatch):
+    built = []
+
+    class SlowClient:
+        def __init__(self, section):
+            built.append(self)
+            time.sleep(0.05)
+
+    monkeypatch.setitem(main.CLIENTS, "linkedin", SlowClient)
+    monkeypatch.setattr(main, "_clients", {})
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(main.get_client("linkedin"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(client is built[0] for client in clients)
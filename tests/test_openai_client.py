@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("openai")
+import httpx
+
+import config
+import lib.http
+import lib.store
+import lib.usage
+from clients.openai.client import Client
+
+ARTICLE = {"id": "article", "title": "Title", "link": "https://example.com/article", "content": "Content"}
+ARTICLE_DATA = {"title": "Title", "content": "Content"}
+
+
+@pytest.fixture
+def client():
+    return Client.__new__(Client)
+
+
+@pytest.fixture
+def record(tmp_path):
+    return lib.store.ArticleStore(str(tmp_path)).open(ARTICLE)
+
+
+def test_failed_analysis_falls_back_without_being_stored(client, record, monkeypatch):
+    def fail(content, title):
+        raise RuntimeError("API unavailable")
+    monkeypatch.setattr(client, "_analyze_article_content", fail)
+
+    assert "Title" in client._analysis(ARTICLE_DATA, record)
+    assert not record.has("analysis")
+
+    monkeypatch.setattr(client, "_analyze_article_content", lambda content, title: "analysis")
+    assert client._analysis(ARTICLE_DATA, record) == "analysis"
+    assert record.get("analysis") == "analysis"
+
+
+def test_exhausted_budget_is_not_hidden_by_the_analysis_fallback(client, record, monkeypatch):
+    def exhausted(content, title):
+        raise lib.usage.ErrBudgetExceeded("OpenAI day tokens budget exhausted")
+    monkeypatch.setattr(client, "_analyze_article_content", exhausted)
+
+    with pytest.raises(lib.usage.ErrBudgetExceeded):
+        client._analysis(ARTICLE_DATA, record)
+    assert not record.has("analysis")
+
+
+def test_constructor_sends_completions_through_the_shared_http_client(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={
+            "id": "completion", "object": "chat.completion", "created": 0, "model": config.openai.model,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Post"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        })
+    shared = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(lib.http, "get_client", lambda: shared)
+
+    client = Client(config.openai)
+    response = client._complete("test", model=client.model, messages=[{"role": "user", "content": "Hello"}])
+
+    assert response.choices[0].message.content == "Post"
+    assert [request.url.path for request in requests] == ["/v1/chat/completions"]
+    assert requests[0].headers["authorization"] == f"Bearer {config.openai.api_key}"
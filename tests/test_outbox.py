@@ -0,0 +1,57 @@
+import time
+
+import lib.deadline
+import lib.outbox
+
+
+def test_each_send_runs_under_the_job_deadline(tmp_path):
+    outbox = lib.outbox.Outbox(str(tmp_path / "outbox.sqlite3"), job_deadline_seconds=60)
+    outbox.enqueue("article", "telegram", {"message": "hello"})
+    deadlines = []
+
+    def send(message):
+        deadlines.append(lib.deadline.remaining())
+        return {"id": "1"}
+
+    results = outbox.drain({"telegram": send})
+
+    assert results[lib.outbox.DONE] == 1
+    assert 0 < deadlines[0] <= 60
+
+
+def test_drain_stops_at_the_callers_deadline(tmp_path):
+    outbox = lib.outbox.Outbox(str(tmp_path / "outbox.sqlite3"), job_deadline_seconds=60)
+    outbox.enqueue("article", "telegram", {"message": "hello"})
+
+    with lib.deadline.scope(0.01):
+        time.sleep(0.02)
+        results = outbox.drain({"telegram": lambda message: {"id": "1"}})
+
+    assert sum(results.values()) == 0
+    job = outbox.get("article", "telegram")
+    assert job["status"] == lib.outbox.PENDING and job["attempts"] == 0
+
+
+def test_in_progress_jobs_are_only_reclaimed_after_their_deadline(tmp_path, monkeypatch):
+    outbox = lib.outbox.Outbox(str(tmp_path / "outbox.sqlite3"), job_deadline_seconds=900)
+    outbox.enqueue("article", "telegram", {"message": "hello"})
+    assert len(outbox.claim_due()) == 1
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 900)
+    assert outbox.claim_due() == []
+    monkeypatch.setattr(time, "time", lambda: now + 900 + lib.outbox.STALE_MARGIN_SECONDS + 1)
+    assert len(outbox.claim_due()) == 1
+
+
+def test_sends_of_unknown_outcome_are_not_retried(tmp_path):
+    outbox = lib.outbox.Outbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue("article", "facebook", {"message": "hello"})
+    error = Exception("Batch operation timed out, the post may have been published")
+    error.retryable = False
+
+    results = outbox.drain({}, batch_senders={"facebook": lambda payloads: [error]})
+
+    assert results[lib.outbox.FAILED] == 1
+    assert outbox.get("article", "facebook")["status"] == lib.outbox.FAILED
+    assert outbox.claim_due() == []
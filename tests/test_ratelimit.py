@@ -0,0 +1,145 @@
+import json
+import time
+
+import pytest
+
+import lib.deadline
+import lib.ratelimit
+from lib.ratelimit import ErrRateLimited, RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr(lib.ratelimit.time, "time", lambda: now[0])
+    monkeypatch.setattr(lib.ratelimit.time, "sleep", sleep)
+    return now, sleeps
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return RateLimiter(str(tmp_path / "ratelimit.sqlite3"), {"test": (2, 60)})
+
+
+def test_bucket_refills_over_its_period(limiter, clock):
+    now, _ = clock
+    assert limiter.try_acquire("test") == 0
+    assert limiter.try_acquire("test") == 0
+    assert limiter.try_acquire("test") == pytest.approx(30)
+
+    now[0] += 30
+    assert limiter.try_acquire("test") == 0
+    # Never more than the capacity, however long it was left alone
+    now[0] += 3600
+    waits = [limiter.try_acquire("test") for _ in range(3)]
+    assert waits[:2] == [0, 0] and waits[2] > 0
+
+
+def test_buckets_are_shared_through_the_database(tmp_path, clock):
+    path = str(tmp_path / "ratelimit.sqlite3")
+    RateLimiter(path, {"test": (1, 60)}).acquire("test")
+
+    assert RateLimiter(path, {"test": (1, 60)}).try_acquire("test") == pytest.approx(60)
+
+
+def test_unknown_keys_are_not_limited(limiter):
+    assert all(limiter.try_acquire("unknown") == 0 for _ in range(100))
+
+
+def test_acquire_waits_for_tokens(limiter, clock):
+    _, sleeps = clock
+    limiter.acquire("test", tokens=2)
+
+    limiter.acquire("test")
+
+    assert sleeps == [pytest.approx(30)]
+
+
+def test_acquire_gives_up_instead_of_waiting_too_long(limiter, clock):
+    limiter.acquire("test", tokens=2)
+
+    with pytest.raises(ErrRateLimited):
+        limiter.acquire("test", block=False)
+    with pytest.raises(ErrRateLimited):
+        limiter.acquire("test", max_wait_seconds=10)
+    with lib.deadline.scope(10), pytest.raises(ErrRateLimited):
+        limiter.acquire("test")
+    assert clock[1] == []
+
+
+@pytest.mark.parametrize("method, url, key", [
+    ("POST", "https://api.x.com/2/tweets", "x.tweet_create"),
+    ("POST", "https://api.twitter.com/2/tweets/", "x.tweet_create"),
+    ("POST", "https://upload.twitter.com/1.1/media/upload.json?command=INIT", "x.media_upload"),
+    ("POST", "https://graph.facebook.com/v19.0/123/photos", "facebook.photos"),
+    ("POST", "https://graph.facebook.com/123/feed?access_token=t", "facebook.feed"),
+    ("POST", "https://graph.facebook.com/v19.0/", "facebook.batch"),
+    ("POST", "https://graph.facebook.com?access_token=t", "facebook.batch"),
+    ("POST", "https://api.telegram.org/bot123:abc/sendPhoto", "telegram.send_photo"),
+    ("POST", "https://api.telegram.org/bot123:abc/sendMessage", "telegram.send_message"),
+    ("POST", "https://api.linkedin.com/v2/ugcPosts", "linkedin.ugc_posts"),
+    ("GET", "https://api.x.com/2/tweets", None),
+    ("GET", "https://graph.facebook.com/v19.0/123", None),
+    ("POST", "https://graph.facebook.com/v19.0/oauth/access_token", None),
+    ("POST", "https://example.com/2/tweets", None),
+])
+def test_endpoint_for(method, url, key):
+    assert lib.ratelimit.endpoint_for(method, url) == key
+
+
+def test_x_headers_align_the_bucket(tmp_path, clock):
+    now, _ = clock
+    limiter = RateLimiter(str(tmp_path / "ratelimit.sqlite3"), {"test": (100, 900)})
+
+    limiter.update_from_headers("test", {"x-rate-limit-remaining": "1", "x-rate-limit-reset": str(int(now[0]) + 600)})
+    assert limiter.try_acquire("test") == 0
+    assert limiter.try_acquire("test") > 0
+
+    reset = int(now[0]) + 600
+    limiter.update_from_headers("test", {"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset)})
+    assert limiter.try_acquire("test") == pytest.approx(reset - now[0])
+
+
+def test_graph_app_usage_throttles_then_blocks(tmp_path, clock):
+    limiter = RateLimiter(str(tmp_path / "ratelimit.sqlite3"), {"test": (100, 3600)})
+
+    limiter.update_from_headers("test", {"x-app-usage": json.dumps({"call_count": 90, "total_time": 10})})
+    assert [limiter.try_acquire("test") for _ in range(11)].count(0) == 10
+
+    limiter.update_from_headers("test", {"x-app-usage": json.dumps({"call_count": 100})})
+    assert limiter.try_acquire("test") == pytest.approx(3600)
+
+
+def test_graph_business_use_case_usage_blocks_until_access_is_regained(limiter, clock):
+    usage = {"123": [{"type": "pages", "call_count": 30, "total_cputime": 100, "estimated_time_to_regain_access": 5}]}
+
+    limiter.update_from_headers("test", {"x-business-use-case-usage": json.dumps(usage)})
+
+    assert limiter.try_acquire("test") == pytest.approx(300)
+
+
+def test_unreadable_graph_usage_is_ignored(limiter, clock):
+    limiter.update_from_headers("test", {"x-app-usage": "not json"})
+
+    assert limiter.try_acquire("test") == 0
+
+
+def test_retry_after_blocks_the_bucket(limiter, clock):
+    limiter.update_from_headers("test", {"Retry-After": "120"}, status_code=429)
+
+    assert limiter.try_acquire("test") == pytest.approx(120)
+
+
+def test_429_without_a_wait_blocks_for_the_default(limiter, clock):
+    now, _ = clock
+    limiter.update_from_headers("test", {}, status_code=429)
+    assert limiter.try_acquire("test") == pytest.approx(lib.ratelimit.DEFAULT_RETRY_AFTER_SECONDS)
+
+    now[0] += lib.ratelimit.DEFAULT_RETRY_AFTER_SECONDS
+    limiter.update_from_headers("test", {"x-rate-limit-reset": str(int(now[0]) + 600)}, status_code=429)
+    assert limiter.try_acquire("test") == pytest.approx(600, abs=1)
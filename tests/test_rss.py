@@ -0,0 +1,60 @@
+import pytest
+
+pytest.importorskip("lxml")
+import lib.rss
+
+SECRET = "manshar-secret-file-contents"
+
+
+def test_iter_entries_does_not_resolve_external_entities(tmp_path):
+    secret_file = tmp_path / "secret.txt"
+    secret_file.write_text(SECRET)
+    feed = f"""<?xml version="1.0"?>
+<!DOCTYPE rss [<!ENTITY secret SYSTEM "{secret_file.as_uri()}">]>
+<rss version="2.0"><channel><item>
+<title>Title &secret;</title>
+<link>https://example.com/article</link>
+<description>Content &secret;</description>
+</item></channel></rss>""".encode()
+
+    articles = list(lib.rss.iter_entries(feed))
+
+    assert [article["id"] for article in articles] == ["article"]
+    assert SECRET not in repr(articles)
+
+
+def test_iter_entries_does_not_expand_nested_entities():
+    entities = '<!ENTITY lol "lol">' + "".join(
+        f'<!ENTITY lol{i} "{("&lol%s;" % (i - 1 if i > 1 else "")) * 10}">' for i in range(1, 10)
+    )
+    feed = f"""<?xml version="1.0"?>
+<!DOCTYPE rss [{entities}]>
+<rss version="2.0"><channel><item>
+<title>Title</title>
+<link>https://example.com/article</link>
+<description>&lol9;</description>
+</item></channel></rss>""".encode()
+
+    articles = list(lib.rss.iter_entries(feed))
+
+    # libxml2 may drop the entry altogether, it must never expand it
+    assert all(len(article["content"]) < 1000 for article in articles)
+
+
+def test_iter_entries_batches_cover_images():
+    items = "".join(
+        f"<item><link>https://example.com/a{i}</link><title>Title</title>"
+        f"<enclosure url=\"https://example.com/enclosure{i}.png\" type=\"image/png\"/>"
+        + (f"<description>&lt;img src=\"https://example.com/content{i}.png\"&gt;</description>" if i % 2 else "")
+        + "</item>"
+        for i in range(lib.rss.COVER_IMAGE_BATCH_SIZE + 3)
+    )
+    feed = f'<?xml version="1.0"?><rss version="2.0"><channel>{items}</channel></rss>'
+
+    articles = list(lib.rss.iter_entries(feed))
+
+    # The content's image wins over the enclosure, in every batch
+    assert [article["cover_image"] for article in articles] == [
+        f"https://example.com/{'content' if i % 2 else 'enclosure'}{i}.png"
+        for i in range(lib.rss.COVER_IMAGE_BATCH_SIZE + 3)
+    ]
@@ -0,0 +1,38 @@
+import os
+import time
+
+import lib.store
+
+ARTICLE = {"id": "article", "title": "Title", "link": "https://example.com/article", "content": "Content"}
+
+
+def test_prune_deletes_articles_not_opened_recently(tmp_path):
+    store = lib.store.ArticleStore(str(tmp_path))
+    store.open(ARTICLE).put("posts", {"x": "post"})
+    store.open(dict(ARTICLE, id="recent")).put("posts", {"x": "post"})
+    old = time.time() - 10 * 24 * 3600
+    os.utime(store._slug_dir("article"), (old, old))
+
+    assert store.prune(7 * 24 * 3600) == 1
+    assert not os.path.exists(store._slug_dir("article"))
+    assert store.open(dict(ARTICLE, id="recent")).get("posts") == {"x": "post"}
+
+
+def test_opening_an_article_keeps_it(tmp_path):
+    store = lib.store.ArticleStore(str(tmp_path))
+    store.open(ARTICLE).put("posts", {"x": "post"})
+    old = time.time() - 10 * 24 * 3600
+    os.utime(store._slug_dir("article"), (old, old))
+
+    store.open(ARTICLE)
+
+    assert store.prune(7 * 24 * 3600) == 0
+
+
+def test_a_stage_can_be_computed_from_another_cached_stage(tmp_path):
+    record = lib.store.ArticleStore(str(tmp_path)).open(ARTICLE)
+
+    summary = record.cached("summary", lambda: record.cached("extracted", lambda: "content") + " summary")
+
+    assert summary == "content summary"
+    assert record.get("extracted") == "content"
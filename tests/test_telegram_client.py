@@ -0,0 +1,68 @@
+import pytest
+
+pytest.importorskip("telegram")
+import telegram
+from telegram.error import TelegramError
+
+import config
+import lib.aio
+import lib.deadline
+import lib.ratelimit
+from clients.telegram.client import Client
+
+
+@pytest.fixture
+def client():
+    client = Client.__new__(Client)
+    client.loop = lib.aio.get_loop()
+    client._initialized = True
+    client._init_lock = None
+    return client
+
+
+def test_constructor_binds_the_bot_to_the_background_loop(monkeypatch):
+    calls = []
+
+    async def initialize(bot):
+        calls.append("initialize")
+
+    async def shutdown(bot):
+        calls.append("shutdown")
+    monkeypatch.setattr(telegram.Bot, "initialize", initialize)
+    monkeypatch.setattr(telegram.Bot, "shutdown", shutdown)
+
+    client = Client(config.telegram)
+
+    assert client.bot.token == config.telegram.bot_token and client.chat_id == config.telegram.chat_id
+    assert client.loop is lib.aio.get_loop()
+    assert client.limiter is lib.ratelimit.get_limiter()
+    # The Bot's pool is opened once on the loop, however many sends use it
+    client.loop.run(client.initialize())
+    client.loop.run(client.initialize())
+    client.close()
+    assert calls == ["initialize", "shutdown"]
+
+
+def test_send_goes_through_send_async_under_the_callers_deadline(client, monkeypatch):
+    calls = []
+
+    async def send_async(message, link=None, image_url=None, dry_run=False):
+        calls.append((message, link, image_url, lib.deadline.remaining()))
+        return {"id": "sent"}
+    monkeypatch.setattr(client, "send_async", send_async)
+
+    with lib.deadline.scope(60):
+        assert client.send("Message", link="https://example.com") == {"id": "sent"}
+
+    [(message, link, image_url, remaining)] = calls
+    assert (message, link, image_url) == ("Message", "https://example.com", None)
+    assert 0 < remaining <= 60
+
+
+def test_send_reports_telegram_errors_like_send_async(client, monkeypatch):
+    async def send_message(message, link=None, image_url=None, timeout=None):
+        raise TelegramError("Chat not found")
+    monkeypatch.setattr(client, "_send_message", send_message)
+
+    with pytest.raises(Exception, match="Failed to send Telegram message: Chat not found"):
+        client.send("Message")
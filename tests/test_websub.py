@@ -0,0 +1,75 @@
+import threading
+from urllib.parse import urlparse
+
+import pytest
+
+requests = pytest.importorskip("requests")
+import config
+import lib.websub
+
+SECRET = "test-secret"
+TOPIC = "https://example.com/feed/"
+BODY = b"<rss version='2.0'><channel></channel></rss>"
+
+
+@pytest.fixture
+def subscriber():
+    subscriber = lib.websub.Subscriber(host="127.0.0.1", port=0, secret=SECRET)
+    subscriber.start()
+    subscriber.pushed = []
+    subscriber.received = threading.Event()
+
+    def on_feed(body):
+        subscriber.pushed.append(body)
+        subscriber.received.set()
+
+    callback_url = f"http://127.0.0.1:{subscriber.port}/websub/blog"
+    subscription = lib.websub._Subscription(TOPIC, "http://hub.invalid/", callback_url, on_feed)
+    subscriber.subscriptions[urlparse(callback_url).path] = subscription
+    subscriber.callback_url = callback_url
+    yield subscriber
+    subscriber.stop()
+
+
+def test_subscriber_requires_a_secret():
+    with pytest.raises(ValueError):
+        lib.websub.Subscriber(secret=None)
+
+
+def test_signed_push_is_dispatched(subscriber):
+    response = requests.post(subscriber.callback_url, data=BODY,
+                             headers={"X-Hub-Signature": lib.websub.sign(SECRET, BODY)})
+    assert response.status_code == 202
+    assert subscriber.received.wait(5)
+    assert subscriber.pushed == [BODY]
+
+
+@pytest.mark.parametrize("headers, status", [
+    ({}, 403),
+    ({"X-Hub-Signature": lib.websub.sign("other-secret", BODY)}, 202),
+])
+def test_unsigned_or_forged_push_is_dropped(subscriber, headers, status):
+    response = requests.post(subscriber.callback_url, data=BODY, headers=headers)
+    assert response.status_code == status
+    assert not subscriber.received.wait(0.5)
+
+
+def test_oversized_push_is_refused(subscriber, monkeypatch):
+    monkeypatch.setattr(lib.websub, "MAX_PUSH_BYTES", 16)
+    response = requests.post(subscriber.callback_url, data=BODY,
+                             headers={"X-Hub-Signature": lib.websub.sign(SECRET, BODY)})
+    assert response.status_code == 413
+    assert not subscriber.pushed
+
+
+def test_non_numeric_lease_falls_back_to_the_default(subscriber):
+    response = requests.get(subscriber.callback_url, params={
+        "hub.mode": "subscribe", "hub.topic": TOPIC, "hub.challenge": "abc", "hub.lease_seconds": "soon",
+    })
+    assert response.status_code == 200 and response.text == "abc"
+    assert subscriber.subscriptions["/websub/blog"].expires_at is not None
+
+
+def test_websub_secret_is_required_when_enabled():
+    with pytest.raises(config.ErrInvalidConfig, match="websub.secret"):
+        config.validate({"websub": {"enabled": True, "callback_url": "https://example.com/websub"}})
@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("tweepy")
+import httpx
+
+import clients.x.client
+import config
+import lib.http
+import lib.media_cache
+import lib.ratelimit
+from clients.x.client import Client
+
+IMAGE_URL = "https://example.com/image.png"
+
+
+class FakeAPI:
+    def __init__(self):
+        self.uploads = []
+
+    def media_upload(self, filename, file, media_category):
+        self.uploads.append(file.read())
+        return SimpleNamespace(media_id=f"media{len(self.uploads)}", expires_after_secs=86400)
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = Client.__new__(Client)
+    client.api = FakeAPI()
+    client.limiter = SimpleNamespace(acquire=lambda key: None)
+    client.media_cache = lib.media_cache.MediaCache(str(tmp_path / "media.sqlite3"))
+    return client
+
+
+def serve(monkeypatch, body):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body, headers={"content-type": "image/png"}))
+    monkeypatch.setattr(lib.http, "get_client", lambda: httpx.Client(transport=transport))
+
+
+def test_constructor_wires_the_media_cache_limiter_and_sessions():
+    client = Client(config.x)
+
+    assert client.media_cache is lib.media_cache.get_media_cache()
+    assert client.limiter is lib.ratelimit.get_limiter()
+    for session in (client.client.session, client.api.session):
+        assert isinstance(session.get_adapter("https://api.x.com/"), lib.http.DeadlineAdapter)
+        assert client.limiter.response_hook in session.hooks["response"]
+
+
+def test_upload_is_reused_for_the_same_bytes(client, monkeypatch):
+    serve(monkeypatch, b"image")
+
+    assert client.upload_image(IMAGE_URL) == "media1"
+    assert client.upload_image(IMAGE_URL) == "media1"
+    assert client.api.uploads == [b"image"]
+
+
+def test_upload_of_a_url_is_not_reused_once_its_bytes_change(client, monkeypatch):
+    serve(monkeypatch, b"image")
+    assert client.upload_image(IMAGE_URL) == "media1"
+
+    serve(monkeypatch, b"new image")
+    assert client.upload_image(IMAGE_URL) == "media2"
+    assert client.api.uploads == [b"image", b"new image"]
+
+
+def test_large_image_of_a_known_url_is_hashed_before_reuse(client, monkeypatch):
+    monkeypatch.setattr(clients.x.client, "CHUNKED_UPLOAD_MIN_BYTES", 4)
+    serve(monkeypatch, b"large image")
+    client.media_cache.put("x", lib.media_cache.content_hash(b"large image"), "media0", 86400, url=IMAGE_URL)
+
+    assert client.upload_image(IMAGE_URL) == "media0"
+    assert client.api.uploads == []